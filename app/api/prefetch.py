@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from app.utils.logger import logger
+
+LINK_ATTRIBUTES = ("href", "hx-get")
+
+
+def extract_links(html: str, guid: str, page_path: str) -> list[str]:
+    """Return same-app page paths linked from `html`, most frequently linked first"""
+    base = f"/{guid}{page_path}"
+    prefix = f"/{guid}"
+    counts = Counter()
+    for tag in BeautifulSoup(html, "html.parser").find_all(True):
+        for attribute in LINK_ATTRIBUTES:
+            if tag.name == "link" or not tag.get(attribute):
+                continue
+            url = urlparse(urljoin(base, tag[attribute].strip()))
+            if url.scheme or url.netloc or not (url.path == prefix or url.path.startswith(prefix + "/")):
+                continue
+            path = url.path[len(prefix):] or "/"
+            if path != page_path:
+                counts[path] += 1
+    # Counter keeps first-seen order for ties
+    return [path for path, _ in counts.most_common()]
+
+
+class Prefetcher:
+    """Generate likely next pages in the background so they can be replayed instantly.
+
+    `needed(guid, path)` says whether a page still has to be generated, and
+    `generate(guid, path, referring_page)` does the work, returning True if it
+    stored a page. At most `concurrency` prefetches run at a time, each tenant
+    gets `budget` generations per `window` seconds, and a page that is already
+    queued is not queued again.
+    """
+
+    def __init__(self, needed: Callable[[str, str], Awaitable[bool]],
+                 generate: Callable[[str, str, str], Awaitable[bool]], max_links: int = 3,
+                 concurrency: int = 2, budget: int = 20, window: int = 3600, max_tracked: int = 4096):
+        self.needed = needed
+        self.generate = generate
+        self.max_links = max_links
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.budget = budget
+        self.window = window
+        self.max_tracked = max_tracked
+        self.spent: dict[str, deque] = {}
+        self.pending: set[tuple[str, str]] = set()
+        self.prefetched: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self.tasks: set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.generated = 0
+        self.skipped = 0
+        self.over_budget = 0
+        self.failed = 0
+        self.hits = 0
+
+    def _take_budget(self, guid: str) -> bool:
+        spent = self.spent.setdefault(guid, deque())
+        now = time.monotonic()
+        while spent and spent[0] < now - self.window:
+            spent.popleft()
+        if len(spent) >= self.budget:
+            return False
+        spent.append(now)
+        return True
+
+    def schedule(self, guid: str, page_path: str, html: str):
+        """Queue background generation of the most likely next pages linked from a rendered page"""
+        try:
+            links = extract_links(html, guid, page_path)
+        except Exception as e:
+            logger.warning(f"Could not extract links from {page_path} for app {guid}: {e}")
+            return
+
+        queued = 0
+        for path in links:
+            if queued >= self.max_links:
+                break
+            key = (guid, path)
+            if key in self.pending or key in self.prefetched:
+                continue
+            queued += 1
+            self.pending.add(key)
+            self.scheduled += 1
+            task = asyncio.create_task(self._prefetch(guid, path, page_path))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _prefetch(self, guid: str, path: str, referring_page: str):
+        try:
+            async with self.semaphore:
+                if not await self.needed(guid, path):
+                    self.skipped += 1
+                    return
+                if not self._take_budget(guid):
+                    self.over_budget += 1
+                    return
+                stored = await self.generate(guid, path, referring_page)
+            if stored:
+                self.generated += 1
+                self.prefetched[(guid, path)] = time.time()
+                while len(self.prefetched) > self.max_tracked:
+                    self.prefetched.popitem(last=False)
+                logger.info(f"Prefetched {path} for app {guid}")
+            else:
+                self.skipped += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Prefetch of {path} for app {guid} failed: {e}")
+        finally:
+            self.pending.discard((guid, path))
+
+    def record_request(self, guid: str, path: str):
+        """Count a GET for a prefetched page as a hit, once per prefetch"""
+        if self.prefetched.pop((guid, path), None) is not None:
+            self.hits += 1
+
+    def forget(self, guid: str, path: str | None = None):
+        """Stop counting pages whose stored response was dropped"""
+        for key in [key for key in self.prefetched if key[0] == guid and (path is None or key[1] == path)]:
+            del self.prefetched[key]
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "generated": self.generated,
+            "skipped": self.skipped,
+            "over_budget": self.over_budget,
+            "failed": self.failed,
+            "pending": len(self.pending),
+            "hits": self.hits,
+            "hit_rate": self.hits / self.generated if self.generated else 0.0,
+        }
+
@@ -1,22 +1,423 @@
 from fastapi import APIRouter, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+import hashlib
 import json
 import uuid
+from app.api.prefetch import Prefetcher
+from app.assets.bundle import TAILWIND_CDN_SCRIPT, assets
 from app.config.settings import settings
 from app.db.settings_db_client import settings_db_client
-from app.db import sql_client
+from app.db.tenant_db import BACKENDS, enabled_backends, tenant_db_manager
 from app.llm import app_init
 from app.llm.client import llm_client
+from app.llm.json_stream import IncrementalJSONParser
+from app.llm.prompt import SystemPrompt
+from app.llm.response_cache import bypass_cache
 from app.utils.logger import logger
-from bs4 import BeautifulSoup
-import asyncio
+from app.utils.metrics import StatsGauge, llm_json_responses, registry, render_seconds, request_kind, timed
+from app.utils.single_flight import SingleFlight
+from app.utils.template_cache import TemplateCache
+from functools import partial
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["assets"] = assets
+template_cache = TemplateCache(templates.env, settings.TEMPLATE_CACHE_SIZE, settings.TEMPLATE_BYTECODE_CACHE_DIR)
+page_flights = SingleFlight()
+registry.register(StatsGauge("autoapp_page_flights", "Page generation coalescing", page_flights.stats))
+registry.register(StatsGauge("autoapp_template_cache", "Compiled page template cache", template_cache.stats))
+registry.register(StatsGauge("autoapp_assets", "Self-hosted stylesheet bundle", assets.stats))
+
+SHELL_BODY_MARKER = "<!-- autoapp:body -->"
+STREAM_RENDER_BUFFER = 20  # Jinja output pieces per streamed chunk
+COALESCED_METHODS = {"GET", "PUT", "DELETE"}  # Idempotent methods whose concurrent duplicates share one generation
+
+
+def page_flight_key(guid: str, method: str, path: str, body: bytes) -> tuple | None:
+    """Key identifying duplicate page requests, or None if the request must not be coalesced"""
+    if not settings.COALESCE_PAGES or method not in COALESCED_METHODS:
+        return None
+    return guid, method, path, hashlib.sha256(body).hexdigest()
+
+
+def redirect_target(guid: str, commands: list) -> str | None:
+    """Return the app-relative redirect URL requested by the LLM commands, if any"""
+    for cmd in commands:
+        if "redirect" in cmd and cmd["redirect"]:
+            redirect_url = cmd["redirect"]
+            if not redirect_url.startswith(('http://', 'https://', '/')):
+                redirect_url = f"/{guid}/{redirect_url}"
+            elif redirect_url.startswith('/'):
+                redirect_url = f"/{guid}{redirect_url}"
+            return redirect_url
+    return None
+
+
+def render_shell(request: Request, settings_data: dict) -> tuple[str, str]:
+    """Render app.html around a marker and split it into the parts before and after the body"""
+    html = templates.get_template("app.html").render(
+        {"request": request, "body": SHELL_BODY_MARKER, "app_settings": settings_data}
+    )
+    head, _, tail = html.partition(SHELL_BODY_MARKER)
+    return head, tail
+
+
+def page_styles(template: str) -> str:
+    """The <style> and <script> tags a page rendered into an existing document needs on top of the bundle"""
+    missing_css = assets.missing_css(template)
+    return (f"<style>{missing_css}</style>" if missing_css else "") + (
+        TAILWIND_CDN_SCRIPT if assets.needs_tailwind(template) else "")
+
+
+def render_page(request: Request, settings_data: dict, db_client, path: str, template: str,
+                db_results: dict | None, css: str, js: str, is_htmx: bool):
+    """Render an LLM template as an HTMX fragment or inside the app.html shell"""
+    context = {
+        "request": request,
+        "results": db_results,
+        "db": db_client,
+        "path": path,
+    }
+    with render_seconds.time(kind=request_kind.get()):
+        rendered_html = template_cache.get(template).render(**context)
+
+        if is_htmx:
+            return HTMLResponse(page_styles(template) + rendered_html)
+
+        return templates.TemplateResponse(
+            "app.html",
+            {
+                "request": request,
+                "body": rendered_html,
+                "app_settings": settings_data,
+                "css": assets.missing_css(template) + css,
+                "js": js,
+                "tailwind_cdn": assets.needs_tailwind(template),
+            }
+        )
+
+
+def replayable(commands: list, db_client) -> bool:
+    """True if re-running the commands has no side effects"""
+    return all(db_client.read_only(cmd) and not cmd.get("redirect") for cmd in commands)
+
+
+async def build_system_prompt(settings_data: dict, db_client) -> SystemPrompt:
+    data_model = await tenant_db_manager.run(db_client.get_schema, row_counts=False)
+    row_counts = await tenant_db_manager.run(db_client.get_row_counts)
+    return llm_client.format_prompt(data_model=data_model, app_settings=settings_data, row_counts=row_counts)
+
+
+async def store_page(guid: str, path: str, settings_data: dict, db_client, commands: list, template: str, css: str, js: str):
+    """Persist a generated GET page for replay if re-running its commands has no side effects"""
+    if not settings.REPLAY_PAGES or not template:
+        return
+    if not replayable(commands, db_client):
+        logger.info(f"Not storing page {path} for replay: it contains write commands")
+        return
+    ttl = settings_data.get("replay_ttl") or settings.PAGE_REPLAY_TTL_SECONDS
+    schema_hash = await tenant_db_manager.run(db_client.get_schema_hash)
+    await settings_db_client.save_page(guid, path, commands, template, css, js, schema_hash, ttl)
+
+
+async def settle_response(message_content: str, system_prompt: SystemPrompt, response_text: str, usable: bool):
+    """Cache a page reply that rendered, or drop one that failed so the next request asks the LLM again"""
+    if usable:
+        await llm_client.accept_response(message_content, system_prompt, response_text)
+    else:
+        await llm_client.reject_response(message_content, system_prompt)
+
+
+async def generate_page(guid: str, path: str, method: str, settings_data: dict, db_client,
+                        message_content: str, system_prompt: SystemPrompt) -> dict:
+    """Ask the LLM for a page, run its commands and persist its template.
+
+    The result holds everything needed to render the page, so requests
+    coalesced onto this generation can render it without repeating the work.
+    """
+    llm_response, response_text = await llm_client.get_json_response(message_content, system_prompt)
+    logger.info(f"Generated {method} {path} for app {guid}: {len(response_text)} characters")
+
+    page = {"response_text": response_text, "llm_response": {}, "db_results": None, "redirect_url": None, "error": None}
+    try:
+        if llm_response is None:
+            raise ValueError("Invalid JSON response from LLM")
+        page["llm_response"] = llm_response
+
+        # Execute database commands if present
+        if "commands" in llm_response:
+            page["db_results"] = await tenant_db_manager.run(db_client.execute_commands, llm_response["commands"])
+
+            # Check for redirect command
+            page["redirect_url"] = redirect_target(guid, llm_response["commands"])
+            if page["redirect_url"]:
+                return page
+
+        # Store template if present
+        template = llm_response.get("template")
+        if template:
+            await settings_db_client.update(guid, settings_data["application_type"], settings_data["prompt_template"],
+                                            settings_data["page_instructions"], path, template)
+            if method == "GET":
+                await store_page(guid, path, settings_data, db_client, llm_response.get("commands", []), template,
+                                 llm_response.get("CSS", ""), llm_response.get("Javascript", ""))
+    except Exception as e:
+        page["error"] = e
+    finally:
+        await settle_response(message_content, system_prompt, response_text,
+                              page["error"] is None and bool(page["redirect_url"] or page["llm_response"].get("template")))
+    return page
+
+
+async def prefetch_needed(guid: str, path: str) -> bool:
+    """False if the page is already stored for replay or being generated"""
+    key = page_flight_key(guid, "GET", path, b"")
+    if key and key in page_flights.flights:
+        return False
+    db_client = await tenant_db_manager.open(guid)
+    schema_hash = await tenant_db_manager.run(db_client.get_schema_hash)
+    return await settings_db_client.get_page(guid, path, schema_hash) is None
+
+
+async def prefetch_page(guid: str, path: str, referring_page: str) -> bool:
+    """Generate a GET page ahead of the user and store it for replay.
+
+    Runs only while no interactive LLM call is waiting, and only pages whose
+    commands are all reads are executed and stored. A user who requests the
+    page meanwhile is coalesced onto this generation.
+    """
+    request_kind.set("prefetch")
+    settings_data = await settings_db_client.get(guid, path, referring_page)
+    if not settings_data:
+        return False
+    db_client = await tenant_db_manager.open(guid)
+    system_prompt = await build_system_prompt(settings_data, db_client)
+
+    await llm_client.wait_idle()
+    key = page_flight_key(guid, "GET", path, b"")
+    if key and key in page_flights.flights:
+        return False
+    flight = page_flights.lead(key) if key else None
+    page = None
+    try:
+        llm_response, response_text = await llm_client.get_json_response(f"GET {path}", system_prompt, background=True)
+        if llm_response is None:
+            return False
+        commands = llm_response.get("commands", [])
+        template = llm_response.get("template")
+        if not template or not replayable(commands, db_client):
+            return False
+        try:
+            db_results = await tenant_db_manager.run(db_client.execute_commands, commands)
+        except Exception:
+            await llm_client.reject_response(f"GET {path}", system_prompt)
+            raise
+        await llm_client.accept_response(f"GET {path}", system_prompt, response_text)
+        await store_page(guid, path, settings_data, db_client, commands, template,
+                         llm_response.get("CSS", ""), llm_response.get("Javascript", ""))
+        page = {"response_text": response_text, "llm_response": llm_response, "db_results": db_results,
+                "redirect_url": None, "error": None}
+        return True
+    finally:
+        if flight:
+            if page is None:
+                page_flights.abandon(key, flight)
+            else:
+                page_flights.finish(key, flight, page)
+
+
+prefetcher = Prefetcher(
+    prefetch_needed, prefetch_page,
+    max_links=settings.PREFETCH_MAX_LINKS,
+    concurrency=settings.PREFETCH_CONCURRENCY,
+    budget=settings.PREFETCH_TENANT_BUDGET,
+    window=settings.PREFETCH_BUDGET_WINDOW_SECONDS,
+)
+registry.register(StatsGauge("autoapp_prefetch", "Background page prefetching", prefetcher.stats))
+
+
+def schedule_prefetch(guid: str, path: str, html: str):
+    if settings.PREFETCH_PAGES and settings.REPLAY_PAGES:
+        prefetcher.schedule(guid, path, html)
+
+
+def page_error(error: Exception, response_text: str) -> str:
+    return f"""
+            <div class='error'>
+                <p><strong>Template Error:</strong> {str(error)}</p>
+                <hr>
+                <p><strong>LLM Response:</strong></p>
+                <pre>{response_text}</pre>
+            </div>
+            """
+
+
+def render_shared_body(request: Request, db_client, path: str, page: dict, is_htmx: bool) -> str:
+    """Render the body of a page generated for another, coalesced request"""
+    if page["error"]:
+        return page_error(page["error"], page["response_text"])
+    if page["redirect_url"]:
+        return f"<script>window.location.replace({json.dumps(page['redirect_url'])});</script>"
+    llm_response = page["llm_response"]
+    if not llm_response.get("template"):
+        return ""
+    styles = page_styles(llm_response["template"])
+    with render_seconds.time(kind=request_kind.get()):
+        body = template_cache.get(llm_response["template"]).render(
+            request=request, results=page["db_results"], db=db_client, path=path
+        )
+    if is_htmx:
+        return styles + body
+    css = llm_response.get("CSS", "")
+    js = llm_response.get("Javascript", "")
+    return styles + (f"<style>{css}</style>" if css else "") + body + (f"<script>{js}</script>" if js else "")
+
+
+async def stream_page(request: Request, guid: str, path: str, settings_data: dict, db_client,
+                      message_content: str, system_prompt: SystemPrompt, is_htmx: bool,
+                      flight_key: tuple | None = None):
+    """Stream a page to the browser while the LLM generates it.
+
+    The app.html shell goes out first. The `commands` SQL runs as soon as that
+    array is complete, and the template is rendered with Jinja's `stream`
+    once both it and the query results are available. With `flight_key` set,
+    a duplicate of a page already being generated waits for that generation
+    and renders its result instead of starting another.
+    """
+    head, tail = ("", "") if is_htmx else render_shell(request, settings_data)
+    yield head
+
+    flight = None
+    if flight_key:
+        shared = await page_flights.join(flight_key)
+        if shared:
+            logger.info(f"Coalesced {request.method} {path} for app {guid} onto an in-flight generation")
+            try:
+                yield render_shared_body(request, db_client, path, shared, is_htmx)
+            except Exception as template_error:
+                logger.error("Template rendering error: %s", str(template_error))
+                yield page_error(template_error, shared["response_text"])
+            yield tail
+            return
+        flight = page_flights.lead(flight_key)
+
+    parser = IncrementalJSONParser()
+    llm_response = {}
+    response_text = ""
+    commands = None
+    db_results = None
+    template = None
+    rendered = False
+    body = []  # Rendered template pieces, for link prefetching
+    css = ""
+    js = ""
+    page = None
+    continued = False
+
+    def render_body():
+        context = {
+            "request": request,
+            "results": db_results,
+            "db": db_client,
+            "path": path,
+        }
+        styles = page_styles(template)
+        if styles:
+            yield styles
+        stream = template_cache.get(template).stream(**context)
+        stream.enable_buffering(STREAM_RENDER_BUFFER)
+        yield from timed(stream, render_seconds, kind=request_kind.get())
+
+    def result(redirect_url=None, error=None) -> dict:
+        return {"response_text": response_text, "llm_response": llm_response, "db_results": db_results,
+                "redirect_url": redirect_url, "error": error}
+
+    async def members():
+        """Top-level members of the response as they complete, continuing the reply if it is cut off"""
+        nonlocal response_text, continued
+        async for chunk in llm_client.stream_response(message_content, system_prompt):
+            response_text += chunk
+            for member in parser.feed(chunk):
+                yield member
+        for _ in range(settings.LLM_MAX_CONTINUATIONS):
+            if parser.done or not parser.started:
+                break
+            logger.warning("LLM response for %s was cut off, asking it to continue", path)
+            continuation = await llm_client.continue_response(message_content, system_prompt, response_text)
+            if not continuation:
+                break
+            continued = True
+            response_text += continuation
+            for member in parser.feed(continuation):
+                yield member
+        for member in parser.finish():
+            yield member
+
+    try:
+        async for key, value in members():
+            llm_response[key] = value
+            if key == "commands":
+                commands = value
+                db_results = await tenant_db_manager.run(db_client.execute_commands, commands)
+                redirect_url = redirect_target(guid, commands)
+                if redirect_url:
+                    page = result(redirect_url=redirect_url)
+                    await settle_response(message_content, system_prompt, response_text, True)
+                    yield f"<script>window.location.replace({json.dumps(redirect_url)});</script>"
+                    return
+            elif key == "template":
+                template = value
+            elif key == "CSS":
+                css = value
+                if css and not is_htmx:
+                    yield f"<style>{css}</style>"
+            elif key == "Javascript":
+                js = value
+
+            if template is not None and commands is not None and not rendered:
+                rendered = True
+                for piece in render_body():
+                    body.append(piece)
+                    yield piece
+
+        logger.info(f"Streamed {path} for app {guid}: {len(response_text)} characters")
+
+        # The template may have arrived without any commands
+        if template is not None and not rendered:
+            rendered = True
+            for piece in render_body():
+                body.append(piece)
+                yield piece
+
+        if template:
+            await settings_db_client.update(guid, settings_data["application_type"], settings_data["prompt_template"],
+                                      settings_data["page_instructions"], path, template)
+            await store_page(guid, path, settings_data, db_client, commands or [], template, css, js)
+        await settle_response(message_content, system_prompt, response_text, bool(template))
+        page = result()
+        schedule_prefetch(guid, path, "".join(body))
+        if js and not is_htmx:
+            yield f"<script>{js}</script>"
+
+    except Exception as template_error:
+        logger.error("Template rendering error: %s", str(template_error))
+        page = result(error=template_error)
+        await settle_response(message_content, system_prompt, response_text, False)
+        yield page_error(template_error, response_text)
+    finally:
+        if page is not None and response_text:
+            outcome = "failed" if not llm_response else "parsed" if parser.done and not continued else "repaired"
+            llm_json_responses.inc(kind=request_kind.get(), outcome=outcome)
+        # A client that disconnects mid-stream leaves no result; waiting requests then generate the page themselves
+        if flight:
+            if page is None:
+                page_flights.abandon(flight_key, flight)
+            else:
+                page_flights.finish(flight_key, flight, page)
+
+    yield tail
 
-initialization_locks = {}
-initialized_guids = set()
 
 @router.api_route("/update_settings", methods=["POST"])
 async def update_settings(
@@ -24,7 +425,8 @@ async def update_settings(
     application_type: str = Form(...),
     page_instructions: str = Form(None),
     path: str = Form(None),
-    clear_templates: bool = Form(False)
+    clear_templates: bool = Form(False),
+    replay_ttl: int = Form(None)
 ):
     logger.info(f"Updating settings with page_instructions: {page_instructions}")
     guid = path.split('/')[1]
@@ -32,25 +434,65 @@ async def update_settings(
     logger.info(f"Updating page settings for: {path}")
 
     if clear_templates:
-        settings_db_client.clear_templates(guid, path)  # Clear templates for this page
+        await settings_db_client.clear_templates(guid, path)  # Clear templates for this page
+    else:
+        await settings_db_client.clear_page(guid, path)  # Regenerate with the new settings on the next GET
+    prefetcher.forget(guid, path)
 
-    settings_db_client.update(guid, application_type, settings.RESPONSE_PROMPT, page_instructions, path)  # Persist settings to DB
+    response_prompt = BACKENDS[await tenant_db_manager.backend(guid)].response_prompt
+    await settings_db_client.update(guid, application_type, response_prompt, page_instructions, path, replay_ttl=replay_ttl)  # Persist settings to DB
 
     return RedirectResponse(guid+"/"+path, status_code=303)  # Redirect back to homepage
 
 @router.post("/")
-async def root_post(request: Request, application_type: str = Form(...)):
+async def root_post(request: Request, application_type: str = Form(...), db_backend: str = Form(None)):
+    db_backend = (db_backend or settings.DB_BACKEND).lower()
+    if db_backend not in BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown database backend: {db_backend}")
+    if db_backend not in enabled_backends():
+        raise HTTPException(status_code=400, detail=f"The {db_backend} database backend is not enabled")
     guid = uuid.uuid4()
     guid_str = str(guid)
-    settings_db_client.update(guid_str, application_type, settings.RESPONSE_PROMPT, "", "/") # Persist settings to DB
+    await settings_db_client.update(guid_str, application_type, BACKENDS[db_backend].response_prompt, "", "/") # Persist settings to DB
+    await settings_db_client.create_init_state(guid_str, db_backend=db_backend)
     return RedirectResponse("/" + guid_str, status_code=303)
 
 @router.get("/")
 async def root_get(request: Request):
     return templates.TemplateResponse(
-        "index.html", {"request": request}
+        "index.html", {"request": request, "db_backends": enabled_backends()}
     )
 
+@router.get("/_init/{guid}/events")
+async def init_events(guid: str):
+    """Push initialization progress for an app to the browser as server-sent events"""
+    async def events():
+        async for progress in app_init.watch_progress(guid):
+            yield f"data: {json.dumps(progress)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/metrics")
+async def metrics(request: Request):
+    """LLM, SQL, rendering and initialization metrics for this worker in the Prometheus text format"""
+    if not settings.METRICS_ENABLED or not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404)
+    if request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/_admin/storage")
+async def admin_storage(request: Request, limit: int = 100):
+    """Storage used by each app in the hot and archive tiers, largest first"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    if request.headers.get("authorization") != f"Bearer {settings.ADMIN_TOKEN}":
+        raise HTTPException(status_code=401)
+    return JSONResponse(await tenant_db_manager.storage_report(limit))
+
+
 @router.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def catch_all(request: Request, path: str):
     # Extract the GUID from the path
@@ -76,60 +518,20 @@ async def catch_all(request: Request, path: str):
             logger.warning(f"Error parsing referer: {e}")
     
     # Get settings for this application
-    settings_data = settings_db_client.get(guid, path, referring_page)
+    settings_data = await settings_db_client.get(guid, path, referring_page)
     if not settings_data:
         raise HTTPException(status_code=404, detail="Application not found")
 
-    # Initialize database client
-    db_client = sql_client.SqlClient(f"{settings.SQLITE_DB_PATH}{guid}.db")
-    
-    # Handle database initialization if needed
-    if not db_client.is_initialized():
-        flash_message = "App is initializing, this may take a moment..."
-        
-        async def initialize_background():
-            if guid in initialized_guids:
-                return
-            
-            logger.info("Starting background design job for app: {}".format(guid))
-                
-            # Get or create a lock for this specific guid
-            if guid not in initialization_locks:
-                initialization_locks[guid] = asyncio.Lock()
-            
-            async with initialization_locks[guid]:
-                # Double-check in case another task initialized while we were waiting
-                if guid in initialized_guids:
-                    return
-                    
-                app_type = settings_data['application_type']
-                
-                # Log design prompt request
-                logger.info("\n=== Design Prompt Request ===\n%s\n==================", 
-                          settings.DESIGN_PROMPT.format(app_type))
-                punched_up_design = await llm_client.get_design_response(settings.DESIGN_PROMPT.format(app_type))
-                logger.info("\n=== Design Prompt Response ===\n%s\n==================", 
-                          punched_up_design)
-
-                # Log template prompt request
-                logger.info("\n=== Template Prompt Request ===\n%s\n==================", 
-                          settings.DESIGN_TEMPLATE_PROMPT.format(punched_up_design))
-                punched_up_template = await llm_client.get_design_response(settings.DESIGN_TEMPLATE_PROMPT.format(punched_up_design))
-                logger.info("\n=== Template Prompt Response ===\n%s\n==================", 
-                          punched_up_template)
-                await app_init.AppInitializer(db_client, app_type).initialize_database()
-                settings_db_client.update(guid, punched_up_design, settings.RESPONSE_PROMPT, "", "/", punched_up_template)
-
-                
-                initialized_guids.add(guid)
-                initialization_locks.pop(guid, None)  # Clean up the lock
-            
-        # Create background task
-        asyncio.create_task(initialize_background())
-        
-        # Return response immediately
+    # Get the pooled database client for this app
+    db_client = await tenant_db_manager.open(guid)
+
+    # Handle database initialization if needed; the app is usable once every init stage has finished
+    if not await app_init.is_ready(guid, db_client):
+        progress = await app_init.ensure_initialization(guid, db_client, settings_data["application_type"])
         return templates.TemplateResponse(
-            "app.html", {"request": request, "body": "", "app_settings": settings_data, "flash_message": flash_message}
+            "app.html", {"request": request, "body": "", "app_settings": settings_data,
+                         "flash_message": "App is initializing, this may take a moment...",
+                         "init_progress": progress}
         )
 
     # Prepare message content
@@ -144,101 +546,73 @@ async def catch_all(request: Request, path: str):
         except Exception as e:
             logger.warning(f"Could not read request body: {e}")
 
+    is_htmx = request.headers.get("HX-Request") == "true"
+    request_kind.set("htmx" if is_htmx else "page")
+    no_cache = "no-cache" in request.headers.get("cache-control", "")
+    # A hard reload regenerates the page rather than reusing a stored page or cached LLM response
+    bypass_cache.set(no_cache)
+    flight_key = page_flight_key(guid, method, path, await request.body())
+
+    if method == "GET":
+        prefetcher.record_request(guid, path)
+
+    # Replay a stored page without the LLM; a hard reload (no-cache) regenerates it
+    if method == "GET" and settings.REPLAY_PAGES and not no_cache:
+        schema_hash = await tenant_db_manager.run(db_client.get_schema_hash)
+        page = await settings_db_client.get_page(guid, path, schema_hash)
+        if page:
+            try:
+                db_results = await tenant_db_manager.run(db_client.execute_commands, page["commands"])
+                response = render_page(request, settings_data, db_client, path, page["template"],
+                                       db_results, page["css"], page["js"], is_htmx)
+                logger.info(f"Replayed stored page {path} for app {guid}")
+                schedule_prefetch(guid, path, response.body.decode())
+                return response
+            except Exception as e:
+                logger.warning(f"Replay of {path} for app {guid} failed, regenerating: {e}")
+                await settings_db_client.clear_page(guid, path)
+
     try:
         # Get data model and format prompt
-        data_model = db_client.get_schema()
-        system_prompt = llm_client.format_prompt(
-            data_model=data_model,
-            app_settings=settings_data
-        )
-
-        logger.info(
-            "\n=== Catch-all LLM Request ===\n%s\n%s\n==================", system_prompt, message_content
-        )
+        system_prompt = await build_system_prompt(settings_data, db_client)
 
-        response_text = await llm_client.get_response(message_content, system_prompt)
+        logger.info(f"Generating {method} {path} for app {guid}")
 
-        # Clean up response text
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        if not response_text.endswith("}"):
-            response_text += "}"
+        if settings.STREAM_PAGES and method == "GET":
+            return StreamingResponse(
+                stream_page(request, guid, path, settings_data, db_client, message_content, system_prompt, is_htmx,
+                            flight_key),
+                media_type="text/html",
+            )
 
-        logger.info("\n=== Catch-all LLM Response ===\n%s\n==================", response_text)
+        shared = await page_flights.join(flight_key) if flight_key else None
+        if shared:
+            logger.info(f"Coalesced {method} {path} for app {guid} onto an in-flight generation")
+            page = shared
+        else:
+            generate = partial(generate_page, guid, path, method, settings_data, db_client, message_content, system_prompt)
+            page = await page_flights.do(flight_key, generate) if flight_key else await generate()
+        response_text = page["response_text"]
 
         try:
-            # Parse the JSON response
-            llm_response = json.loads(response_text)
-
-            # Execute database commands if present
-            db_results = None
-            if "commands" in llm_response:
-                db_results = db_client.execute_commands(llm_response["commands"])
-                
-                # Check for redirect command
-                for cmd in llm_response["commands"]:
-                    if "redirect" in cmd and cmd["redirect"]:
-                        redirect_url = cmd["redirect"]
-                        if not redirect_url.startswith(('http://', 'https://', '/')):
-                            redirect_url = f"/{guid}/{redirect_url}"
-                        elif redirect_url.startswith('/'):
-                            redirect_url = f"/{guid}{redirect_url}"
-                        return RedirectResponse(redirect_url, status_code=303)
-
-            # Store and render template if present
+            if page["error"]:
+                raise page["error"]
+
+            if page["redirect_url"]:
+                return RedirectResponse(page["redirect_url"], status_code=303)
+
+            # Render template if present
+            llm_response = page["llm_response"]
             if "template" in llm_response:
-                template = llm_response["template"]
-                if template:
-                    settings_db_client.update(guid, settings_data["application_type"], settings_data["prompt_template"], 
-                                           settings_data["page_instructions"], path, template)
-
-                # Prepare template context
-                context = {
-                    "request": request,
-                    "results": db_results,
-                    "db": db_client,
-                    "path": path,
-                }
-
-                # Render template
-                llm_template = templates.env.from_string(template)
-                rendered_html = llm_template.render(**context)
-                
-                # Check if it's an HTMX request
-                is_htmx = request.headers.get("HX-Request") == "true"
-                
-                if is_htmx:
-                    return HTMLResponse(rendered_html)
-                
-                css, js = ("","")
-                if "CSS" in llm_response:
-                    css= llm_response['CSS']
-                if "Javascript" in llm_response:
-                    js = llm_response['Javascript']
-                return templates.TemplateResponse(
-                    "app.html",
-                    {
-                        "request": request,
-                        "body": rendered_html,
-                        "app_settings": settings_data,
-                        "css": css,
-                        "js": js
-                    }
-                )
+                response = render_page(request, settings_data, db_client, path, llm_response["template"], page["db_results"],
+                                       llm_response.get("CSS", ""), llm_response.get("Javascript", ""), is_htmx)
+                if method == "GET" and not shared:
+                    schedule_prefetch(guid, path, response.body.decode())
+                return response
 
         except Exception as template_error:
             logger.error("Template rendering error: %s", str(template_error))
-            return f"""
-            <div class='error'>
-                <p><strong>Template Error:</strong> {str(template_error)}</p>
-                <hr>
-                <p><strong>LLM Response:</strong></p>
-                <pre>{response_text}</pre>
-            </div>
-            """
+            return page_error(template_error, response_text)
 
         except json.JSONDecodeError:
             error_msg = "Invalid JSON response from LLM"
@@ -0,0 +1,133 @@
+"""Build the self-hosted frontend assets into STATIC_DIR.
+
+Downloads htmx, D3, DaisyUI and Font Awesome at the versions app.html used
+to load from CDNs, checking their published integrity hashes where there
+are any, and compiles a stylesheet with every Tailwind utility using
+Tailwind's standalone CLI. The files are written under content-hashed names
+with gzip and brotli copies and listed in manifest.json, together with a
+first stylesheet bundle cut down to the classes in templates/. Run it once
+per deploy, e.g. in the Dockerfile:
+
+    python -m app.assets.build
+    python -m app.assets.build --tailwind /usr/local/bin/tailwindcss
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import stat
+import subprocess
+import tempfile
+
+import httpx
+
+from app.assets.bundle import BUNDLE_NAME, LIBRARY_NAME, MANIFEST_FILE, TEMPLATES_DIR, write_hashed
+from app.assets.css import StyleLibrary, serialize, template_classes
+from app.config.settings import settings
+
+TAILWIND_VERSION = "3.4.17"
+TAILWIND_CLI_URL = "https://github.com/tailwindlabs/tailwindcss/releases/download/v{version}/tailwindcss-{system}-{arch}"
+# Every utility without variants; bundles generate the variants a page uses from these
+TAILWIND_CONFIG = "module.exports = {content: [{raw: '', extension: 'html'}], safelist: [{pattern: /.*/}]}\n"
+TAILWIND_INPUT = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+
+SCRIPTS = {
+    "htmx.js": ("https://unpkg.com/htmx.org@2.0.4/dist/htmx.min.js", None),
+    "d3.js": ("https://cdnjs.cloudflare.com/ajax/libs/d3/7.9.0/d3.min.js",
+              "sha512-vc58qvvBdrDR4etbxMdlTt4GBQk1qjvyORR2nrsPsFPyrs+/u5c3+1Ct6upOgdZoIl7eq6k3a1UPDSNAQi/32A=="),
+}
+DAISYUI_URL = "https://cdn.jsdelivr.net/npm/daisyui@4.4.19/dist/full.min.css"
+FONT_AWESOME_URL = "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.7.2/css/all.min.css"
+FONT_AWESOME_INTEGRITY = "sha512-Evv84Mr4kqVGRNSgIGL/F/aIDqQb7xQ2vcrdIwxfjThSH8CSR7PBEakCr51Ck+w+/U6swU2Im1vVX0SVk9ABhg=="
+FONT_URL_RE = re.compile(r"url\((?:\.\./webfonts/)([^)]+)\)")
+
+
+def download(url: str, integrity: str | None = None) -> bytes:
+    response = httpx.get(url, follow_redirects=True, timeout=120)
+    response.raise_for_status()
+    if integrity:
+        algorithm, expected = integrity.split("-", 1)
+        actual = base64.b64encode(hashlib.new(algorithm, response.content).digest()).decode()
+        if actual != expected:
+            raise ValueError(f"{url} does not match its integrity hash")
+    return response.content
+
+
+def tailwind_cli(path: str | None, workdir: str) -> str:
+    """The Tailwind CLI to run: `path`, one on PATH, or the standalone build for this platform"""
+    path = path or shutil.which("tailwindcss")
+    if path:
+        return path
+    system = {"Linux": "linux", "Darwin": "macos"}[platform.system()]
+    arch = {"x86_64": "x64", "amd64": "x64", "aarch64": "arm64", "arm64": "arm64"}[platform.machine().lower()]
+    path = os.path.join(workdir, "tailwindcss")
+    with open(path, "wb") as f:
+        f.write(download(TAILWIND_CLI_URL.format(version=TAILWIND_VERSION, system=system, arch=arch)))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def compile_tailwind(cli: str | None) -> str:
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, content in (("tailwind.config.js", TAILWIND_CONFIG), ("input.css", TAILWIND_INPUT)):
+            with open(os.path.join(workdir, name), "w") as f:
+                f.write(content)
+        output = os.path.join(workdir, "tailwind.css")
+        subprocess.run([tailwind_cli(cli, workdir), "-c", "tailwind.config.js", "-i", "input.css", "-o", output,
+                        "--minify"], cwd=workdir, check=True)
+        with open(output) as f:
+            return f.read()
+
+
+def font_awesome(static_dir: str, files: dict[str, str]) -> str:
+    """Font Awesome's stylesheet, with its webfonts written alongside under hashed names"""
+    css = download(FONT_AWESOME_URL, FONT_AWESOME_INTEGRITY).decode()
+    base = FONT_AWESOME_URL.rsplit("/css/", 1)[0] + "/webfonts/"
+    for font in sorted(set(FONT_URL_RE.findall(css))):
+        files[font] = write_hashed(static_dir, font, download(base + font))
+    # The bundle is served from the same directory as the fonts
+    return FONT_URL_RE.sub(lambda m: f"url({files[m.group(1)]})", css)
+
+
+def build(static_dir: str, cli: str | None):
+    os.makedirs(static_dir, exist_ok=True)
+    files = {}
+    for name, (url, integrity) in SCRIPTS.items():
+        files[name] = write_hashed(static_dir, name, download(url, integrity))
+        print(f"{name}: {files[name]}")
+
+    # DaisyUI's components come before Tailwind's utilities so utilities win, as with the CDN stylesheets
+    library = "\n".join([download(DAISYUI_URL).decode(), compile_tailwind(cli), font_awesome(static_dir, files)])
+    files[LIBRARY_NAME] = write_hashed(static_dir, LIBRARY_NAME, library.encode())
+    print(f"{LIBRARY_NAME}: {files[LIBRARY_NAME]} ({len(library)} bytes)")
+
+    styles = StyleLibrary(library)
+    sources = [" ".join(settings.ASSET_SAFELIST)]
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        with open(os.path.join(TEMPLATES_DIR, name)) as f:
+            sources.append(f.read())
+    classes = styles.known(set().union(*map(template_classes, sources)))
+    bundle = serialize(styles.select(classes)).encode()
+    files[BUNDLE_NAME] = write_hashed(static_dir, BUNDLE_NAME, bundle)
+    print(f"{BUNDLE_NAME}: {files[BUNDLE_NAME]} ({len(bundle)} bytes, {len(classes)} classes)")
+
+    manifest = os.path.join(static_dir, MANIFEST_FILE)
+    with open(f"{manifest}.tmp", "w") as f:
+        json.dump({"files": files, "classes": sorted(classes)}, f, indent=1)
+    os.replace(f"{manifest}.tmp", manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the self-hosted frontend assets")
+    parser.add_argument("--static-dir", default=settings.STATIC_DIR)
+    parser.add_argument("--tailwind", help="Tailwind CLI to use instead of downloading the standalone build")
+    args = parser.parse_args()
+    build(args.static_dir, args.tailwind)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+from functools import lru_cache
+
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+from app.assets.css import StyleLibrary, serialize, template_classes
+from app.config.settings import settings
+from app.db.settings_db_client import settings_db_client
+from app.utils.logger import logger
+
+try:
+    import brotli
+except ImportError:  # Only gzip copies are written without it
+    brotli = None
+
+STATIC_URL = "/static"
+MANIFEST_FILE = "manifest.json"
+BUNDLE_NAME = "app.css"
+LIBRARY_NAME = "library.css"
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+# Fonts like woff2 are compressed already
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".ttf"}
+TEMPLATES_DIR = "templates"
+TEMPLATE_SCAN_BATCH = 500
+# Compiles Tailwind in the browser, for pages using classes the library can't generate
+TAILWIND_CDN_SCRIPT = '<script src="https://cdn.tailwindcss.com"></script>'
+
+
+def write_hashed(directory: str, name: str, content: bytes) -> str:
+    """Write `content` as e.g. app.3f9c2a1b7d4e.css, with gzip and brotli copies, and return that file name"""
+    stem, ext = os.path.splitext(name)
+    hashed = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+    path = os.path.join(directory, hashed)
+    if os.path.exists(path):
+        return hashed
+    copies = [(path, content)]
+    if ext in COMPRESSIBLE:
+        copies.append((path + ".gz", gzip.compress(content, compresslevel=9, mtime=0)))
+        if brotli is not None:
+            copies.append((path + ".br", brotli.compress(content, quality=11)))
+    # The plain file goes last, so once it exists its compressed copies do too
+    for target, data in reversed(copies):
+        temporary = f"{target}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, target)
+    return hashed
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed copies when accepted and caches content-hashed names for a year.
+
+    A hashed name always holds the same bytes, so browsers keep it without
+    revalidating; any other file is revalidated on every use.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        response = None
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            try:
+                compressed = os.stat(full_path + suffix)
+            except FileNotFoundError:
+                continue
+            response = super().file_response(full_path + suffix, compressed, scope, status_code)
+            response.headers["content-encoding"] = encoding
+            media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+            response.headers["content-type"] = (f"{media_type}; charset=utf-8" if media_type.startswith("text/")
+                                                else media_type)
+            break
+        if response is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = IMMUTABLE if HASHED_NAME_RE.search(full_path) else "no-cache"
+        return response
+
+
+class AssetBundle:
+    """The self-hosted frontend: vendor scripts and one stylesheet cut down to the classes pages use.
+
+    `python -m app.assets.build` writes the libraries and a class-complete
+    stylesheet to `static_dir`. A page using classes the bundle lacks gets
+    their rules inline. With `rebuild`, when `static_dir` is shared by every
+    server, the bundle also takes in the classes of templates/ and of every
+    stored page template at startup and of such pages later. A page using Tailwind classes the library can't generate, like
+    arbitrary values, loads Tailwind's CDN compiler as well. Without a build,
+    app.html loads the libraries from CDNs.
+    """
+
+    def __init__(self, static_dir: str = settings.STATIC_DIR, rebuild_interval: float = settings.ASSET_REBUILD_INTERVAL,
+                 max_age: float = settings.ASSET_BUNDLE_MAX_AGE, safelist: list[str] = settings.ASSET_SAFELIST,
+                 rebuild: bool = settings.ASSET_SHARED_STATIC_DIR):
+        self.static_dir = static_dir
+        # Bundles rebuilt here only exist in this static_dir, so other servers must be able to serve it
+        self.rebuild_bundles = rebuild
+        self.rebuild_interval = rebuild_interval
+        self.max_age = max_age
+        self.safelist = safelist
+        self.files: dict[str, str] = {}
+        self.built_bundle = ""  # The bundle in the manifest, which restarted workers link until they rebuild
+        self.library: StyleLibrary | None = None
+        self.classes: frozenset[str] = frozenset()  # Classes in the current bundle
+        self.pending: set[str] = set()  # Classes seen since, for the next rebuild
+        self.task = None
+        self.rebuilds = 0
+        self.inlined = 0
+        self.tailwind_pages = 0
+        self.page_classes = lru_cache(maxsize=settings.TEMPLATE_CACHE_SIZE)(self._page_classes)
+        self.page_unresolved = lru_cache(maxsize=settings.TEMPLATE_CACHE_SIZE)(self._page_unresolved)
+
+    @property
+    def built(self) -> bool:
+        return BUNDLE_NAME in self.files
+
+    def url(self, name: str) -> str:
+        return f"{STATIC_URL}/{self.files[name]}"
+
+    def load(self):
+        """Read the build's manifest and parse its class-complete stylesheet"""
+        try:
+            with open(os.path.join(self.static_dir, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No frontend assets built in {self.static_dir}, pages load them from CDNs")
+            return
+        with open(os.path.join(self.static_dir, manifest["files"][LIBRARY_NAME])) as f:
+            self.library = StyleLibrary(f.read())
+        self.classes = frozenset(manifest["classes"])
+        self.files = manifest["files"]
+        self.built_bundle = self.files[BUNDLE_NAME]
+
+    def _page_classes(self, template: str) -> frozenset[str]:
+        return frozenset(self.library.known(template_classes(template)))
+
+    def _page_unresolved(self, template: str) -> frozenset[str]:
+        unresolved = frozenset(self.library.unresolved(template_classes(template)))
+        if unresolved:
+            logger.info(f"A page uses classes the stylesheet library can't generate, it loads Tailwind's CDN: "
+                        f"{' '.join(sorted(unresolved)[:20])}")
+        return unresolved
+
+    def needs_tailwind(self, template: str) -> bool:
+        """True if `template` uses Tailwind classes only the CDN compiler can generate, e.g. w-[300px] or print:hidden"""
+        if self.library is None or not self.page_unresolved(template):
+            return False
+        self.tailwind_pages += 1
+        return True
+
+    def missing_css(self, template: str) -> str:
+        """Rules for the classes `template` uses that the bundle lacks; they join the bundle on its next rebuild, if any"""
+        if self.library is None:
+            return ""
+        used = self.page_classes(template)
+        missing = used - self.classes
+        if not missing:
+            return ""
+        if self.rebuild_bundles:
+            self.pending |= missing
+        self.inlined += 1
+        return serialize(self.library.select(self.classes | used, only=missing))
+
+    async def start(self):
+        """Load the built assets, then keep the bundle up to date in the background"""
+        os.makedirs(self.static_dir, exist_ok=True)
+        await asyncio.to_thread(self.load)
+        if self.library is not None and self.rebuild_bundles and self.task is None:
+            self.task = asyncio.create_task(self._rebuild_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _rebuild_loop(self):
+        try:
+            await self._scan_templates()
+        except Exception as e:
+            logger.error(f"Scanning page templates for the stylesheet bundle failed: {e}")
+        while True:
+            # The bundle this worker links is in use for as long as it is touched, whichever server wrote it
+            await asyncio.to_thread(self._touch_bundle)
+            if self.pending:
+                try:
+                    await self.rebuild()
+                except Exception as e:
+                    logger.error(f"Stylesheet bundle rebuild failed: {e}")
+            await asyncio.sleep(self.rebuild_interval)
+
+    def _classes_of(self, templates: list[str]) -> set[str]:
+        return self.library.known(set().union(*(template_classes(template) for template in templates)))
+
+    async def _scan_templates(self):
+        """Queue the classes of templates/, the safelist and every stored page template"""
+        sources = []
+        for name in sorted(os.listdir(TEMPLATES_DIR)):
+            with open(os.path.join(TEMPLATES_DIR, name)) as f:
+                sources.append(f.read())
+        found = await asyncio.to_thread(self._classes_of, sources + [" ".join(self.safelist)])
+        after = 0
+        while rows := await settings_db_client.templates(after, TEMPLATE_SCAN_BATCH):
+            found |= await asyncio.to_thread(self._classes_of, [template for _, template in rows])
+            after = rows[-1][0]
+        self.pending |= found - self.classes
+
+    async def rebuild(self):
+        """Write a bundle with the pending classes added and switch pages over to it"""
+        classes = self.classes | self.pending
+        self.pending = set()
+        start = time.perf_counter()
+        name = await asyncio.to_thread(self._write_bundle, classes)
+        self.classes = classes
+        self.files = {**self.files, BUNDLE_NAME: name}
+        self.rebuilds += 1
+        logger.info(f"Rebuilt {name} with {len(classes)} classes in {time.perf_counter() - start:.2f}s")
+
+    def _touch_bundle(self):
+        path = os.path.join(self.static_dir, self.files[BUNDLE_NAME])
+        for copy in [path] + [path + suffix for _, suffix in PRECOMPRESSED]:
+            try:
+                os.utime(copy)
+            except FileNotFoundError:
+                pass
+
+    def _write_bundle(self, classes: frozenset[str]) -> str:
+        name = write_hashed(self.static_dir, BUNDLE_NAME, serialize(self.library.select(classes)).encode())
+        # Pages still open in browsers may link older bundles, so only those past max_age go
+        keep = (name, self.files[BUNDLE_NAME], self.built_bundle)
+        cutoff = time.time() - self.max_age
+        for entry in os.scandir(self.static_dir):
+            if (entry.name.startswith(BUNDLE_NAME.split(".")[0] + ".") and not entry.name.startswith(keep)
+                    and entry.stat().st_mtime < cutoff):
+                os.remove(entry.path)
+        return name
+
+    def stats(self) -> dict:
+        return {
+            "built": int(self.built),
+            "bundle_classes": len(self.classes),
+            "pending_classes": len(self.pending),
+            "rebuilds": self.rebuilds,
+            "inlined_pages": self.inlined,
+            "tailwind_cdn_pages": self.tailwind_pages,
+        }
+
+
+assets = AssetBundle()
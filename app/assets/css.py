@@ -0,0 +1,306 @@
+import re
+import string
+from dataclasses import dataclass
+from functools import lru_cache
+
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+# Quoted strings are matched whole so braces and semicolons inside them are skipped
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]')
+CLASS_RE = re.compile(r"\.((?:\\[0-9a-fA-F]{1,6} ?|\\.|[\w-])+)")
+ESCAPE_RE = re.compile(r"\\([0-9a-fA-F]{1,6} ?|.)")
+ATTRIBUTE_RE = re.compile(r"(?<!\\)\[[^\]]*(?<!\\)\]")
+PSEUDO_FUNCTION_RE = re.compile(r":(not|is|where|has|matches|-webkit-any)\(")
+# Words in a template that could be class names, including variants like md:hover:bg-blue-500 and w-1/2
+CANDIDATE_RE = re.compile(r"[^\s\"'`<>=(){};,]+")
+# Tailwind arbitrary values, w-[300px] or [mask-type:alpha], which only a Tailwind build can generate
+ARBITRARY_RE = re.compile(r"-?[a-z][\w-]*-\[[^\]\s]+\](?:/(?:[\w.]+|\[[^\]\s]+\]))?|\[[a-z-]+:[^\]\s]+\]")
+# At-rules whose blocks hold style rules; other blocks (@font-face, @keyframes, @property) are kept whole
+GROUPING_AT_RULES = ("@media", "@supports", "@layer", "@container")
+
+# Tailwind's default variants, which its class-complete build leaves out: screens, states and dark mode
+SCREENS = {"sm": "640px", "md": "768px", "lg": "1024px", "xl": "1280px", "2xl": "1536px"}
+PSEUDO_CLASSES = {
+    "hover": ":hover", "focus": ":focus", "active": ":active", "visited": ":visited", "target": ":target",
+    "focus-within": ":focus-within", "focus-visible": ":focus-visible", "disabled": ":disabled",
+    "enabled": ":enabled", "checked": ":checked", "required": ":required", "invalid": ":invalid",
+    "first": ":first-child", "last": ":last-child", "only": ":only-child", "odd": ":nth-child(odd)",
+    "even": ":nth-child(even)", "empty": ":empty", "placeholder-shown": ":placeholder-shown",
+}
+PSEUDO_ELEMENTS = {"placeholder": "::placeholder", "before": "::before", "after": "::after",
+                   "selection": "::selection", "marker": "::marker", "file": "::file-selector-button"}
+DARK_MEDIA = "@media (prefers-color-scheme: dark)"
+
+
+@dataclass
+class Rule:
+    """A style rule, or an at-rule kept whole when `selectors` is empty, and the grouping at-rules around it"""
+
+    selectors: list[str]
+    body: str
+    context: tuple[str, ...] = ()
+
+    @property
+    def css(self) -> str:
+        return f"{','.join(self.selectors)}{{{self.body}}}" if self.selectors else self.body
+
+
+@dataclass(frozen=True)
+class Requirement:
+    """The classes a selector needs on the page; `any_of` holds the alternatives of its :is() and :where() lists"""
+
+    classes: frozenset
+    any_of: tuple = ()
+
+    def met(self, used: set) -> bool:
+        return self.classes <= used and all(any(alt.met(used) for alt in group) for group in self.any_of)
+
+    def mentions(self, names: set) -> bool:
+        return not self.classes.isdisjoint(names) or any(alt.mentions(names) for group in self.any_of for alt in group)
+
+
+def unescape(name: str) -> str:
+    return ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)) if m.group(1)[0] in string.hexdigits else m.group(1), name)
+
+
+def escape(name: str) -> str:
+    """A class name as a CSS identifier, escaped the way Tailwind does"""
+    escaped = re.sub(r"([^\w-])", r"\\\1", name)
+    return f"\\3{name[0]} {escaped[1:]}" if name[0].isdigit() else escaped
+
+
+def split_selectors(selectors: str) -> list[str]:
+    """Split a selector list on the commas outside parentheses and brackets"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(selectors):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(selectors[start:i].strip())
+            start = i + 1
+    parts.append(selectors[start:].strip())
+    return [part for part in parts if part]
+
+
+def _closing_paren(text: str, start: int) -> int:
+    depth = 1
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+def selector_classes(selector: str) -> list[re.Match]:
+    """The class tokens of a selector, outside attribute selectors"""
+    return list(CLASS_RE.finditer(ATTRIBUTE_RE.sub(lambda m: " " * len(m.group(0)), selector)))
+
+
+@lru_cache(maxsize=None)
+def requirement(selector: str) -> Requirement:
+    """Which classes must be used for `selector` to match anything; classes inside :not() never count"""
+    any_of, rest, pos = [], [], 0
+    for match in PSEUDO_FUNCTION_RE.finditer(selector):
+        if match.start() < pos:
+            continue  # Nested in an argument already handled
+        end = _closing_paren(selector, match.end())
+        rest.append(selector[pos:match.start()])
+        if match.group(1) != "not":
+            alternatives = tuple(requirement(alt) for alt in split_selectors(selector[match.end():end]))
+            # An alternative needing no class always matches, and so does the group
+            if all(alt.classes or alt.any_of for alt in alternatives):
+                any_of.append(alternatives)
+        pos = end + 1
+    rest.append(selector[pos:])
+    classes = frozenset(unescape(match.group(1)) for match in selector_classes("".join(rest)))
+    return Requirement(classes, tuple(any_of))
+
+
+def parse(css: str) -> list[Rule]:
+    """Flatten a stylesheet into its rules, each carrying the @media and @supports blocks it sits in"""
+    css = COMMENT_RE.sub("", css)
+    rules, context, start = [], [], 0
+    tokens = TOKEN_RE.finditer(css)
+    for token in tokens:
+        if token.group() == "{":
+            prelude = css[start:token.start()].strip()
+            if prelude.startswith(GROUPING_AT_RULES):
+                context.append(prelude)
+                start = token.end()
+                continue
+            depth, end = 1, len(css)
+            for inner in tokens:
+                if inner.group() == "{":
+                    depth += 1
+                elif inner.group() == "}":
+                    depth -= 1
+                    if depth == 0:
+                        end = inner.start()
+                        break
+            if prelude.startswith("@"):
+                rules.append(Rule([], f"{prelude}{{{css[token.end():end].strip()}}}", tuple(context)))
+            else:
+                rules.append(Rule(split_selectors(prelude), css[token.end():end].strip(), tuple(context)))
+            start = end + 1
+        elif token.group() == "}":
+            if context:
+                context.pop()
+            start = token.end()
+        elif token.group() == ";":
+            # A statement at-rule such as @charset or @import
+            rules.append(Rule([], css[start:token.end()].strip(), tuple(context)))
+            start = token.end()
+    return rules
+
+
+def serialize(rules: list[Rule]) -> str:
+    out, open_context = [], ()
+    for rule in rules:
+        if rule.context != open_context:
+            common = 0
+            while common < min(len(rule.context), len(open_context)) and rule.context[common] == open_context[common]:
+                common += 1
+            out.append("}" * (len(open_context) - common))
+            out.extend(f"{at_rule}{{" for at_rule in rule.context[common:])
+            open_context = rule.context
+        out.append(rule.css)
+    out.append("}" * len(open_context))
+    return "".join(out)
+
+
+def split_variants(name: str) -> tuple[list[str], str]:
+    """Split md:hover:bg-blue-500 into its variants and utility, ignoring colons inside brackets"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(name):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == ":" and depth == 0:
+            parts.append(name[start:i])
+            start = i + 1
+    return parts, name[start:]
+
+
+def _variant(variant: str) -> tuple[str, str, str, int] | None:
+    """The (selector prefix, pseudo suffix, media query, screen order) a variant adds, or None if unknown"""
+    if variant in SCREENS:
+        return "", "", f"@media (min-width: {SCREENS[variant]})", list(SCREENS).index(variant) + 1
+    if variant == "dark":
+        return "", "", DARK_MEDIA, 0
+    if variant in PSEUDO_CLASSES:
+        return "", PSEUDO_CLASSES[variant], "", 0
+    if variant in PSEUDO_ELEMENTS:
+        return "", PSEUDO_ELEMENTS[variant], "", 0
+    for marker, combinator in (("group", " "), ("peer", " ~ ")):
+        if variant.startswith(f"{marker}-") and variant[len(marker) + 1:] in PSEUDO_CLASSES:
+            return f".{marker}{PSEUDO_CLASSES[variant[len(marker) + 1:]]}{combinator}", "", "", 0
+    return None
+
+
+class StyleLibrary:
+    """A class-complete stylesheet that bundles are cut from.
+
+    A bundle keeps every rule whose selector's classes are all used, as a
+    purger would. Tailwind classes with variants the library leaves out,
+    like md:hover:bg-blue-500, are generated from the rules of their utility.
+    """
+
+    def __init__(self, css: str):
+        self.rules = parse(css)
+        self.requirements = [[requirement(selector) for selector in rule.selectors] for rule in self.rules]
+        self.by_class: dict[str, list[int]] = {}
+        self.utilities: dict[str, list[tuple[int, str]]] = {}
+        for index, rule in enumerate(self.rules):
+            for selector, needs in zip(rule.selectors, self.requirements[index]):
+                for name in needs.classes | {alt_name for group in needs.any_of for alt in group for alt_name in alt.classes}:
+                    if index not in self.by_class.setdefault(name, [])[-1:]:
+                        self.by_class[name].append(index)
+                if len(needs.classes) == 1 and not needs.any_of:
+                    self.utilities.setdefault(next(iter(needs.classes)), []).append((index, selector))
+
+    def known(self, names) -> set[str]:
+        """The names the library has rules for, directly or as variants of a utility"""
+        found = set()
+        for name in names:
+            if name in self.by_class:
+                found.add(name)
+                continue
+            variants, utility = split_variants(name)
+            if utility.startswith("!"):
+                utility = utility[1:]
+            if (variants or name.startswith("!")) and utility in self.utilities and all(map(_variant, variants)):
+                found.add(name)
+        return found
+
+    def unresolved(self, names) -> set[str]:
+        """The names that look like Tailwind classes the library can't generate.
+
+        These are arbitrary values, and utilities it has under variants it doesn't
+        know, such as max-md:, print:, aria-*, data-* and motion-*.
+        """
+        found = set()
+        for name in names:
+            if name in self.by_class:
+                continue
+            variants, utility = split_variants(name)
+            utility = utility.removeprefix("!")
+            if ARBITRARY_RE.fullmatch(utility) or (variants and utility in self.utilities
+                                                   and not all(map(_variant, variants))):
+                found.add(name)
+        return found
+
+    def _variant_rules(self, name: str) -> list[tuple[tuple[int, int], Rule]]:
+        variants, utility = split_variants(name)
+        important = utility.startswith("!")
+        utility = utility.removeprefix("!")
+        prefix, suffix, media, screen = "", "", [], 0
+        for variant in variants:
+            variant_prefix, variant_suffix, variant_media, variant_screen = _variant(variant)
+            prefix += variant_prefix
+            # Pseudo-elements go after every pseudo-class
+            suffix = suffix + variant_suffix if not variant_suffix.startswith("::") else variant_suffix + suffix
+            media += [variant_media] if variant_media else []
+            screen = max(screen, variant_screen)
+        generated = []
+        for index, selector in self.utilities[utility]:
+            rule = self.rules[index]
+            match = next(m for m in selector_classes(selector) if unescape(m.group(1)) == utility)
+            new_selector = f"{prefix}{selector[:match.start()]}.{escape(name)}{suffix}{selector[match.end():]}"
+            body = rule.body
+            if important:
+                body = ";".join(f"{declaration} !important" for declaration in body.split(";") if declaration.strip())
+            generated.append(((screen, index), Rule([new_selector], body, rule.context + tuple(media))))
+        return generated
+
+    def select(self, used: set[str], only: set[str] | None = None) -> list[Rule]:
+        """The library's rules for the used classes; with `only`, just those needing at least one of its classes"""
+        if only is None:
+            indexes = range(len(self.rules))
+        else:
+            indexes = sorted({index for name in only for index in self.by_class.get(name, ())})
+        rules = []
+        for index in indexes:
+            rule = self.rules[index]
+            if not rule.selectors:
+                if only is None:
+                    rules.append(rule)
+                continue
+            selectors = [selector for selector, needs in zip(rule.selectors, self.requirements[index])
+                         if needs.met(used) and (only is None or needs.mentions(only))]
+            if selectors:
+                rules.append(Rule(selectors, rule.body, rule.context))
+        generated = []
+        for name in (only if only is not None else used):
+            if name not in self.by_class and name in self.known([name]):
+                generated += self._variant_rules(name)
+        return rules + [rule for _, rule in sorted(generated, key=lambda item: item[0])]
+
+
+def template_classes(source: str) -> set[str]:
+    """Every word in a template that could be a class name, as Tailwind's content scanner reads it"""
+    return {word.rstrip(":.") for word in CANDIDATE_RE.findall(source)}
@@ -13,6 +13,77 @@ class Settings:
     CLAUDE_MODEL: str = "claude-3-7-sonnet-20250219"
     CLAUDE_MODEL_DESIGN: str = "claude-3-7-sonnet-20250219"
 
+    # Stream GET pages to the browser while the LLM is still generating them
+    STREAM_PAGES: bool = os.getenv("STREAM_PAGES", "true").lower() == "true"
+
+    # Let concurrent duplicate GET/PUT/DELETE page requests share one LLM generation
+    COALESCE_PAGES: bool = os.getenv("COALESCE_PAGES", "true").lower() == "true"
+
+    # Serve GET pages from their stored LLM response instead of calling the LLM again
+    REPLAY_PAGES: bool = os.getenv("REPLAY_PAGES", "true").lower() == "true"
+    # Default lifetime of a stored page in seconds, 0 keeps it until invalidated
+    PAGE_REPLAY_TTL_SECONDS: int = int(os.getenv("PAGE_REPLAY_TTL_SECONDS", "0"))
+
+    # Seconds an initializing worker holds an app's lease without renewing it, and how often
+    # other workers poll the settings DB for its progress
+    INIT_LEASE_SECONDS: int = int(os.getenv("INIT_LEASE_SECONDS", "120"))
+    INIT_POLL_SECONDS: float = float(os.getenv("INIT_POLL_SECONDS", "1.0"))
+
+    # Pre-generate pages linked from a rendered page in the background and store them for replay
+    PREFETCH_PAGES: bool = os.getenv("PREFETCH_PAGES", "false").lower() == "true"
+    PREFETCH_MAX_LINKS: int = int(os.getenv("PREFETCH_MAX_LINKS", "3"))  # Per rendered page
+    PREFETCH_CONCURRENCY: int = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+    # Prefetch generations allowed per app in each window
+    PREFETCH_TENANT_BUDGET: int = int(os.getenv("PREFETCH_TENANT_BUDGET", "20"))
+    PREFETCH_BUDGET_WINDOW_SECONDS: int = int(os.getenv("PREFETCH_BUDGET_WINDOW_SECONDS", "3600"))
+
+    # Log files rotate when they reach LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT gzipped old files.
+    # With more than one worker each process writes its own file, named with its pid before the
+    # extension (llm_interactions.1234.log), as only a single writer may rotate a file
+    LOG_FILE: str = os.getenv("LOG_FILE", "llm_interactions.log")
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+    # Record every LLM call in LLM_CAPTURE_FILE as a JSON line of sizes and hashes. A sampled
+    # fraction of the calls also keeps the full prompt and response text. Split per worker like LOG_FILE
+    LLM_CAPTURE: bool = os.getenv("LLM_CAPTURE", "true").lower() == "true"
+    LLM_CAPTURE_FILE: str = os.getenv("LLM_CAPTURE_FILE", "llm_capture.jsonl")
+    LLM_CAPTURE_SAMPLE_RATE: float = float(os.getenv("LLM_CAPTURE_SAMPLE_RATE", "0.01"))
+
+    # Serve Prometheus metrics at /metrics, as "Authorization: Bearer <METRICS_TOKEN>"; disabled while the token is empty
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # Tenants get their own series, labelled with a hash of the app guid, up to this many; the rest share tenant="other"
+    METRICS_MAX_TENANTS: int = int(os.getenv("METRICS_MAX_TENANTS", "100"))
+    # Bearer token for the /_admin endpoints, which are disabled while it is empty
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+    # Compiled Jinja templates kept in memory, and an optional directory for their bytecode
+    TEMPLATE_CACHE_SIZE: int = int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+    TEMPLATE_BYTECODE_CACHE_DIR: str = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", "")
+
+    # Self-hosted frontend assets written by `python -m app.assets.build`; without them pages load the CDNs
+    STATIC_DIR: str = os.getenv("STATIC_DIR", "static")
+    # Set when every server serves the same STATIC_DIR, e.g. from a shared volume, or there is only one
+    # server. Only then is the stylesheet bundle rebuilt at runtime, as a bundle one server writes 404s on
+    # the others; otherwise pages link the built bundle, which every server has, and inline what it lacks
+    ASSET_SHARED_STATIC_DIR: bool = os.getenv("ASSET_SHARED_STATIC_DIR", "false").lower() == "true"
+    # Seconds between rebuilds of the stylesheet bundle when pages use classes it lacks
+    ASSET_REBUILD_INTERVAL: float = float(os.getenv("ASSET_REBUILD_INTERVAL", "60"))
+    # Replaced bundles are deleted once this old, as cached pages may still link them
+    ASSET_BUNDLE_MAX_AGE: float = float(os.getenv("ASSET_BUNDLE_MAX_AGE", str(7 * 24 * 3600)))
+    # Space-separated classes always in the bundle, e.g. ones only put together in Jinja expressions
+    ASSET_SAFELIST: list = os.getenv("ASSET_SAFELIST", "").split()
+
+    # How the tenant schema is written into the prompt: "compact" or "verbose"
+    SCHEMA_PROMPT_FORMAT: str = os.getenv("SCHEMA_PROMPT_FORMAT", "compact").lower()
+
+    # Approximate token budget of the system prompt, 0 for none. Over it, sections are shortened or dropped,
+    # lowest priority first: table sizes, the previous template, page instructions, app description, data model
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+    # Strip comments, whitespace, repeated SVG and long static text from the previous template in the prompt
+    PROMPT_MINIFY_TEMPLATE: bool = os.getenv("PROMPT_MINIFY_TEMPLATE", "true").lower() == "true"
+
     # Data Model
     DATA_MODEL_KEY: str = "data_model"
     # Prompts
@@ -89,12 +160,136 @@ class Settings:
 
     RESPONSE_PROMPT = SQL_RESPONSE_PROMPT
 
+    REDIS_INIT_PROMPT_TEMPLATE: str = """
+    We are building a full-featured, modern, AI-enabled web application.
+
+    Application Description:
+    {application_type}
+
+    Generate sample data for the app using Redis.
+    First describe the data model and store the description with SET under the key "data_model", it will be passed
+    to future LLM calls so they can understand the keys.  Store entities as hashes with keys named entitytype:entityid,
+    sorted sets to order them (e.g. by date) and sets to index them (e.g. by status).  Use enough sample data to make
+    a convincing application.
+    The users should include the default user "user:user1" with username "default_user", and email "default@example.com"
+
+    Example response format for Redis:
+    {{
+        "commands": [
+            {{"type": "redis", "name": "data_model", "command": "SET", "args": ["data_model", "Users are hashes user:<id> with username and email. users:by_date is a sorted set of user keys by creation time."]}},
+            {{"type": "redis", "name": "user_1", "command": "HSET", "args": ["user:user1", "username", "default_user", "email", "default@example.com"]}},
+            {{"type": "redis", "name": "user_1_by_date", "command": "ZADD", "args": ["users:by_date", "1709347200", "user:user1"]}},
+            {{"type": "redis", "name": "user_1_status", "command": "SADD", "args": ["users:status:new", "user:user1"]}},
+        ],
+    }}
+
+    REPLY ONLY WITH VALID JSON. Do not provide any improvements or explanations.
+    """
+
+    REDIS_RESPONSE_PROMPT: str = """
+    You can query redis and render a Jinja template for the user as well as include css or javascript for rich interaction.
+
+    * You should provide a beautiful and engaging user experience to the user.
+    * Add beautiful headers and footers if appropriate for the described app.
+    * All app pages should have navigation to other relevant pages.
+    * You can create relative links to other pages that make sense for your type of application.
+    * Redis commands run in order, in one round trip.  Their results will be available in a 'results' dictionary with
+        the command's name as the key.  For example "results['new_users']" returns a list of keys and
+        "results['user_1']" a dictionary of hash fields.
+    * You can use GET, SET, DEL, EXISTS, INCR, EXPIRE, TTL, the hash (HGET, HSET, HMGET, HGETALL, HDEL, HINCRBY, ...),
+        list (LPUSH, RPUSH, LRANGE, LREM, ...), set (SADD, SREM, SMEMBERS, SISMEMBER, SINTER, ...) and sorted set
+        (ZADD, ZREM, ZRANGE, ZREVRANGE, ZRANGEBYSCORE, ZSCORE, ...) commands, and KEYS with a pattern.
+    * The Jinja template only has access to the results dictionary, all Redis commands must be completed ahead of time.
+    * Tailwind CSS is already included and available, you don't need to load it.
+    * HTMX is also included,  you don't need to load it.  Use a progress indicator to show loading when making htmx requests.
+    * Font Awesome is also included and available.
+    * D3js is also available.
+    * Do not link to images - use only CSS, SVG, or JS
+    * the Jinja template represents the HTML <body> so it should include the header and footer of the application.
+    * You are not a toy example.  You should be the best application of this kind on the internet.
+    * the current user is "user:user1", username 'default_user' with email 'default@example.com'
+
+    Example JSON response:
+    {
+        "commands": [
+            {"name": "new_users", "command": "SMEMBERS", "args": ["users:status:new"]},
+            {"name": "user_1", "command": "HGETALL", "args": ["user:user1"]},
+            {"name": "latest_users", "command": "ZREVRANGE", "args": ["users:by_date", "0", "9"]},
+        ],
+        "CSS": "<your css here>",
+        "Javascript": "<your JS here>",
+        "template": "
+    <h1>Welcome {{ results['user_1']['username'] }}</h1>
+    <ul>
+    {% for key in results['latest_users'] %}
+        <li><a href=\"/user/{{ key.split(':')[1] }}\">{{ key }}</a>{% if key in results['new_users'] %} (new){% endif %}</li>
+    {% endfor %}
+    </ul>
+    "
+    }
+
+    Respond only with valid JSON
+    """
+
     SQLITE_DB_PATH: str = os.getenv("SQLITE_DB_PATH", "")
     SQLITE_SETTINGS_DB_PATH = f"{SQLITE_DB_PATH}app.db"
+    # Tenant databases kept open at once, and threads that run tenant SQL
+    TENANT_DB_MAX_OPEN: int = int(os.getenv("TENANT_DB_MAX_OPEN", "32"))
+    TENANT_SQL_WORKERS: int = int(os.getenv("TENANT_SQL_WORKERS", "4"))
+    # Tenant databases idle for TENANT_ARCHIVE_AFTER_SECONDS are compacted and gzipped into TENANT_ARCHIVE_PATH
+    # together with their stored pages, and restored on their next request; 0 disables archiving
+    TENANT_ARCHIVE_PATH: str = os.getenv("TENANT_ARCHIVE_PATH", f"{SQLITE_DB_PATH}archive/")
+    TENANT_ARCHIVE_AFTER_SECONDS: int = int(os.getenv("TENANT_ARCHIVE_AFTER_SECONDS", str(14 * 24 * 3600)))
+    TENANT_ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("TENANT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+    # Per-connection SQLite tuning for tenant databases
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(32 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "4096"))
+    # Limits on each LLM-generated statement: one running longer than SQL_QUERY_TIMEOUT_SECONDS is stopped
+    # (0 disables), and SELECT results are cut off after SQL_MAX_ROWS rows or about SQL_MAX_RESULT_BYTES
+    SQL_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("SQL_QUERY_TIMEOUT_SECONDS", "5"))
+    SQL_MAX_ROWS: int = int(os.getenv("SQL_MAX_ROWS", "5000"))
+    SQL_MAX_RESULT_BYTES: int = int(os.getenv("SQL_MAX_RESULT_BYTES", str(8 * 1024 * 1024)))
+    SQL_FETCH_BATCH: int = int(os.getenv("SQL_FETCH_BATCH", "256"))
+    # Table row counts for the prompt stop at SQL_ROW_COUNT_LIMIT ("10000+ rows"), so a large table
+    # is not scanned in full; all of a tenant's counts share one SQL_QUERY_TIMEOUT_SECONDS
+    SQL_ROW_COUNT_LIMIT: int = int(os.getenv("SQL_ROW_COUNT_LIMIT", "10000"))
+    # In-memory cache of tenant SELECT results, dropped whenever the tenant's data or schema changes.
+    # Each tenant may hold up to QUERY_CACHE_TENANT_MAX_BYTES of the total; 0 disables the cache
+    QUERY_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    QUERY_CACHE_TENANT_MAX_BYTES: int = int(os.getenv("QUERY_CACHE_TENANT_MAX_BYTES", str(4 * 1024 * 1024)))
+    # Background index advisor: after every INDEX_ADVISOR_REVIEW_EVERY statements on a tenant, statements
+    # run at least INDEX_ADVISOR_MIN_RUNS times that scan a table of INDEX_ADVISOR_MIN_ROWS or more get an
+    # index if the query plan would use it. Advisor indexes no plan used for INDEX_ADVISOR_DROP_AFTER_SECONDS are dropped
+    INDEX_ADVISOR: bool = os.getenv("INDEX_ADVISOR", "true").lower() == "true"
+    INDEX_ADVISOR_REVIEW_EVERY: int = int(os.getenv("INDEX_ADVISOR_REVIEW_EVERY", "200"))
+    INDEX_ADVISOR_MIN_RUNS: int = int(os.getenv("INDEX_ADVISOR_MIN_RUNS", "5"))
+    INDEX_ADVISOR_MIN_ROWS: int = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", "5000"))
+    INDEX_ADVISOR_MAX_PER_TABLE: int = int(os.getenv("INDEX_ADVISOR_MAX_PER_TABLE", "4"))
+    INDEX_ADVISOR_DROP_AFTER_SECONDS: int = int(os.getenv("INDEX_ADVISOR_DROP_AFTER_SECONDS", str(7 * 24 * 3600)))
+    # Cache of LLM responses keyed by a hash of provider, model, call options and the full prompt.
+    # LLM_CACHE_MODE is "readwrite", "off", "record" (always call the LLM and store the responses)
+    # or "replay" (answer only from the cache, e.g. replaying recorded traffic offline)
+    LLM_CACHE_MODE: str = os.getenv("LLM_CACHE_MODE", "readwrite").lower()
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", f"{SQLITE_DB_PATH}llm_cache.db")
+    LLM_CACHE_MAX_BYTES: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "0"))  # 0 keeps entries until evicted
+    # Comma-separated request kinds that never use the cache: page, htmx, init, design, prefetch
+    LLM_CACHE_BYPASS: str = os.getenv("LLM_CACHE_BYPASS", "")
+    # Number of apps whose settings lookups are kept in memory
+    SETTINGS_CACHE_SIZE: int = int(os.getenv("SETTINGS_CACHE_SIZE", "1024"))
 
     # LLM Settings
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini").lower()
     LLM_DESIGN_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini").lower()
+    # Times a truncated JSON response is continued before falling back to what can be recovered
+    LLM_MAX_CONTINUATIONS: int = int(os.getenv("LLM_MAX_CONTINUATIONS", "1"))
+    CONTINUE_PROMPT: str = """{}
+
+Your previous reply to this request was cut off. This is what you sent so far:
+{}
+
+Reply with only the rest of the JSON, starting exactly where the text above stops. Do not repeat any of it.
+"""
     DESIGN_PROMPT: str = """
     Describe a sleek, beautiful, and engaging design for:
     {}
@@ -119,11 +314,41 @@ class Settings:
     GEMINI_DESIGN_MODEL: str = GEMINI_MODEL_THINKING
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://192.168.56.1:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "gemma3:12b")
+    # Gemini explicit context caching of the stable prompt prefix. Gemini rejects
+    # caches below a minimum token count, so short prefixes are sent uncached.
+    GEMINI_CONTEXT_CACHE: bool = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+    GEMINI_CACHE_MIN_CHARS: int = int(os.getenv("GEMINI_CACHE_MIN_CHARS", "16000"))
+    GEMINI_CACHE_TTL_SECONDS: int = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", "3600"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+    # Maximum in-flight calls per provider; extra calls wait their turn
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+    CLAUDE_MAX_CONCURRENCY: int = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "8"))
+    OLLAMA_MAX_CONCURRENCY: int = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+    # LLM_PROVIDER=fake answers with canned responses, for benchmarks. The time to first token is
+    # fixed:S, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA in seconds; 0 tokens per second is instant
+    FAKE_LLM_LATENCY: str = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.5,0.5")
+    FAKE_LLM_TOKENS_PER_SECOND: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
+    FAKE_LLM_SEED: int = int(os.getenv("FAKE_LLM_SEED", "0"))
+    FAKE_LLM_MAX_CONCURRENCY: int = int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "64"))
 
     # Redis Settings
+    # Database backend of new apps that don't choose one: "sqlite" or "redis"
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "sqlite").lower()
+    # Offer Redis to new apps; only enable it where a redis-server is reachable at REDIS_HOST:REDIS_PORT
+    REDIS_ENABLED: bool = os.getenv("REDIS_ENABLED", str(DB_BACKEND == "redis")).lower() == "true"
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
+    # Connections shared by all Redis-backed apps in a worker; commands beyond the limit wait for a free one
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+    REDIS_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_TIMEOUT_SECONDS", "5"))
+    # Each app's keys live under REDIS_KEY_PREFIX<guid>:, so apps sharing a Redis database can't see each other's data
+    REDIS_KEY_PREFIX: str = os.getenv("REDIS_KEY_PREFIX", "autoapp:")
+    # Keys requested per SCAN call, TYPE commands per pipelined batch, and the most keys listed for the
+    # schema or returned by a KEYS command
+    REDIS_SCAN_COUNT: int = int(os.getenv("REDIS_SCAN_COUNT", "1000"))
+    REDIS_PIPELINE_BATCH: int = int(os.getenv("REDIS_PIPELINE_BATCH", "500"))
+    REDIS_MAX_KEYS: int = int(os.getenv("REDIS_MAX_KEYS", "10000"))
 
     # Server Settings
     SERVER_HOST: str = "0.0.0.0"
@@ -2,9 +2,19 @@ from typing import Any, Dict, List, Optional, Union
 
 
 class DatabaseClient:
+    """A tenant database. Backends may implement the methods as coroutines; TenantDBManager.run awaits those"""
+
     def execute_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
         raise NotImplementedError
 
+    def execute_batch(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute commands as one unit; backends without transactions run them one by one"""
+        return self.execute_commands(commands)
+
+    def read_only(self, command: Dict[str, Any]) -> bool:
+        """True if running the command has no side effects"""
+        raise NotImplementedError
+
     def is_initialized(self) -> bool:
         raise NotImplementedError
 
@@ -12,4 +22,7 @@ class DatabaseClient:
         raise NotImplementedError
 
     def get_schema(self) -> str:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,263 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.settings import settings
+from app.db.query_cache import normalize_query
+from app.utils.logger import logger
+from app.utils.metrics import StatsGauge, registry
+
+# Indexes the advisor owns; it never drops any other index
+ADVISOR_INDEX_PREFIX = "advisor_"
+MAX_SHAPES_PER_TENANT = 256
+MAX_TRACKED_TENANTS = 1024
+MAX_INDEX_COLUMNS = 3
+# Rows ANALYZE samples per index, enough for the planner to weigh a new index
+ANALYSIS_LIMIT = 1000
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+PREDICATE_RE = re.compile(
+    r"(?:(\w+)\.)?\"?(\w+)\"?\s*(<=|>=|==|<|>|=|\bIN\b|\bIS\b|\bBETWEEN\b)\s*(?:(\w+)\.)?(\"?\w+\"?|\?|\()",
+    re.IGNORECASE,
+)
+SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+AUTOMATIC_RE = re.compile(r"^SEARCH (?:TABLE )?(\w+)(?: AS (\w+))? USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \((.*)\)")
+USED_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+RECORDED_RE = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+# Words that can follow a table name in FROM/JOIN without being its alias
+NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "outer", "on", "using", "group", "order",
+    "limit", "having", "union", "except", "intersect", "window", "set", "returning", "indexed", "not",
+}
+EQUALITY_OPS = {"=", "==", "in", "is"}
+
+
+def query_shape(query: str) -> str:
+    """The query with literals replaced by ?, so runs that differ only in values count together"""
+    shape = LITERAL_RE.sub("?", query)
+    return IN_LIST_RE.sub("(?)", normalize_query(shape))
+
+
+def _table_refs(shape: str) -> dict[str, str]:
+    """Map every table name and alias in FROM/JOIN clauses to its table"""
+    refs = {}
+    for table, alias in TABLE_REF_RE.findall(shape):
+        refs[table] = table
+        if alias and alias.lower() not in NOT_ALIASES:
+            refs[alias] = table
+    return refs
+
+
+def _index_columns(shape: str, name: str, table: str, columns: set[str], refs: dict[str, str]) -> list[str]:
+    """Columns of `table` the statement filters or joins on: equality columns first, then one range column"""
+    equality, ranges = [], []
+
+    def add(qualifier: str, column: str, op: str):
+        column = column.strip('"')
+        if column not in columns or (qualifier and refs.get(qualifier) != table and qualifier != name):
+            return
+        target = equality if op.lower() in EQUALITY_OPS else ranges
+        if column not in equality and column not in target:
+            target.append(column)
+
+    for left_qualifier, left, op, right_qualifier, right in PREDICATE_RE.findall(shape):
+        add(left_qualifier, left, op)
+        if right not in ("?", "("):
+            # A join condition: the other side is a column too
+            add(right_qualifier, right, "=" if op in ("=", "==") else op)
+    return (equality + [column for column in ranges if column not in equality][:1])[:MAX_INDEX_COLUMNS]
+
+
+class IndexAdvisor:
+    """Adds indexes for the statements LLM-generated pages keep running as full table scans.
+
+    SqlClient reports every statement it runs. After `review_every` of them
+    on a tenant, the tenant is reviewed on the advisor's own thread: each
+    statement shape seen at least `min_runs` times is checked with EXPLAIN
+    QUERY PLAN, and a table of at least `min_rows` rows that it scans gets
+    an index on the columns it filters or joins on, which is kept only if
+    the plan then uses it. Advisor indexes that no reviewed plan has used
+    for `drop_after` seconds are dropped again.
+    """
+
+    def __init__(self, enabled: bool = settings.INDEX_ADVISOR, review_every: int = settings.INDEX_ADVISOR_REVIEW_EVERY,
+                 min_runs: int = settings.INDEX_ADVISOR_MIN_RUNS, min_rows: int = settings.INDEX_ADVISOR_MIN_ROWS,
+                 max_per_table: int = settings.INDEX_ADVISOR_MAX_PER_TABLE,
+                 drop_after: int = settings.INDEX_ADVISOR_DROP_AFTER_SECONDS):
+        self.enabled = enabled
+        self.review_every = review_every
+        self.min_runs = min_runs
+        self.min_rows = min_rows
+        self.max_per_table = max_per_table
+        self.drop_after = drop_after
+        self.lock = threading.Lock()
+        # db_path -> (statements since the last review, OrderedDict[shape, [runs, example statement]])
+        self.tenants: OrderedDict[str, list] = OrderedDict()
+        # db_path -> {advisor index: last time a reviewed plan used it}
+        self.index_used: dict[str, dict[str, float]] = {}
+        # db_path -> indexes tried that the planner would not use
+        self.not_used: dict[str, set[str]] = {}
+        self.reviewing: set[str] = set()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-advisor")
+        self.reviews = 0
+        self.created = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, client, query: str):
+        """Count a statement run by `client`, scheduling a review of its tenant when one is due"""
+        if not self.enabled or not RECORDED_RE.match(query):
+            return
+        shape = query_shape(query)
+        with self.lock:
+            tenant = self.tenants.get(client.db_path)
+            if tenant is None:
+                tenant = self.tenants[client.db_path] = [0, OrderedDict()]
+                while len(self.tenants) > MAX_TRACKED_TENANTS:
+                    self.tenants.popitem(last=False)
+            else:
+                self.tenants.move_to_end(client.db_path)
+            tenant[0] += 1
+            shapes = tenant[1]
+            entry = shapes.get(shape)
+            if entry is None:
+                shapes[shape] = [1, query]
+                while len(shapes) > MAX_SHAPES_PER_TENANT:
+                    shapes.popitem(last=False)
+            else:
+                entry[0] += 1
+                shapes.move_to_end(shape)
+            if tenant[0] < self.review_every or client.db_path in self.reviewing:
+                return
+            del self.tenants[client.db_path]
+            self.reviewing.add(client.db_path)
+        self.executor.submit(self._review_safely, client, shapes)
+
+    def _review_safely(self, client, shapes: OrderedDict):
+        try:
+            self.review(client, shapes)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Index advisor: review of {client.tenant} failed: {e}")
+        finally:
+            with self.lock:
+                self.reviewing.discard(client.db_path)
+
+    def _plan(self, conn: sqlite3.Connection, statement: str) -> list[str]:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+
+    def review(self, client, shapes: OrderedDict):
+        """Check the recorded statements of one tenant and add or drop its advisor indexes"""
+        self.reviews += 1
+        used = self.index_used.setdefault(client.db_path, {})
+        now = time.time()
+        for shape, (runs, statement) in shapes.items():
+            with client.lock:
+                if client.conn is None or client.file_replaced():
+                    return  # The tenant was closed or archived; its next review starts from fresh traffic
+                conn = client.conn
+                plan = self._plan(conn, statement)
+                for detail in plan:
+                    for index in USED_INDEX_RE.findall(detail):
+                        if index.startswith(ADVISOR_INDEX_PREFIX):
+                            used[index] = now
+                if runs >= self.min_runs:
+                    self._advise(client, conn, shape, statement, runs, plan, used)
+        self._drop_unused(client, used, now)
+
+    def _advise(self, client, conn: sqlite3.Connection, shape: str, statement: str, runs: int, plan: list[str],
+                used: dict[str, float]):
+        refs = _table_refs(shape)
+        row_counts = client.get_row_counts()
+        for detail in plan:
+            scan = SCAN_RE.match(detail)
+            automatic = AUTOMATIC_RE.match(detail)
+            if not scan and not automatic:
+                continue
+            name, alias = (scan or automatic).group(1, 2)
+            name = alias or name
+            table = refs.get(name, name)
+            if row_counts.get(table, 0) < self.min_rows:
+                continue
+            table_columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            if automatic:
+                # SQLite already picked the columns for the index it builds on every run
+                columns = [term.split("=")[0].strip() for term in automatic.group(3).split(" AND ")]
+                columns = [column for column in columns if column in table_columns][:MAX_INDEX_COLUMNS]
+            else:
+                columns = _index_columns(shape, name, table, table_columns, refs)
+            if columns:
+                self._try_index(client, conn, table, columns, shape, statement, runs, used)
+
+    def _try_index(self, client, conn: sqlite3.Connection, table: str, columns: list[str], shape: str,
+                   statement: str, runs: int, used: dict[str, float]):
+        index = f"{ADVISOR_INDEX_PREFIX}{table}_{'_'.join(columns)}"[:120]
+        not_used = self.not_used.setdefault(client.db_path, set())
+        if index in not_used:
+            return
+        existing = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name LIKE ?",
+            (table, f"{ADVISOR_INDEX_PREFIX}%"),
+        )]
+        if index in existing or len(existing) >= self.max_per_table:
+            return
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        start = time.perf_counter()
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{table}" ({column_list})')
+        # Without statistics the planner often prefers the scan it already had, especially in joins
+        conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        conn.commit()
+        if any(index in detail for detail in self._plan(conn, statement)):
+            used[index] = time.time()
+            self.created += 1
+            logger.info(f"Index advisor: created {index} on {table}({', '.join(columns)}) in "
+                        f"{time.perf_counter() - start:.2f}s for {runs} runs of: {shape[:200]}")
+        else:
+            conn.execute(f'DROP INDEX IF EXISTS "{index}"')
+            conn.commit()
+            not_used.add(index)
+            self.rejected += 1
+            logger.info(f"Index advisor: {index} would not be used, not keeping it for: {shape[:200]}")
+
+    def _drop_unused(self, client, used: dict[str, float], now: float):
+        with client.lock:
+            if client.conn is None or client.file_replaced():
+                return
+            conn = client.conn
+            indexes = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE ?", (f"{ADVISOR_INDEX_PREFIX}%",)
+            )]
+            for index in indexes:
+                # An index created before this process started counts as used when first seen
+                last_used = used.setdefault(index, now)
+                if now - last_used <= self.drop_after:
+                    continue
+                conn.execute(f'DROP INDEX IF EXISTS "{index}"')
+                conn.commit()
+                del used[index]
+                self.dropped += 1
+                logger.info(f"Index advisor: dropped {index} on {client.tenant}, unused for {now - last_used:.0f}s")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_tenants": len(self.tenants),
+            "reviews": self.reviews,
+            "created": self.created,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+index_advisor = IndexAdvisor()
+registry.register(StatsGauge("autoapp_index_advisor", "Automatic index advisor", index_advisor.stats))
@@ -0,0 +1,132 @@
+import re
+import threading
+from collections import OrderedDict
+
+from app.config.settings import settings
+from app.utils.metrics import StatsGauge, registry
+
+# Quoted strings and identifiers are kept as written; whitespace runs outside them collapse to one space
+NORMALIZE_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+# SELECTs whose result can change without a write to the database
+VOLATILE_RE = re.compile(
+    r"'now'|\b(?:random|randomblob|current_date|current_time|current_timestamp|changes|total_changes|"
+    r"last_insert_rowid)\b",
+    re.IGNORECASE,
+)
+# Rough per-row and per-value overhead of the Python objects holding a result
+ROW_OVERHEAD = 56
+VALUE_OVERHEAD = 16
+
+
+def normalize_query(query: str) -> str:
+    """The query with insignificant whitespace and a trailing semicolon removed"""
+    return NORMALIZE_RE.sub(lambda m: m.group(1) or " ", query).strip().rstrip(";").rstrip()
+
+
+def is_cacheable(query: str) -> bool:
+    return VOLATILE_RE.search(query) is None
+
+
+def result_size(rows: list) -> int:
+    """Approximate memory held by a fetchall() result"""
+    size = 0
+    for row in rows:
+        size += ROW_OVERHEAD
+        for value in row:
+            size += VALUE_OVERHEAD + (len(value) if isinstance(value, (str, bytes)) else 8)
+    return size
+
+
+class QueryCache:
+    """SELECT results shared by all tenant databases, bounded in memory.
+
+    Each tenant's entries are tagged with the version of its data they were
+    read at; the first lookup at a newer version drops them all. A tenant
+    holds at most `tenant_max_bytes`, evicting its own least recently used
+    results, and when the cache as a whole is full the tenant using the most
+    memory gives up entries first, so a few heavy tenants cannot push
+    everyone else out.
+    """
+
+    def __init__(self, max_bytes: int = settings.QUERY_CACHE_MAX_BYTES,
+                 tenant_max_bytes: int = settings.QUERY_CACHE_TENANT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.tenant_max_bytes = min(tenant_max_bytes, max_bytes)
+        # tenant -> (version, OrderedDict[query, (rows, size)])
+        self.tenants: dict[str, tuple[tuple, OrderedDict]] = {}
+        self.tenant_bytes: dict[str, int] = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entries(self, tenant: str, version: tuple) -> OrderedDict:
+        """The tenant's entries at `version`, dropping any read at an older one"""
+        current = self.tenants.get(tenant)
+        if current is not None and current[0] == version:
+            return current[1]
+        if current is not None:
+            self._drop_tenant(tenant)
+        entries = OrderedDict()
+        self.tenants[tenant] = (version, entries)
+        self.tenant_bytes[tenant] = 0
+        return entries
+
+    def _drop_tenant(self, tenant: str):
+        self.tenants.pop(tenant, None)
+        self.total_bytes -= self.tenant_bytes.pop(tenant, 0)
+
+    def _evict_one(self, tenant: str):
+        entries = self.tenants[tenant][1]
+        _, (_, size) = entries.popitem(last=False)
+        self.tenant_bytes[tenant] -= size
+        self.total_bytes -= size
+        self.evictions += 1
+
+    def get(self, tenant: str, version: tuple, query: str) -> list | None:
+        with self.lock:
+            entry = self._entries(tenant, version).get(query)
+            if entry is None:
+                return None
+            self.tenants[tenant][1].move_to_end(query)
+            return entry[0].copy()
+
+    def put(self, tenant: str, version: tuple, query: str, rows: list):
+        size = result_size(rows) + len(query)
+        if size > self.tenant_max_bytes:
+            return
+        with self.lock:
+            entries = self._entries(tenant, version)
+            previous = entries.pop(query, None)
+            if previous is not None:
+                self.tenant_bytes[tenant] -= previous[1]
+                self.total_bytes -= previous[1]
+            while self.tenant_bytes[tenant] + size > self.tenant_max_bytes:
+                self._evict_one(tenant)
+            entries[query] = (rows.copy(), size)
+            self.tenant_bytes[tenant] += size
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._evict_one(max(self.tenant_bytes, key=self.tenant_bytes.get))
+
+    def invalidate(self, tenant: str):
+        """Forget a tenant's results, e.g. when its connection closes and its versions restart"""
+        with self.lock:
+            self._drop_tenant(tenant)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "entries": sum(len(entries) for _, entries in self.tenants.values()),
+                "tenants": len(self.tenants),
+                "evictions": self.evictions,
+            }
+
+
+query_cache = QueryCache()
+registry.register(StatsGauge("autoapp_query_cache", "Tenant SELECT result cache", query_cache.stats))
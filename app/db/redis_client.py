@@ -1,81 +1,287 @@
-import redis
-from typing import Any, Dict, List, Optional, Union
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+import redis.asyncio
+
+from app.db import DatabaseClient
 from app.config.settings import settings
 from app.utils.logger import logger
+from app.utils.metrics import redis_seconds, request_kind, tenant_label
 
+# Keys the app keeps for itself inside each tenant's namespace; never listed to the LLM
+INTERNAL_KEY_PREFIX = "_autoapp:"
+INITIALIZED_KEY = f"{INTERNAL_KEY_PREFIX}initialized"
+# Incremented by every write, so cached key summaries know when to rebuild
+VERSION_KEY = f"{INTERNAL_KEY_PREFIX}version"
 
-class RedisClient:
-    def __init__(self):
-        self.client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-            decode_responses=True,
-        )
+# Which arguments of an allowed command are key names: the first n, all of them, every other one
+# from the first (MSET), or (n, NUMKEYS): n keys followed by a count and that many more keys (ZUNIONSTORE)
+ALL = "all"
+PAIRS = "pairs"
+NUMKEYS = "numkeys"
 
-    def execute_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Execute multiple Redis commands and return results"""
-        results = {}
-        for cmd in commands:
-            command = cmd.get("command", "").upper()
-            args = cmd.get("args", [])
-            key = args[0] if args else None
-
-            try:
-                result = self.client.execute_command(command, *args)
-
-                # Handle different return types
-                if isinstance(result, bytes):
-                    result = result.decode("utf-8")
-                elif isinstance(result, (list, set)):
-                    result = [
-                        item.decode("utf-8") if isinstance(item, bytes) else item
-                        for item in result
-                    ]
-
-                # For HGETALL, convert to dict with decoded values
-                if command == "HGETALL" and isinstance(result, dict):
-                    result = {
-                        k.decode("utf-8") if isinstance(k, bytes) else k: (
-                            v.decode("utf-8") if isinstance(v, bytes) else v
-                        )
-                        for k, v in result.items()
-                    }
-
-                results[key] = result
-
-            except Exception as e:
-                logger.error(f"Redis command failed: {command} {args} - {str(e)}")
-                results[key] = {"error": str(e)}
+READ_COMMANDS = {
+    "GET": 1, "MGET": ALL, "STRLEN": 1, "GETRANGE": 1, "EXISTS": ALL, "TYPE": 1, "TTL": 1, "PTTL": 1,
+    "HGET": 1, "HMGET": 1, "HGETALL": 1, "HEXISTS": 1, "HKEYS": 1, "HVALS": 1, "HLEN": 1, "HSTRLEN": 1,
+    "LRANGE": 1, "LLEN": 1, "LINDEX": 1, "LPOS": 1,
+    "SMEMBERS": 1, "SISMEMBER": 1, "SMISMEMBER": 1, "SCARD": 1, "SRANDMEMBER": 1,
+    "SINTER": ALL, "SUNION": ALL, "SDIFF": ALL, "SINTERCARD": (0, NUMKEYS),
+    "ZRANGE": 1, "ZREVRANGE": 1, "ZRANGEBYSCORE": 1, "ZREVRANGEBYSCORE": 1, "ZRANGEBYLEX": 1,
+    "ZREVRANGEBYLEX": 1, "ZSCORE": 1, "ZMSCORE": 1, "ZCARD": 1, "ZCOUNT": 1, "ZLEXCOUNT": 1, "ZRANK": 1,
+    "ZREVRANK": 1, "ZRANDMEMBER": 1, "ZUNION": (0, NUMKEYS), "ZINTER": (0, NUMKEYS), "ZDIFF": (0, NUMKEYS),
+    "PFCOUNT": ALL,
+}
+WRITE_COMMANDS = {
+    "SET": 1, "SETNX": 1, "SETEX": 1, "PSETEX": 1, "GETSET": 1, "GETDEL": 1, "MSET": PAIRS, "MSETNX": PAIRS,
+    "INCR": 1, "INCRBY": 1, "INCRBYFLOAT": 1, "DECR": 1, "DECRBY": 1, "APPEND": 1, "SETRANGE": 1,
+    "DEL": ALL, "UNLINK": ALL, "EXPIRE": 1, "PEXPIRE": 1, "EXPIREAT": 1, "PERSIST": 1, "RENAME": 2, "RENAMENX": 2,
+    "HSET": 1, "HMSET": 1, "HSETNX": 1, "HDEL": 1, "HINCRBY": 1, "HINCRBYFLOAT": 1,
+    "LPUSH": 1, "RPUSH": 1, "LPUSHX": 1, "RPUSHX": 1, "LPOP": 1, "RPOP": 1, "LSET": 1, "LREM": 1, "LTRIM": 1,
+    "LINSERT": 1, "RPOPLPUSH": 2, "LMOVE": 2,
+    "SADD": 1, "SREM": 1, "SPOP": 1, "SMOVE": 2, "SINTERSTORE": ALL, "SUNIONSTORE": ALL, "SDIFFSTORE": ALL,
+    "ZADD": 1, "ZREM": 1, "ZINCRBY": 1, "ZREMRANGEBYSCORE": 1, "ZREMRANGEBYRANK": 1, "ZREMRANGEBYLEX": 1,
+    "ZPOPMIN": 1, "ZPOPMAX": 1, "ZUNIONSTORE": (1, NUMKEYS), "ZINTERSTORE": (1, NUMKEYS),
+    "ZDIFFSTORE": (1, NUMKEYS), "ZRANGESTORE": 2,
+    "PFADD": 1, "PFMERGE": ALL,
+}
+# KEYS is answered with SCAN over the tenant's namespace rather than sent to Redis
+SCANNED_COMMANDS = {"KEYS"}
 
-        return results
+GLOB_SPECIAL_RE = re.compile(r"([*?\[\]\\])")
+# A key segment after the first that holds an id, e.g. the 42 in post:42:comments
+ID_SEGMENT_RE = re.compile(r"^[\w.-]*\d[\w.-]*$")
 
-    def is_initialized(self) -> bool:
-        """Check if the database has been initialized"""
-        return bool(self.client.exists("db:initialized"))
+# Connections shared by every tenant's client in this worker
+redis_pool = redis.asyncio.BlockingConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_TIMEOUT_SECONDS,
+    socket_timeout=settings.REDIS_TIMEOUT_SECONDS,
+    socket_connect_timeout=settings.REDIS_TIMEOUT_SECONDS,
+    decode_responses=True,
+)
 
-    def mark_initialized(self) -> None:
-        """Mark the database as initialized"""
-        self.client.set("db:initialized", "true")
 
-    def get_all_keys(self) -> List[str]:
-        """Get all keys in the database"""
-        keys = self.client.keys("*")
-        keys.remove(settings.DATA_MODEL_KEY)
+async def close_redis() -> None:
+    """Close the pooled Redis connections"""
+    await redis_pool.disconnect()
+
+
+def key_positions(spec, args: list) -> List[int]:
+    """Indexes of the arguments that are key names, for a command's entry in READ_COMMANDS or WRITE_COMMANDS"""
+    if spec == ALL:
+        return list(range(len(args)))
+    if spec == PAIRS:
+        return list(range(0, len(args), 2))
+    if isinstance(spec, tuple):
+        leading = spec[0]
+        try:
+            count = int(args[leading])
+        except (IndexError, ValueError):
+            raise ValueError(f"expected a key count at argument {leading + 1}")
+        return list(range(leading)) + list(range(leading + 1, min(leading + 1 + count, len(args))))
+    return list(range(min(spec, len(args))))
+
+
+def key_pattern(key: str) -> str:
+    """The key with its id segments replaced by *, so keys of the same kind are listed together"""
+    first, *rest = key.split(":")
+    return ":".join([first] + ["*" if ID_SEGMENT_RE.match(segment) else segment for segment in rest])
+
+
+def _arg(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _name(cmd: Dict[str, Any]) -> str:
+    """The key of a command's result: its name, or else its first argument"""
+    args = cmd.get("args", [])
+    return cmd.get("name") or (str(args[0]) if args else str(cmd.get("command", "")))
+
+
+def _result(value: Any) -> Any:
+    # Sets come back unordered; sort them so a page renders the same way every time
+    return sorted(value) if isinstance(value, set) else value
+
+
+class RedisClient(DatabaseClient):
+    """One app's keys in a shared Redis database, namespaced under REDIS_KEY_PREFIX<guid>:.
+
+    Commands run on the pooled async connections, each command list in one
+    pipelined round trip, or one MULTI/EXEC transaction for `execute_batch`.
+    Only the commands in READ_COMMANDS and WRITE_COMMANDS are allowed, so
+    every key a command touches can be moved into the namespace. Keys are
+    listed with SCAN and their types read in pipelined batches, and the
+    resulting summary is cached until a write bumps the tenant's version key.
+    """
+
+    init_prompt_template = settings.REDIS_INIT_PROMPT_TEMPLATE
+    response_prompt = settings.REDIS_RESPONSE_PROMPT
+
+    def __init__(self, guid: str, pool: redis.asyncio.ConnectionPool = redis_pool):
+        self.tenant = guid
+        self.namespace = f"{settings.REDIS_KEY_PREFIX}{guid}:"
+        self.redis = redis.asyncio.Redis(connection_pool=pool)
+        # (version, data model, {(pattern, type): key count}, whether the scan stopped at REDIS_MAX_KEYS)
+        self._summary = None
+
+    def _key(self, key: str) -> str:
+        return self.namespace + key
+
+    def _command(self, cmd: Dict[str, Any]) -> Tuple[str, list]:
+        """The command name and its arguments with key names moved into the namespace"""
+        command = str(cmd.get("command", "")).upper()
+        args = [_arg(arg) for arg in cmd.get("args", [])]
+        if command in SCANNED_COMMANDS:
+            return command, args
+        spec = READ_COMMANDS.get(command, WRITE_COMMANDS.get(command))
+        if spec is None:
+            raise ValueError(f"Redis command {command or '(none)'} is not allowed")
+        for position in key_positions(spec, args):
+            args[position] = self._key(args[position])
+        return command, args
+
+    def read_only(self, command: Dict[str, Any]) -> bool:
+        name = str(command.get("command", "")).upper()
+        return name in READ_COMMANDS or name in SCANNED_COMMANDS
+
+    async def _scan(self, pattern: str = "*", limit: int = settings.REDIS_MAX_KEYS) -> List[str]:
+        """Up to `limit` of the tenant's keys matching a glob pattern, without the namespace"""
+        match = GLOB_SPECIAL_RE.sub(r"\\\1", self.namespace) + pattern
+        keys = []
+        async for key in self.redis.scan_iter(match=match, count=settings.REDIS_SCAN_COUNT):
+            key = key[len(self.namespace):]
+            if key.startswith(INTERNAL_KEY_PREFIX):
+                continue
+            keys.append(key)
+            if len(keys) >= limit:
+                break
         return keys
 
-    def get_key_type(self, key: str) -> str:
-        """Get the type of a key"""
-        return self.client.type(key)
+    async def _run_pipeline(self, pipe, queued: List[Tuple[str, str, list]], results: Dict[str, Any], writes: bool):
+        if not queued:
+            return
+        if writes:
+            pipe.incr(self._key(VERSION_KEY))
+        replies = await pipe.execute(raise_on_error=False)
+        for (name, command, args), reply in zip(queued, replies):
+            if isinstance(reply, Exception):
+                logger.error(f"Redis command failed: {command} {args} - {reply}")
+                results[name] = {"error": str(reply)}
+            else:
+                results[name] = _result(reply)
+        queued.clear()
+
+    async def execute_commands(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute multiple Redis commands and return results.
+
+        The commands are pipelined in order in one round trip; a KEYS command
+        first sends the commands before it, then scans. A command that is not
+        allowed or fails gets {"error": ...} as its result.
+        """
+        results = {}
+        with redis_seconds.time(tenant=tenant_label(self.tenant), kind=request_kind.get()):
+            pipe = self.redis.pipeline(transaction=False)
+            queued = []
+            writes = False
+            for cmd in commands:
+                name = _name(cmd)
+                try:
+                    command, args = self._command(cmd)
+                except ValueError as e:
+                    logger.error(f"Redis command rejected: {cmd} - {e}")
+                    results[name] = {"error": str(e)}
+                    continue
+                if command in SCANNED_COMMANDS:
+                    await self._run_pipeline(pipe, queued, results, writes)
+                    writes = False
+                    results[name] = await self._scan(args[0] if args else "*")
+                    continue
+                pipe.execute_command(command, *args)
+                queued.append((name, command, args))
+                writes = writes or command in WRITE_COMMANDS
+            await self._run_pipeline(pipe, queued, results, writes)
+        return results
 
-    def get_schema(self) -> str:
-        """Get all keys in the database with their types"""
-        schema = self.client.get('schema')
-        keys = self.get_all_keys()
-        key_types = {key: self.get_key_type(key) for key in keys}
-        key_str = "\nThe current keys are: " + ",".join([f"{key} ({value})" for key, value in key_types.items()])
-        return schema + key_str
+    async def execute_batch(self, commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute a batch of commands as one MULTI/EXEC transaction.
 
+        Used for bulk loads such as the LLM-generated sample data. Nothing is
+        sent if any command is not allowed; Redis has no rollback, so a
+        command that fails inside the transaction raises without undoing the others.
+        """
+        names, queued = [], []
+        for cmd in commands:
+            command, args = self._command(cmd)
+            if command in SCANNED_COMMANDS:
+                raise ValueError(f"Redis command {command} can't run in a transaction")
+            names.append(_name(cmd))
+            queued.append((command, args))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for command, args in queued:
+                pipe.execute_command(command, *args)
+            pipe.incr(self._key(VERSION_KEY))
+            replies = await pipe.execute()
+        return {name: _result(reply) for name, reply in zip(names, replies)}
+
+    async def _key_summary(self) -> tuple:
+        """(data model, {(pattern, type): count}, truncated), rebuilt only after a write"""
+        version, data_model = await self.redis.mget(self._key(VERSION_KEY), self._key(settings.DATA_MODEL_KEY))
+        if self._summary is not None and self._summary[0] == version:
+            return self._summary[1:]
+        keys = await self._scan(limit=settings.REDIS_MAX_KEYS + 1)
+        truncated = len(keys) > settings.REDIS_MAX_KEYS
+        keys = [key for key in keys[:settings.REDIS_MAX_KEYS] if key != settings.DATA_MODEL_KEY]
+        counts = {}
+        batch_size = settings.REDIS_PIPELINE_BATCH
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            pipe = self.redis.pipeline(transaction=False)
+            for key in batch:
+                pipe.type(self._key(key))
+            for key, key_type in zip(batch, await pipe.execute()):
+                if key_type != "none":  # Expired or deleted since the scan
+                    shape = (key_pattern(key), key_type)
+                    counts[shape] = counts.get(shape, 0) + 1
+        self._summary = (version, data_model or "", dict(sorted(counts.items())), truncated)
+        return self._summary[1:]
+
+    async def get_row_counts(self) -> Dict[str, int]:
+        """Number of keys of each pattern and type"""
+        _, counts, _ = await self._key_summary()
+        return {f"{pattern} ({key_type})": count for (pattern, key_type), count in counts.items()}
+
+    async def get_schema(self, compact: bool | None = None, row_counts: bool = True) -> str:
+        """Return the data model description and the tenant's key patterns with their types as text for the prompt"""
+        data_model, counts, truncated = await self._key_summary()
+        lines = []
+        for (pattern, key_type), count in counts.items():
+            line = f"{pattern} ({key_type})"
+            if row_counts:
+                line += f" -- {count} keys"
+            lines.append(line)
+        if truncated:
+            lines.append(f"(only the first {settings.REDIS_MAX_KEYS} keys are listed)")
+        return data_model + "\nThe current keys are:\n" + "\n".join(lines)
+
+    async def get_schema_hash(self) -> str:
+        """Return a fingerprint of the data model and the key patterns and types"""
+        data_model, counts, _ = await self._key_summary()
+        definitions = "\n".join([data_model] + [f"{pattern} {key_type}" for pattern, key_type in counts])
+        return hashlib.sha256(definitions.encode()).hexdigest()
+
+    async def is_initialized(self) -> bool:
+        """Check if the database has been initialized"""
+        return bool(await self.redis.exists(self._key(INITIALIZED_KEY)))
+
+    async def mark_initialized(self) -> None:
+        """Mark the database as initialized"""
+        await self.redis.set(self._key(INITIALIZED_KEY), "true")
 
-# Create global Redis client instance
-redis_client = RedisClient()
+    def close(self) -> None:
+        """Drop the cached key summary; the pooled connections stay open for other tenants"""
+        self._summary = None
@@ -1,19 +1,63 @@
+import asyncio
+import json
 import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from app.utils.logger import logger
 from app.config.settings import settings
 
 SETTINGS_TABLE_NAME = "app_settings"
 PAGE_INSTRUCTIONS_TABLE_NAME = "page_instructions"
 GENERATED_TEMPLATES_TABLE_NAME = "generated_templates"
+GENERATED_PAGES_TABLE_NAME = "generated_pages"
+APP_INIT_TABLE_NAME = "app_init"
+
+# Initialization states; an app is served once it is ready
+INIT_PENDING = "pending"
+INIT_RUNNING = "running"
+INIT_READY = "ready"
+INIT_FAILED = "failed"
+
+# Default for update's replay_ttl: regenerating a page keeps the lifetime set in the page settings
+UNCHANGED = object()
+
+# Settings, page instructions and the current/referring page templates in one statement
+GET_SETTINGS_QUERY = f"""
+    SELECT s.application_type, s.prompt_template, p.page_instructions, p.replay_ttl, t.template, r.template
+    FROM (SELECT application_type, prompt_template FROM {SETTINGS_TABLE_NAME} WHERE guid = :guid
+          ORDER BY rowid DESC LIMIT 1) s
+    LEFT JOIN {PAGE_INSTRUCTIONS_TABLE_NAME} p ON p.page_path = :page_path AND p.guid = :guid
+    LEFT JOIN {GENERATED_TEMPLATES_TABLE_NAME} t ON t.guid = :guid AND t.page_path = :page_path
+    LEFT JOIN {GENERATED_TEMPLATES_TABLE_NAME} r ON r.guid = :guid AND r.page_path = :referring_page
+"""
+
 
 class SettingsDBClient:
-    def __init__(self, db_path: str = settings.SQLITE_SETTINGS_DB_PATH):
+    """Settings store backed by one long-lived SQLite connection.
+
+    All database work runs on a single dedicated thread so callers on the
+    event loop never block on disk I/O, and results of `get` are cached per
+    guid until `update` or `clear_templates` touches that guid. Other
+    processes (uvicorn workers) write to the same file, so the whole cache is
+    dropped whenever `PRAGMA data_version` shows a write from another connection.
+    """
+
+    def __init__(self, db_path: str = settings.SQLITE_SETTINGS_DB_PATH, cache_size: int = settings.SETTINGS_CACHE_SIZE):
         self.db_path = db_path
         self.conn = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="settings-db")
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, dict] = OrderedDict()
+        self.versions: dict[str, int] = {}
+        self.data_version = None  # data_version the cached results were read at
 
     def _connect(self):
         if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
         return self.conn
 
     def _close(self):
@@ -21,7 +65,38 @@ class SettingsDBClient:
             self.conn.close()
             self.conn = None
 
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking database call on the settings DB thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def close(self):
+        await self._run(self._close)
+
+    def _data_version(self) -> int:
+        """Changes whenever another connection, e.g. in another worker, commits to the database"""
+        return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self, data_version: int):
+        if data_version != self.data_version:
+            self.cache.clear()
+            self.data_version = data_version
+
+    def _invalidate(self, guid: str):
+        self.cache.pop(guid, None)
+        self.versions[guid] = self.versions.get(guid, 0) + 1
+
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, declaration: str):
+        """Add a column to an existing table if an older database lacks it"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
     async def initialize_db(self):
+        await self._run(self._initialize_db)
+
+    def _initialize_db(self):
         conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(f"""
@@ -31,73 +106,144 @@ class SettingsDBClient:
                 guid TEXT
             )
         """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{SETTINGS_TABLE_NAME}_guid ON {SETTINGS_TABLE_NAME} (guid)")
+        self._create_page_instructions(cursor)
         cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {PAGE_INSTRUCTIONS_TABLE_NAME} (
-                page_path TEXT PRIMARY KEY,
-                page_instructions TEXT,
-                guid TEXT
+            CREATE TABLE IF NOT EXISTS {GENERATED_TEMPLATES_TABLE_NAME} (
+                guid TEXT,
+                page_path TEXT,
+                template TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (guid, page_path)
             )
         """)
         cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {GENERATED_TEMPLATES_TABLE_NAME} (
+            CREATE TABLE IF NOT EXISTS {GENERATED_PAGES_TABLE_NAME} (
                 guid TEXT,
                 page_path TEXT,
+                commands TEXT,
                 template TEXT,
+                css TEXT,
+                js TEXT,
+                schema_hash TEXT,
+                expires_at REAL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (guid, page_path)
             )
         """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {APP_INIT_TABLE_NAME} (
+                guid TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                owner TEXT,
+                lease_expires_at REAL,
+                progress TEXT,
+                error TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._ensure_column(cursor, PAGE_INSTRUCTIONS_TABLE_NAME, "replay_ttl", "INTEGER")
+        self._ensure_column(cursor, APP_INIT_TABLE_NAME, "db_backend", "TEXT")
+        self._migrate_page_instructions_key(cursor)
         conn.commit()
-        self._close()
 
-    def get(self, guid: str, page_path: str, referring_page: str | None = None) -> dict[str, str] | None:
+    @staticmethod
+    def _create_page_instructions(cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PAGE_INSTRUCTIONS_TABLE_NAME} (
+                page_path TEXT,
+                page_instructions TEXT,
+                guid TEXT,
+                replay_ttl INTEGER,
+                PRIMARY KEY (page_path, guid)
+            )
+        """)
+
+    def _migrate_page_instructions_key(self, cursor):
+        """Older databases key page_instructions by page_path alone, so apps overwrote each other's pages"""
+        cursor.execute("BEGIN IMMEDIATE")  # Other workers starting up wait until the table is rekeyed
+        cursor.execute(f"PRAGMA table_info({PAGE_INSTRUCTIONS_TABLE_NAME})")
+        key = [row[1] for row in sorted(cursor.fetchall(), key=lambda row: row[5]) if row[5]]
+        if key == ["page_path", "guid"]:
+            return
+        logger.info(f"Rekeying {PAGE_INSTRUCTIONS_TABLE_NAME} by page_path and guid")
+        cursor.execute(f"ALTER TABLE {PAGE_INSTRUCTIONS_TABLE_NAME} RENAME TO {PAGE_INSTRUCTIONS_TABLE_NAME}_old")
+        self._create_page_instructions(cursor)
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO {PAGE_INSTRUCTIONS_TABLE_NAME} (page_path, page_instructions, guid, replay_ttl)
+            SELECT page_path, page_instructions, guid, replay_ttl FROM {PAGE_INSTRUCTIONS_TABLE_NAME}_old
+        """)
+        cursor.execute(f"DROP TABLE {PAGE_INSTRUCTIONS_TABLE_NAME}_old")
+
+    async def get(self, guid: str, page_path: str, referring_page: str | None = None) -> dict[str, str] | None:
+        key = (page_path, referring_page)
+        if self.cache_size > 0:
+            self._check_data_version(await self._run(self._data_version))
+        pages = self.cache.get(guid)
+        if pages is not None and key in pages:
+            self.cache.move_to_end(guid)
+            result = pages[key]
+            return dict(result) if result else None
+
+        version = self.versions.get(guid, 0)
+        data_version, result = await self._run(self._get, guid, page_path, referring_page)
+        # Skip caching if an update for this guid, here or in another worker, landed while we were reading
+        if self.cache_size > 0 and self.versions.get(guid, 0) == version and data_version == self.data_version:
+            self.cache.setdefault(guid, {})[key] = result
+            self.cache.move_to_end(guid)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(result) if result else None
+
+    def _get(self, guid: str, page_path: str, referring_page: str | None) -> tuple[int, dict[str, str] | None]:
+        """The settings row, with the data_version read just before it"""
         conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT application_type, prompt_template, guid FROM {SETTINGS_TABLE_NAME} WHERE guid = ? LIMIT 1", (guid,))
-        settings_row = cursor.fetchone()
-        cursor.execute(f"SELECT page_instructions FROM {PAGE_INSTRUCTIONS_TABLE_NAME} WHERE page_path = ? AND guid = ? LIMIT 1", (page_path, guid))
-        page_instructions_row = cursor.fetchone()
-        
-        # First try to get template for current page
-        cursor.execute(f"SELECT template FROM {GENERATED_TEMPLATES_TABLE_NAME} WHERE guid = ? AND page_path = ? ORDER BY created_at DESC LIMIT 1", (guid, page_path))
-        template_row = cursor.fetchone()
+        data_version = self._data_version()
+        row = conn.execute(GET_SETTINGS_QUERY, {
+            "guid": guid, "page_path": page_path, "referring_page": referring_page,
+        }).fetchone()
+        if not row:
+            return data_version, None
+
+        application_type, prompt_template, page_instructions, replay_ttl, template, referring_template = row
+
+        # Fall back to the referring page's template if this page has none yet
         using_referring_page = False
-        
-        # If no template found and referring page is provided, try to get template from referring page
-        if not template_row and referring_page:
-            cursor.execute(f"SELECT template FROM {GENERATED_TEMPLATES_TABLE_NAME} WHERE guid = ? AND page_path = ? ORDER BY created_at DESC LIMIT 1", (guid, referring_page))
-            template_row = cursor.fetchone()
+        if template is None and referring_page:
+            template = referring_template
             using_referring_page = True
-            
 
-        if not page_instructions_row:
-            page_instructions_row = [""]
-        if not template_row:
-            template_row = [""]
-        if not settings_row:
-            return None
-        self._close()
-        return {
-            "application_type": settings_row[0], 
-            "prompt_template": settings_row[1], 
-            "page_instructions": page_instructions_row[0],
-            "generated_template": template_row[0],
+        return data_version, {
+            "application_type": application_type,
+            "prompt_template": prompt_template,
+            "page_instructions": page_instructions or "",
+            "replay_ttl": replay_ttl,
+            "generated_template": template or "",
             "guid": guid,
-            "using_referring_page": using_referring_page    
+            "using_referring_page": using_referring_page
         }
 
-    def update(self, guid: str, application_type: str, prompt_template: str, page_instructions: str, page_path: str, generated_template: str = None):
+    async def update(self, guid: str, application_type: str, prompt_template: str, page_instructions: str, page_path: str, generated_template: str = None, replay_ttl: int | None = UNCHANGED):
+        await self._run(self._update, guid, application_type, prompt_template, page_instructions, page_path, generated_template, replay_ttl)
+        self._invalidate(guid)
+
+    def _update(self, guid: str, application_type: str, prompt_template: str, page_instructions: str, page_path: str, generated_template: str, replay_ttl: int | None):
         conn = self._connect()
         cursor = conn.cursor()
         try:
+            # app_settings has no key on guid, so REPLACE alone would add a row per update
+            cursor.execute(f"DELETE FROM {SETTINGS_TABLE_NAME} WHERE guid = ?", (guid,))
             cursor.execute(f"""
-                REPLACE INTO {SETTINGS_TABLE_NAME} (application_type, prompt_template, guid)
+                INSERT INTO {SETTINGS_TABLE_NAME} (application_type, prompt_template, guid)
                 VALUES (?, ?, ?)
             """, (application_type, prompt_template, guid))
+            keep_ttl = replay_ttl is UNCHANGED
             cursor.execute(f"""
-                REPLACE INTO {PAGE_INSTRUCTIONS_TABLE_NAME} (page_path, page_instructions, guid)
-                VALUES (?, ?, ?)
-            """, (page_path, page_instructions, guid))
+                INSERT INTO {PAGE_INSTRUCTIONS_TABLE_NAME} (page_path, page_instructions, guid, replay_ttl)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (page_path, guid) DO UPDATE SET page_instructions = excluded.page_instructions
+                {"" if keep_ttl else ", replay_ttl = excluded.replay_ttl"}
+            """, (page_path, page_instructions, guid, None if keep_ttl else replay_ttl))
             if generated_template:
                 cursor.execute(f"""
                     REPLACE INTO {GENERATED_TEMPLATES_TABLE_NAME} (guid, page_path, template)
@@ -107,29 +253,223 @@ class SettingsDBClient:
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
             conn.rollback() # Rollback in case of error
-        finally:
-            self._close()
 
-    def clear_templates(self, guid: str, page_path: str = None):
-        """Clear all generated templates for a given guid, optionally filtered by page_path"""
+    async def clear_templates(self, guid: str, page_path: str = None):
+        """Clear all generated templates and stored pages for a given guid, optionally filtered by page_path"""
+        await self._run(self._clear_templates, guid, page_path)
+        self._invalidate(guid)
+
+    def _clear_templates(self, guid: str, page_path: str | None):
         conn = self._connect()
         cursor = conn.cursor()
         try:
-            if page_path:
-                cursor.execute(f"""
-                    DELETE FROM {GENERATED_TEMPLATES_TABLE_NAME}
-                    WHERE guid = ? AND page_path = ?
-                """, (guid, page_path))
-            else:
-                cursor.execute(f"""
-                    DELETE FROM {GENERATED_TEMPLATES_TABLE_NAME}
-                    WHERE guid = ?
-                """, (guid,))
+            for table in (GENERATED_TEMPLATES_TABLE_NAME, GENERATED_PAGES_TABLE_NAME):
+                if page_path:
+                    cursor.execute(f"""
+                        DELETE FROM {table}
+                        WHERE guid = ? AND page_path = ?
+                    """, (guid, page_path))
+                else:
+                    cursor.execute(f"""
+                        DELETE FROM {table}
+                        WHERE guid = ?
+                    """, (guid,))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Database error: {e}")
+            conn.rollback()
+
+    async def save_page(self, guid: str, page_path: str, commands: list, template: str, css: str, js: str,
+                        schema_hash: str, ttl_seconds: int | None = None):
+        """Store a complete LLM page response so later GETs can be replayed without the LLM"""
+        await self._run(self._save_page, guid, page_path, commands, template, css, js, schema_hash, ttl_seconds)
+
+    def _save_page(self, guid: str, page_path: str, commands: list, template: str, css: str, js: str,
+                   schema_hash: str, ttl_seconds: int | None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                REPLACE INTO {GENERATED_PAGES_TABLE_NAME} (guid, page_path, commands, template, css, js, schema_hash, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (guid, page_path, json.dumps(commands), template, css, js, schema_hash, expires_at))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Database error: {e}")
+            conn.rollback()
+
+    async def get_page(self, guid: str, page_path: str, schema_hash: str) -> dict | None:
+        """Return the stored page response, or None if missing, expired or built for another schema"""
+        return await self._run(self._get_page, guid, page_path, schema_hash)
+
+    def _get_page(self, guid: str, page_path: str, schema_hash: str) -> dict | None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT commands, template, css, js, schema_hash, expires_at FROM {GENERATED_PAGES_TABLE_NAME}
+            WHERE guid = ? AND page_path = ?
+        """, (guid, page_path))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if row[4] != schema_hash or (row[5] is not None and row[5] < time.time()):
+            cursor.execute(f"DELETE FROM {GENERATED_PAGES_TABLE_NAME} WHERE guid = ? AND page_path = ?", (guid, page_path))
+            conn.commit()
+            return None
+        return {
+            "commands": json.loads(row[0]),
+            "template": row[1],
+            "css": row[2],
+            "js": row[3],
+        }
+
+    async def clear_page(self, guid: str, page_path: str):
+        """Drop the stored page response for one page so the next GET regenerates it"""
+        await self._run(self._clear_page, guid, page_path)
+
+    def _clear_page(self, guid: str, page_path: str):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM {GENERATED_PAGES_TABLE_NAME} WHERE guid = ? AND page_path = ?", (guid, page_path))
             conn.commit()
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
             conn.rollback()
-        finally:
-            self._close()
 
-settings_db_client = SettingsDBClient(settings.SQLITE_SETTINGS_DB_PATH)
\ No newline at end of file
+    async def take_pages(self, guid: str) -> tuple[list[str], list[tuple]]:
+        """Remove and return every stored page of an app as (columns, rows), e.g. to archive them with its database"""
+        return await self._run(self._take_pages, guid)
+
+    def _take_pages(self, guid: str) -> tuple[list[str], list[tuple]]:
+        conn = self._connect()
+        cursor = conn.execute(f"SELECT * FROM {GENERATED_PAGES_TABLE_NAME} WHERE guid = ?", (guid,))
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        conn.execute(f"DELETE FROM {GENERATED_PAGES_TABLE_NAME} WHERE guid = ?", (guid,))
+        conn.commit()
+        return columns, rows
+
+    async def put_pages(self, columns: list[str], rows: list[tuple]):
+        """Store pages returned by `take_pages` again"""
+        await self._run(self._put_pages, columns, rows)
+
+    def _put_pages(self, columns: list[str], rows: list[tuple]):
+        if not rows:
+            return
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {GENERATED_PAGES_TABLE_NAME} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            rows,
+        )
+        conn.commit()
+
+    async def templates(self, after: int = 0, limit: int = 500) -> list[tuple[int, str]]:
+        """The next `limit` generated templates as (rowid, template), for reading them all a page at a time"""
+        return await self._run(self._templates, after, limit)
+
+    def _templates(self, after: int, limit: int) -> list[tuple[int, str]]:
+        conn = self._connect()
+        return conn.execute(
+            f"SELECT rowid, template FROM {GENERATED_TEMPLATES_TABLE_NAME} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after, limit),
+        ).fetchall()
+
+    async def storage_by_app(self) -> dict[str, dict]:
+        """Bytes and counts of the stored pages and templates of every app"""
+        return await self._run(self._storage_by_app)
+
+    def _storage_by_app(self) -> dict[str, dict]:
+        conn = self._connect()
+        usage = {}
+        for guid, count, size in conn.execute(f"""
+            SELECT guid, COUNT(*), SUM(LENGTH(commands) + LENGTH(template) + IFNULL(LENGTH(css), 0) + IFNULL(LENGTH(js), 0))
+            FROM {GENERATED_PAGES_TABLE_NAME} GROUP BY guid
+        """):
+            usage.setdefault(guid, {}).update(stored_pages=count, stored_pages_bytes=size or 0)
+        for guid, count, size in conn.execute(f"""
+            SELECT guid, COUNT(*), SUM(LENGTH(template)) FROM {GENERATED_TEMPLATES_TABLE_NAME} GROUP BY guid
+        """):
+            usage.setdefault(guid, {}).update(templates=count, templates_bytes=size or 0)
+        return usage
+
+    async def create_init_state(self, guid: str, state: str = INIT_PENDING, db_backend: str | None = None):
+        """Record the initialization state and database backend of a new app; an existing state is kept"""
+        await self._run(self._create_init_state, guid, state, db_backend)
+
+    def _create_init_state(self, guid: str, state: str, db_backend: str | None):
+        conn = self._connect()
+        conn.execute(f"INSERT OR IGNORE INTO {APP_INIT_TABLE_NAME} (guid, state, db_backend) VALUES (?, ?, ?)",
+                     (guid, state, db_backend))
+        conn.commit()
+
+    async def get_db_backend(self, guid: str) -> str:
+        """The database backend an app was created with; "sqlite" for apps that didn't choose one"""
+        return await self._run(self._get_db_backend, guid)
+
+    def _get_db_backend(self, guid: str) -> str:
+        row = self._connect().execute(f"SELECT db_backend FROM {APP_INIT_TABLE_NAME} WHERE guid = ?", (guid,)).fetchone()
+        return (row and row[0]) or "sqlite"
+
+    async def get_init_state(self, guid: str) -> dict | None:
+        return await self._run(self._get_init_state, guid)
+
+    def _get_init_state(self, guid: str) -> dict | None:
+        row = self._connect().execute(f"""
+            SELECT state, owner, lease_expires_at, progress, error FROM {APP_INIT_TABLE_NAME} WHERE guid = ?
+        """, (guid,)).fetchone()
+        if not row:
+            return None
+        return {
+            "state": row[0],
+            "owner": row[1],
+            "lease_expires_at": row[2],
+            "progress": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+        }
+
+    async def acquire_init_lease(self, guid: str, owner: str, lease_seconds: float, progress: dict) -> bool:
+        """Claim the right to initialize an app.
+
+        Succeeds if the app is pending or failed, or if the process running
+        its initialization let the lease expire. Any process or machine
+        sharing this database sees the same outcome.
+        """
+        return await self._run(self._acquire_init_lease, guid, owner, lease_seconds, progress)
+
+    def _acquire_init_lease(self, guid: str, owner: str, lease_seconds: float, progress: dict) -> bool:
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(f"""
+            INSERT INTO {APP_INIT_TABLE_NAME} (guid, state, owner, lease_expires_at, progress, error)
+            VALUES (:guid, :running, :owner, :expires_at, :progress, NULL)
+            ON CONFLICT (guid) DO UPDATE SET
+                state = :running, owner = :owner, lease_expires_at = :expires_at, progress = :progress,
+                error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE state IN (:pending, :failed) OR (state = :running AND lease_expires_at < :now)
+        """, {
+            "guid": guid, "owner": owner, "expires_at": now + lease_seconds, "progress": json.dumps(progress),
+            "now": now, "pending": INIT_PENDING, "running": INIT_RUNNING, "failed": INIT_FAILED,
+        })
+        conn.commit()
+        return cursor.rowcount == 1
+
+    async def update_init_state(self, guid: str, owner: str, state: str, progress: dict,
+                                error: str | None = None, lease_seconds: float = 0) -> bool:
+        """Record progress as the lease holder and extend the lease; False if the lease was lost"""
+        return await self._run(self._update_init_state, guid, owner, state, progress, error, lease_seconds)
+
+    def _update_init_state(self, guid: str, owner: str, state: str, progress: dict, error: str | None,
+                           lease_seconds: float) -> bool:
+        conn = self._connect()
+        cursor = conn.execute(f"""
+            UPDATE {APP_INIT_TABLE_NAME}
+            SET state = ?, progress = ?, error = ?, lease_expires_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE guid = ? AND owner = ? AND state = ?
+        """, (state, json.dumps(progress), error, time.time() + lease_seconds, guid, owner, INIT_RUNNING))
+        conn.commit()
+        return cursor.rowcount == 1
+
+settings_db_client = SettingsDBClient(settings.SQLITE_SETTINGS_DB_PATH)
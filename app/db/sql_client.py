@@ -1,50 +1,335 @@
+import hashlib
+import re
 import sqlite3
 import os
+import threading
+import time
+from contextlib import contextmanager
 from typing import Any, Dict, List
+from urllib.parse import quote
 from app.db import DatabaseClient
+from app.db.index_advisor import index_advisor
+from app.db.query_cache import is_cacheable, normalize_query, query_cache, result_size
 from app.config.settings import settings
 from app.utils.logger import logger
+from app.utils.metrics import request_kind, sql_aborted, sql_cache_lookups, sql_seconds, tenant_label
+
+# SQLite virtual machine steps between deadline checks; well under a millisecond
+PROGRESS_STEPS = 10000
+LEADING_KEYWORD_RE = re.compile(r"\s*(\w+)")
+# Statements a WITH clause can lead into besides SELECT
+WRITE_KEYWORD_RE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def row_count_text(count: int) -> str:
+    """A row count as written in the prompt; counts stop at SQL_ROW_COUNT_LIMIT"""
+    return f"{count}+" if count >= settings.SQL_ROW_COUNT_LIMIT else str(count)
+
+
+def is_read_only(query: str) -> bool:
+    """True if the query only reads data: a SELECT, or a WITH clause leading into one"""
+    match = LEADING_KEYWORD_RE.match(query)
+    keyword = match.group(1).upper() if match else ""
+    if keyword == "SELECT":
+        return True
+    # Any write keyword, even inside a string, counts the statement as a write
+    return keyword == "WITH" and WRITE_KEYWORD_RE.search(query) is None
+
+
+CREATE_PREFIX_RE = re.compile(r"^CREATE\s+(?:TEMP\w*\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?", re.IGNORECASE)
+
+
+def _compact_definition(object_type: str, name: str, sql: str | None) -> str:
+    """Collapse a CREATE statement to `name(columns)` for tables or `view name AS ...` for views"""
+    body = " ".join((sql or "").split())
+    body = CREATE_PREFIX_RE.sub("", body)
+    if object_type == "view":
+        return f"view {body}"
+    # Drop the table name as written in the SQL, keep the column list
+    columns = body[body.find("("):] if "(" in body else ""
+    columns = columns.replace("( ", "(").replace(" )", ")")
+    return f"{name}{columns}"
+
+
+class QueryTimeout(sqlite3.OperationalError):
+    """A statement stopped because it ran past its time limit"""
+
+
+class ResultRows(list):
+    """SELECT result rows; `truncated` is True when the result was cut off at the row or size limit"""
+
+    def __init__(self, rows=(), truncated: bool = False):
+        super().__init__(rows)
+        self.truncated = truncated
+
+    def copy(self) -> "ResultRows":
+        return ResultRows(self, self.truncated)
 
 
 class SqlClient(DatabaseClient):
-    def __init__(self, db_path: str):
-        self.db_path = f"{settings.SQLITE_DB_PATH}/{db_path}"
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
+    init_prompt_template = settings.INIT_PROMPT_TEMPLATE
+    response_prompt = settings.RESPONSE_PROMPT
+
+    def __init__(self, db_path: str, timeout: float = settings.SQL_QUERY_TIMEOUT_SECONDS,
+                 max_rows: int = settings.SQL_MAX_ROWS, max_result_bytes: int = settings.SQL_MAX_RESULT_BYTES,
+                 create: bool = True):
+        self.db_path = db_path
+        # Only the first connection may create the file; a reconnect after it was archived must not bring back an empty one
+        self.create = create
+        self.tenant = os.path.splitext(os.path.basename(db_path))[0]
+        self.conn = None
+        # Inode of the file the connection has open; a different one on disk means the file was replaced
+        self.inode = None
+        # Serializes use of the connection across the SQL worker threads
+        self.lock = threading.RLock()
+        # (schema_version, [(type, name, sql), ...])
+        self._schema_cache = None
+        # ((schema_version, data_version, total_changes), {table: row_count})
+        self._row_counts_cache = None
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.max_result_bytes = max_result_bytes
+        # monotonic time after which the running statement is interrupted
+        self._deadline = None
+
+    def file_replaced(self) -> bool:
+        """True if the file the connection has open was deleted or replaced, e.g. by another worker archiving it"""
+        try:
+            return os.stat(self.db_path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure the connection on first use (or after close, or after the file was replaced)"""
+        if self.conn is not None and self.file_replaced():
+            logger.info(f"Tenant database {self.tenant} was moved, reopening it")
+            self.close()
+        if self.conn is None:
+            mode = "rwc" if self.create else "rw"
+            self.conn = sqlite3.connect(f"file:{quote(self.db_path)}?mode={mode}", uri=True, check_same_thread=False)
+            self.create = False
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+            self.conn.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+            self.conn.set_progress_handler(self._past_deadline, PROGRESS_STEPS)
+            self.inode = os.stat(self.db_path).st_ino
+        return self.conn
+
+    def read_only(self, command: Dict[str, Any]) -> bool:
+        return is_read_only(command.get("query", ""))
+
+    def _past_deadline(self) -> int:
+        """Progress handler: a non-zero return makes SQLite interrupt the running statement"""
+        return int(self._deadline is not None and time.monotonic() > self._deadline)
+
+    @contextmanager
+    def _time_limit(self, query: str):
+        """Interrupt the statement run inside the block, including fetching its rows, after `timeout` seconds"""
+        self._deadline = time.monotonic() + self.timeout if self.timeout > 0 else None
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if self._deadline is None or str(e) != "interrupted":
+                raise
+            sql_aborted.inc(tenant=tenant_label(self.tenant), reason="timeout")
+            logger.warning(f"Stopped a query on {self.tenant} after {self.timeout}s: {query[:200]}")
+            raise QueryTimeout(f"Query took longer than {self.timeout}s and was stopped: {query[:200]}") from e
+        finally:
+            self._deadline = None
+
+    def _select(self, query: str) -> ResultRows:
+        """Run a SELECT, fetching in batches until the rows run out or a size limit is reached"""
+        rows = ResultRows()
+        size = 0
+        with self._time_limit(query):
+            cursor = self._connect().execute(query)
+            try:
+                while True:
+                    batch = cursor.fetchmany(min(settings.SQL_FETCH_BATCH, self.max_rows - len(rows) + 1))
+                    if not batch:
+                        return rows
+                    if len(rows) + len(batch) > self.max_rows:
+                        rows.extend(batch[:self.max_rows - len(rows)])
+                        reason = "rows"
+                        break
+                    rows.extend(batch)
+                    size += result_size(batch)
+                    if size > self.max_result_bytes:
+                        reason = "bytes"
+                        break
+            finally:
+                # Ends the read so a cut-off result does not hold back WAL checkpoints
+                cursor.close()
+        rows.truncated = True
+        sql_aborted.inc(tenant=tenant_label(self.tenant), reason=reason)
+        logger.warning(f"Cut off a query result on {self.tenant} at {len(rows)} rows ({reason} limit): {query[:200]}")
+        return rows
+
+    def _execute(self, cursor: sqlite3.Cursor, query: str):
+        with self._time_limit(query):
+            cursor.execute(query)
+
+    def close(self) -> None:
+        """Close the connection; the next call reopens it"""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+                self.inode = None
+                # data_version and total_changes are per connection, so cached results can't be validated any more
+                query_cache.invalidate(self.db_path)
+                self._schema_cache = None
+                self._row_counts_cache = None
+
+    def _data_version(self) -> tuple:
+        """Changes whenever this connection or any other writes to the database or alters its schema"""
+        conn = self._connect()
+        return (
+            conn.execute("PRAGMA schema_version").fetchone()[0],
+            conn.execute("PRAGMA data_version").fetchone()[0],
+            conn.total_changes,
+        )
 
     def execute_commands(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Execute multiple SQLite commands and return results"""
+        """Execute multiple SQLite commands and return results.
+
+        Each statement is stopped after `timeout` seconds and SELECT results
+        are limited to `max_rows` rows and about `max_result_bytes`. SELECT
+        results are served from the query cache while the database is unchanged.
+        """
         results = {}
-        for query in queries:
-            name = query['name']
-            query = query['query']
-            self.cursor.execute(query)
+        kind = request_kind.get()
+        with self.lock, sql_seconds.time(tenant=tenant_label(self.tenant), kind=kind):
+            conn = self._connect()
+            cursor = conn.cursor()
+            version = None
+            for query in queries:
+                name = query['name']
+                query = query['query']
 
-            if query.startswith("SELECT"):
-                results[name] = self.cursor.fetchall()  # Key by query for SELECT
-            else:
-                self.conn.commit()  # Commit changes for non-SELECT commands
-                results[name] = "Command executed"  # Simple success for non-SELECT
+                if is_read_only(query):
+                    if not query_cache.enabled or not is_cacheable(query):
+                        sql_cache_lookups.inc(kind=kind, result="skip")
+                        results[name] = self._select(query)
+                        index_advisor.record(self, query)
+                        continue
+                    if version is None:
+                        version = self._data_version()
+                    normalized = normalize_query(query)
+                    rows = query_cache.get(self.db_path, version, normalized)
+                    sql_cache_lookups.inc(kind=kind, result="miss" if rows is None else "hit")
+                    if rows is None:
+                        rows = self._select(query)
+                        query_cache.put(self.db_path, version, normalized, rows)
+                        index_advisor.record(self, query)
+                    results[name] = rows  # Key by query for SELECT
+                else:
+                    self._execute(cursor, query)
+                    conn.commit()  # Commit changes for non-SELECT commands
+                    index_advisor.record(self, query)
+                    results[name] = "Command executed"  # Simple success for non-SELECT
+                    version = None
 
         return results
 
-    def get_schema(self) -> List[str]:
-        """Return the DB schema"""
-        self.cursor.execute(
-            "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table','view') AND name NOT LIKE 'sqlite_%'"
-        )
-        schema_info = self.cursor.fetchall()
+    def execute_batch(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Execute a batch of commands in a single transaction.
+
+        Used for bulk loads such as the LLM-generated sample data, which
+        would otherwise commit (and sync) once per row. If any statement
+        fails the whole batch is rolled back and the error is raised.
+        """
+        results = {}
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                for query in queries:
+                    name = query['name']
+                    query = query['query']
+                    if is_read_only(query):
+                        results[name] = self._select(query)
+                    else:
+                        self._execute(cursor, query)
+                        results[name] = "Command executed"
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return results
+
+    def _schema_objects(self) -> List[tuple]:
+        """Return (type, name, sql) for every table and view, cached until PRAGMA schema_version changes"""
+        with self.lock:
+            conn = self._connect()
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if self._schema_cache is None or self._schema_cache[0] != schema_version:
+                objects = conn.execute(
+                    "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table','view') AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+                self._schema_cache = (schema_version, objects)
+            return self._schema_cache[1]
+
+    def get_row_counts(self) -> Dict[str, int]:
+        """Return the row count of every table, recounted only after the schema or data changed.
+
+        Counting stops at SQL_ROW_COUNT_LIMIT rows per table, and tables not
+        counted within the time limit are left out.
+        """
+        with self.lock:
+            conn = self._connect()
+            objects = self._schema_objects()
+            version = self._data_version()
+            if self._row_counts_cache is None or self._row_counts_cache[0] != version:
+                counts = {}
+                try:
+                    with self._time_limit("row counts"):
+                        for object_type, name, _ in objects:
+                            if object_type == "table":
+                                counts[name] = conn.execute(
+                                    f'SELECT COUNT(*) FROM (SELECT 1 FROM "{name}" LIMIT {settings.SQL_ROW_COUNT_LIMIT})'
+                                ).fetchone()[0]
+                except QueryTimeout:
+                    pass  # Keeps the tables counted so far
+                self._row_counts_cache = (version, counts)
+            return self._row_counts_cache[1]
+
+    def get_schema(self, compact: bool | None = None, row_counts: bool = True) -> str:
+        """Return the DB schema as text for the prompt.
+
+        The compact format renders each table as `name(column definitions)`,
+        while the verbose one keeps the full `Type: ..., Name: ..., SQL: ...` lines.
+        """
+        if compact is None:
+            compact = settings.SCHEMA_PROMPT_FORMAT == "compact"
+        objects = self._schema_objects()
+        counts = self.get_row_counts() if row_counts else {}
+
         schema_list = []
-        for row in schema_info:
-            schema_list.append(f"Type: {row[0]}, Name: {row[1]}, SQL: {row[2]}")
-        return schema_list
+        for object_type, name, sql in objects:
+            if compact:
+                line = _compact_definition(object_type, name, sql)
+            else:
+                line = f"Type: {object_type}, Name: {name}, SQL: {sql}"
+            if name in counts:
+                line += f" -- {row_count_text(counts[name])} rows"
+            schema_list.append(line)
+        return "\n".join(schema_list)
+
+    def get_schema_hash(self) -> str:
+        """Return a fingerprint of the table and view definitions"""
+        definitions = "\n".join(f"{object_type} {name} {sql}" for object_type, name, sql in self._schema_objects())
+        return hashlib.sha256(definitions.encode()).hexdigest()
 
     def is_initialized(self) -> bool:
         """Check if the database has been initialized"""
-        self.cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
-        )
-        tables = self.cursor.fetchall()
+        with self.lock:
+            tables = self._connect().execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
+            ).fetchall()
         return len(tables) > 0
 
     def mark_initialized(self) -> None:
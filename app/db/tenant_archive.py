@@ -0,0 +1,140 @@
+import fcntl
+import gzip
+import os
+import shutil
+import sqlite3
+from contextlib import contextmanager
+
+from app.config.settings import settings
+
+# Table inside an archived database holding the app's stored pages from the settings DB
+ARCHIVED_PAGES_TABLE_NAME = "autoapp_archived_pages"
+DB_SUFFIXES = ("", "-wal", "-shm")
+
+
+def db_files_size(db_path: str) -> int:
+    """Bytes used by a database and its WAL and shared-memory files"""
+    size = 0
+    for suffix in DB_SUFFIXES:
+        try:
+            size += os.path.getsize(db_path + suffix)
+        except FileNotFoundError:
+            pass
+    return size
+
+
+class TenantArchive:
+    """The cold storage tier: one gzipped, vacuumed copy of each idle tenant database.
+
+    Archiving and restoring a tenant hold an exclusive lock on its lock file,
+    so worker processes sharing the volume never move the same tenant at once.
+    These calls block and are run off the event loop.
+    """
+
+    def __init__(self, path: str = settings.TENANT_ARCHIVE_PATH):
+        self.path = path
+
+    def archive_path(self, guid: str) -> str:
+        return os.path.join(self.path, f"{guid}.db.gz")
+
+    def is_archived(self, guid: str) -> bool:
+        return os.path.exists(self.archive_path(guid))
+
+    @contextmanager
+    def _lock(self, guid: str, wait: bool = True):
+        """Yield True while holding the tenant's lock, or False if `wait` is off and another process has it"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, f"{guid}.lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def archive(self, guid: str, db_path: str, pages: tuple[list[str], list[tuple]]) -> tuple[int, int] | None:
+        """Move a tenant database and its stored pages into the archive.
+
+        The database is checkpointed and then copied with VACUUM INTO while a
+        write lock keeps other connections from changing it. Returns the bytes
+        used before and after, or None if the tenant was not archived.
+        """
+        with self._lock(guid, wait=False) as locked:
+            if not locked or not os.path.exists(db_path) or self.is_archived(guid):
+                return None
+            before = db_files_size(db_path)
+            vacuumed = os.path.join(self.path, f"{guid}.{os.getpid()}.tmp")
+            compressed = f"{vacuumed}.gz"
+            writer = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                writer.execute("BEGIN IMMEDIATE")
+                reader = sqlite3.connect(db_path, isolation_level=None)
+                try:
+                    reader.execute("VACUUM INTO ?", (vacuumed,))
+                finally:
+                    reader.close()
+                self._add_pages(vacuumed, pages)
+                with open(vacuumed, "rb") as source, gzip.open(compressed, "wb", compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                with open(compressed, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(compressed, self.archive_path(guid))
+                for suffix in DB_SUFFIXES:
+                    try:
+                        os.remove(db_path + suffix)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                writer.close()
+                for path in (vacuumed, compressed):
+                    if os.path.exists(path):
+                        os.remove(path)
+            return before, os.path.getsize(self.archive_path(guid))
+
+    @staticmethod
+    def _add_pages(db_path: str, pages: tuple[list[str], list[tuple]]):
+        columns, rows = pages
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute(f"CREATE TABLE {ARCHIVED_PAGES_TABLE_NAME} ({', '.join(columns)})")
+            conn.executemany(f"INSERT INTO {ARCHIVED_PAGES_TABLE_NAME} VALUES ({', '.join('?' for _ in columns)})", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def restore(self, guid: str, db_path: str) -> tuple[list[str], list[tuple]] | None:
+        """Unpack an archived tenant to `db_path`, returning its stored pages, or None if there was nothing to do"""
+        with self._lock(guid):
+            if os.path.exists(db_path) or not self.is_archived(guid):
+                return None
+            restoring = f"{db_path}.{os.getpid()}.restore"
+            try:
+                with gzip.open(self.archive_path(guid), "rb") as source, open(restoring, "wb") as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                conn = sqlite3.connect(restoring)
+                try:
+                    cursor = conn.execute(f"SELECT * FROM {ARCHIVED_PAGES_TABLE_NAME}")
+                    pages = ([column[0] for column in cursor.description], cursor.fetchall())
+                    conn.execute(f"DROP TABLE {ARCHIVED_PAGES_TABLE_NAME}")
+                    conn.commit()
+                finally:
+                    conn.close()
+                os.replace(restoring, db_path)
+            finally:
+                if os.path.exists(restoring):
+                    os.remove(restoring)
+            os.remove(self.archive_path(guid))
+            return pages
+
+    def archived_sizes(self) -> dict[str, int]:
+        """Compressed size of every archived tenant"""
+        if not os.path.isdir(self.path):
+            return {}
+        return {
+            entry.name[:-len(".db.gz")]: entry.stat().st_size
+            for entry in os.scandir(self.path) if entry.name.endswith(".db.gz")
+        }
@@ -0,0 +1,321 @@
+import asyncio
+import contextvars
+import inspect
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app.config.settings import settings
+from app.db import DatabaseClient
+from app.db.redis_client import RedisClient
+from app.db.settings_db_client import INIT_READY, settings_db_client
+from app.db.sql_client import SqlClient
+from app.db.tenant_archive import TenantArchive, db_files_size
+from app.utils.logger import logger
+from app.utils.metrics import StatsGauge, registry, tenant_hash
+
+# Seconds between updates of a tenant file's mtime, which records when it was last used
+TOUCH_INTERVAL = 60
+# Apps whose database backend is remembered; it never changes once an app is created
+BACKEND_CACHE_SIZE = 4096
+
+# Client class of each database backend an app can choose
+BACKENDS = {"sqlite": SqlClient, "redis": RedisClient}
+
+
+def enabled_backends() -> list[str]:
+    """Backends new apps may choose; Redis only when a server is configured"""
+    return [name for name in BACKENDS if name != "redis" or settings.REDIS_ENABLED]
+
+
+def is_guid(name: str) -> bool:
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+class TenantDBManager:
+    """Keeps a bounded LRU of open tenant databases and runs their SQL off the event loop.
+
+    Each `{guid}.db` is opened and configured once. When more than `max_open`
+    tenants are open, the least recently used one is closed. SQL runs on a
+    dedicated thread pool, so a slow query for one tenant does not hold up
+    requests for the others.
+
+    Tenants not used for `archive_after` seconds are moved to the archive
+    tier, compacted and compressed, and `open` restores them on their next
+    request.
+
+    Apps created with the Redis backend get a RedisClient instead, whose
+    commands run on the event loop over pooled connections.
+    """
+
+    def __init__(self, db_dir: str = settings.SQLITE_DB_PATH, max_open: int = settings.TENANT_DB_MAX_OPEN,
+                 max_workers: int = settings.TENANT_SQL_WORKERS, archive: TenantArchive | None = None,
+                 archive_after: int = settings.TENANT_ARCHIVE_AFTER_SECONDS,
+                 archive_interval: int = settings.TENANT_ARCHIVE_INTERVAL_SECONDS):
+        self.db_dir = db_dir
+        self.max_open = max_open
+        self.clients: OrderedDict[str, DatabaseClient] = OrderedDict()
+        self.backends: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tenant-sql")
+        self.archive = archive or TenantArchive()
+        self.archive_after = archive_after
+        self.archive_interval = archive_interval
+        self.archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tenant-archive")
+        self.archive_task: asyncio.Task | None = None
+        # Held while a tenant is archived or restored, so its requests wait rather than open the moving file
+        self.tenant_locks: dict[str, asyncio.Lock] = {}
+        self.touched: dict[str, float] = {}
+        self.archived = 0
+        self.restored = 0
+        self.archive_failures = 0
+        self.bytes_saved = 0
+
+    def db_path(self, guid: str) -> str:
+        return f"{self.db_dir}{guid}.db"
+
+    def get(self, guid: str, backend: str = "sqlite", create: bool = True) -> DatabaseClient:
+        """Return the pooled client for a tenant, opening it if needed; without `create` its file must exist"""
+        with self.lock:
+            client = self.clients.get(guid)
+            if client is not None:
+                self.clients.move_to_end(guid)
+                return client
+            client = RedisClient(guid) if backend == "redis" else SqlClient(self.db_path(guid), create=create)
+            self.clients[guid] = client
+            while len(self.clients) > self.max_open:
+                cold_guid, cold_client = self.clients.popitem(last=False)
+                logger.debug(f"Closing idle tenant database {cold_guid}")
+                # Closing waits for any query still running on that connection
+                self.executor.submit(cold_client.close)
+            return client
+
+    async def backend(self, guid: str) -> str:
+        """The database backend an app was created with: sqlite or redis"""
+        backend = self.backends.get(guid)
+        if backend is None:
+            backend = await settings_db_client.get_db_backend(guid)
+            self.backends[guid] = backend
+            while len(self.backends) > BACKEND_CACHE_SIZE:
+                self.backends.popitem(last=False)
+        return backend
+
+    async def open(self, guid: str) -> DatabaseClient:
+        """Return the pooled client for a tenant, restoring its database from the archive first if needed"""
+        backend = await self.backend(guid)
+        if backend != "sqlite":
+            return self.get(guid, backend)
+        path = self.db_path(guid)
+        lock = self.tenant_locks.get(guid)
+        if lock is not None and lock.locked():
+            async with lock:
+                pass
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+            if self.archive.is_archived(guid):
+                await self._restore(guid)
+                inode = os.stat(path).st_ino
+        client = self.clients.get(guid)
+        if client is not None and client.inode is not None and client.inode != inode:
+            # Another worker archived and restored the tenant; this connection still has the old file open
+            await self.run(self.evict, guid)
+        self._touch(guid, path)
+        # Only a new app's database is created; an existing one archived under a request raises instead
+        return self.get(guid, create=inode is None)
+
+    def _touch(self, guid: str, path: str):
+        """Record a use of the tenant in its file's mtime, which all workers see and which survives restarts"""
+        now = time.time()
+        if now - self.touched.get(guid, 0) < TOUCH_INTERVAL:
+            return
+        self.touched[guid] = now
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # A new app; the file is created when it is first used
+
+    async def _restore(self, guid: str):
+        async with self.tenant_locks.setdefault(guid, asyncio.Lock()):
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            pages = await loop.run_in_executor(None, self.archive.restore, guid, self.db_path(guid))
+            if pages is not None:
+                await settings_db_client.put_pages(*pages)
+                self.restored += 1
+                logger.info(f"Restored tenant {guid} from the archive in {time.perf_counter() - start:.2f}s "
+                            f"with {len(pages[1])} stored pages")
+        self.tenant_locks.pop(guid, None)
+
+    async def archive_tenant(self, guid: str, idle_since: float | None = None) -> bool:
+        """Move a tenant to the archive tier; with `idle_since`, only if it has not been used since then"""
+        state = await settings_db_client.get_init_state(guid)
+        if state is not None and state["state"] != INIT_READY:
+            return False
+        path = self.db_path(guid)
+        loop = asyncio.get_running_loop()
+        async with self.tenant_locks.setdefault(guid, asyncio.Lock()):
+            try:
+                if idle_since is not None and self._last_used(path) >= idle_since:
+                    return False
+                # Waits for queries still running on the tenant's connection
+                await loop.run_in_executor(self.executor, self.evict, guid)
+                pages = await settings_db_client.take_pages(guid)
+                try:
+                    sizes = await loop.run_in_executor(self.archive_executor, self.archive.archive, guid, path, pages)
+                except Exception as e:
+                    self.archive_failures += 1
+                    logger.warning(f"Archiving tenant {guid} failed: {e}")
+                    sizes = None
+                if sizes is None:
+                    await settings_db_client.put_pages(*pages)
+                    return False
+            finally:
+                self.tenant_locks.pop(guid, None)
+        before, after = sizes
+        self.archived += 1
+        self.bytes_saved += before - after
+        self.touched.pop(guid, None)
+        logger.info(f"Archived tenant {guid}: {before} bytes on the volume -> {after} bytes compressed, "
+                    f"{len(pages[1])} stored pages")
+        return True
+
+    @staticmethod
+    def _last_used(path: str) -> float:
+        """Latest mtime of the database and its WAL, or 0 if it does not exist"""
+        mtimes = [0.0]
+        for suffix in ("", "-wal"):
+            try:
+                mtimes.append(os.path.getmtime(path + suffix))
+            except FileNotFoundError:
+                pass
+        return max(mtimes)
+
+    def _tenant_files(self) -> list[str]:
+        directory = self.db_dir or "."
+        return [
+            entry.name[:-3] for entry in os.scandir(directory)
+            if entry.name.endswith(".db") and is_guid(entry.name[:-3])
+        ]
+
+    async def archive_idle(self) -> int:
+        """Archive every tenant not used for `archive_after` seconds; returns how many were archived"""
+        idle_since = time.time() - self.archive_after
+        loop = asyncio.get_running_loop()
+        guids = await loop.run_in_executor(self.archive_executor, self._tenant_files)
+        archived = 0
+        for guid in guids:
+            if self._last_used(self.db_path(guid)) < idle_since and await self.archive_tenant(guid, idle_since):
+                archived += 1
+        return archived
+
+    async def _archive_loop(self):
+        while True:
+            await asyncio.sleep(self.archive_interval)
+            try:
+                archived = await self.archive_idle()
+                if archived:
+                    logger.info(f"Archived {archived} idle tenants")
+            except Exception as e:
+                logger.warning(f"Archiving idle tenants failed: {e}")
+
+    def start_archiving(self):
+        """Check for idle tenants every `archive_interval` seconds in the background"""
+        if self.archive_after > 0 and self.archive_task is None:
+            self.archive_task = asyncio.create_task(self._archive_loop())
+
+    async def stop_archiving(self):
+        if self.archive_task is not None:
+            self.archive_task.cancel()
+            await asyncio.gather(self.archive_task, return_exceptions=True)
+            self.archive_task = None
+
+    def _storage_files(self) -> tuple[dict[str, dict], dict[str, int]]:
+        hot = {}
+        for guid in self._tenant_files():
+            path = self.db_path(guid)
+            hot[guid] = {"db_bytes": db_files_size(path), "last_used": self._last_used(path)}
+        return hot, self.archive.archived_sizes()
+
+    async def storage_report(self, limit: int = 100) -> dict:
+        """Storage used by each tenant in the hot and archive tiers, largest first"""
+        loop = asyncio.get_running_loop()
+        hot, archived = await loop.run_in_executor(None, self._storage_files)
+        usage = await settings_db_client.storage_by_app()
+        tenants = []
+        for guid in hot.keys() | archived.keys():
+            app_usage = usage.get(guid, {})
+            entry = {
+                "guid": guid,
+                "metrics_label": tenant_hash(guid),
+                "tier": "hot" if guid in hot else "archived",
+                "open": guid in self.clients,
+                "db_bytes": hot.get(guid, {}).get("db_bytes", 0),
+                "archive_bytes": archived.get(guid, 0),
+                "stored_pages": app_usage.get("stored_pages", 0),
+                "stored_pages_bytes": app_usage.get("stored_pages_bytes", 0),
+                "templates_bytes": app_usage.get("templates_bytes", 0),
+                "last_used": hot.get(guid, {}).get("last_used"),
+            }
+            entry["total_bytes"] = (entry["db_bytes"] + entry["archive_bytes"] + entry["stored_pages_bytes"]
+                                    + entry["templates_bytes"])
+            tenants.append(entry)
+        tenants.sort(key=lambda entry: entry["total_bytes"], reverse=True)
+        disk = shutil.disk_usage(self.db_dir or ".")
+        return {
+            "hot_tenants": len(hot),
+            "archived_tenants": len(archived),
+            "hot_bytes": sum(entry["db_bytes"] for entry in hot.values()),
+            "archive_bytes": sum(archived.values()),
+            "settings_db_bytes": db_files_size(settings.SQLITE_SETTINGS_DB_PATH),
+            "volume": {"total_bytes": disk.total, "used_bytes": disk.used, "free_bytes": disk.free},
+            "tenants": tenants[:limit],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self.clients),
+            "archived": self.archived,
+            "restored": self.restored,
+            "archive_failures": self.archive_failures,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def evict(self, guid: str) -> None:
+        """Close a tenant's connection, e.g. before its database file is moved"""
+        with self.lock:
+            client = self.clients.pop(guid, None)
+        if client is not None:
+            client.close()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking database call on the tenant SQL thread pool, in the caller's context.
+
+        Calls to an async backend are awaited on the event loop instead.
+        """
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, partial(context.run, fn, *args, **kwargs))
+
+    def close_all(self) -> None:
+        with self.lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+        for client in clients:
+            client.close()
+
+
+tenant_db_manager = TenantDBManager()
+registry.register(StatsGauge("autoapp_tenant_storage", "Open and archived tenant databases", tenant_db_manager.stats))
@@ -1,15 +1,20 @@
-import json
-import logging
+import asyncio
+import os
+import socket
+import time
 
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
 from app.config.settings import settings
 from app.llm.client import llm_client
 from app.db import DatabaseClient
-
-# Configure logging
-logger = logging.getLogger(__name__)
+from app.db.settings_db_client import INIT_FAILED, INIT_READY, INIT_RUNNING, settings_db_client
+from app.db.tenant_db import tenant_db_manager
+from app.utils.logger import logger
+from app.utils.metrics import init_seconds, init_stage_seconds, kind, request_kind
+from app.utils.pipeline import Stage, StagePipeline
 
 
 class AppInitializer:
@@ -22,40 +27,186 @@ class AppInitializer:
         self.app_type = app_type
 
     async def initialize_database(self):
-        """Initialize sqlite with sample data from LLM"""
-        if self.db_client.is_initialized():
+        """Initialize the app database with sample data from LLM"""
+        if await tenant_db_manager.run(self.db_client.is_initialized):
             logger.info("Database already initialized, skipping initialization")
             return
 
         logger.info("Initializing database with sample data...")
 
         # Format the initialization prompt, including the data_model_key
-        init_prompt = settings.INIT_PROMPT_TEMPLATE.format(
+        init_prompt = self.db_client.init_prompt_template.format(
             application_type=self.app_type,
         )
 
-        logger.info(init_prompt)
         # Get the LLM response
-        response_text = await llm_client.get_response(init_prompt)
-
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        if not response_text.endswith("}"):
-            response_text += "}"
+        init_data, init_text = await llm_client.get_json_response(init_prompt)
 
         # Parse and execute initialization commands
-        logger.info("Raw response: %s", response_text)
-        init_data = json.loads(response_text)
+        if init_data is None:
+            raise ValueError("Invalid JSON response from LLM")
 
         commands = init_data.get("commands", [])
 
-        results = self.db_client.execute_commands(commands)
+        try:
+            results = await tenant_db_manager.run(self.db_client.execute_batch, commands)
+        except Exception:
+            # Every app of this type would get the same failing seed data from the cache
+            await llm_client.reject_response(init_prompt, None)
+            raise
+        await llm_client.accept_response(init_prompt, None, init_text)
 
         # Mark database as initialized
-        self.db_client.mark_initialized()
+        await tenant_db_manager.run(self.db_client.mark_initialized)
 
         logger.info("Database initialization complete")
-        logger.debug("Initialization results: %s", results)
\ No newline at end of file
+        logger.debug("Initialization results: %s", results)
+
+# Identifies this process as the holder of an initialization lease
+INIT_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+READY_CACHE_SIZE = 4096
+
+# Initializations running in this process, by app guid
+init_pipelines: Dict[str, StagePipeline] = {}
+# Recently seen ready apps; ready is final, so this needs no invalidation
+ready_guids: "OrderedDict[str, None]" = OrderedDict()
+
+
+def build_init_pipeline(guid: str, db_client: DatabaseClient, app_type: str) -> StagePipeline:
+    """Design, template and sample data for a new app; seeding does not wait for the design"""
+
+    async def design(results):
+        with kind("design"):
+            punched_up_design = await llm_client.get_design_response(settings.DESIGN_PROMPT.format(app_type))
+        return punched_up_design
+
+    async def template(results):
+        prompt = settings.DESIGN_TEMPLATE_PROMPT.format(results["design"])
+        with kind("design"):
+            punched_up_template = await llm_client.get_design_response(prompt)
+        return punched_up_template
+
+    async def seed(results):
+        await AppInitializer(db_client, app_type).initialize_database()
+
+    async def save_settings(results):
+        await settings_db_client.update(guid, results["design"], db_client.response_prompt, "", "/", results["template"])
+
+    return StagePipeline([
+        Stage("design", "Designing the app", design),
+        Stage("template", "Designing the page layout", template, after=("design",)),
+        Stage("seed", "Creating sample data", seed),
+        Stage("settings", "Saving the design", save_settings, after=("design", "template")),
+    ])
+
+
+def _remember_ready(guid: str):
+    ready_guids[guid] = None
+    ready_guids.move_to_end(guid)
+    while len(ready_guids) > READY_CACHE_SIZE:
+        ready_guids.popitem(last=False)
+
+
+async def is_ready(guid: str, db_client: DatabaseClient) -> bool:
+    """True once an app's initialization has finished, in this or any other process"""
+    if guid in ready_guids:
+        ready_guids.move_to_end(guid)
+        return True
+    state = await settings_db_client.get_init_state(guid)
+    if state is None:
+        # Apps created before initialization state was recorded
+        ready = await tenant_db_manager.run(db_client.is_initialized)
+        if ready:
+            await settings_db_client.create_init_state(guid, INIT_READY)
+    else:
+        ready = state["state"] == INIT_READY
+    if ready:
+        _remember_ready(guid)
+    return ready
+
+
+def _waiting_progress(error: str | None = None) -> dict:
+    return {"done": False, "failed": error is not None, "error": error, "stages": []}
+
+
+async def ensure_initialization(guid: str, db_client: DatabaseClient, app_type: str) -> dict:
+    """Start initializing an app unless some process already is, and return its progress.
+
+    The settings DB holds one lease per app, so across workers and machines
+    only the lease holder calls the LLM and seeds `{guid}.db`.
+    """
+    pipeline = init_pipelines.get(guid)
+    if pipeline is not None:
+        return pipeline.progress()
+
+    pipeline = build_init_pipeline(guid, db_client, app_type)
+    if await settings_db_client.acquire_init_lease(guid, INIT_OWNER, settings.INIT_LEASE_SECONDS, pipeline.progress()):
+        logger.info("Starting background design job for app: %s", guid)
+        init_pipelines[guid] = pipeline
+        asyncio.create_task(_run_with_lease(guid, pipeline))
+        return pipeline.progress()
+
+    state = await settings_db_client.get_init_state(guid)
+    return (state and state["progress"]) or _waiting_progress()
+
+
+async def _run_with_lease(guid: str, pipeline: StagePipeline):
+    """Run the pipeline, persisting its progress and renewing the lease until it finishes"""
+    lease = settings.INIT_LEASE_SECONDS
+    request_kind.set("init")  # This runs as its own task, so the label stays out of the request that started it
+    started = time.monotonic()
+    task = asyncio.create_task(pipeline.run())
+    try:
+        while not task.done():
+            version = pipeline.version
+            if not await settings_db_client.update_init_state(guid, INIT_OWNER, INIT_RUNNING, pipeline.progress(),
+                                                              lease_seconds=lease):
+                logger.warning("Lost the initialization lease for app %s, stopping", guid)
+                task.cancel()
+                break
+            await pipeline.wait_for_change(version, lease / 3)
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.error("Initialization of app %s failed: %s", guid, e, exc_info=True)
+
+        state = INIT_FAILED if pipeline.failed else INIT_READY
+        init_seconds.observe(time.monotonic() - started, outcome=state)
+        for stage in pipeline.stages.values():
+            if stage.status == "done":
+                init_stage_seconds.observe(stage.finished_at - stage.started_at, stage=stage.name)
+        await settings_db_client.update_init_state(guid, INIT_OWNER, state, pipeline.progress(), pipeline.error)
+        if state == INIT_READY:
+            _remember_ready(guid)
+            logger.info("Initialization of app %s complete: %s", guid, pipeline.progress()["stages"])
+    finally:
+        init_pipelines.pop(guid, None)
+
+
+async def watch_progress(guid: str):
+    """Yield an app's initialization progress whenever it changes, until it is done or failed"""
+    pipeline = init_pipelines.get(guid)
+    if pipeline is not None:
+        async for progress in pipeline.updates():
+            yield progress
+        return
+
+    # Another process is initializing the app; follow the progress it persists
+    last = None
+    while True:
+        state = await settings_db_client.get_init_state(guid)
+        if state is None or state["state"] == INIT_READY:
+            yield {**((state and state["progress"]) or _waiting_progress()), "done": True, "failed": False}
+            return
+        if state["state"] != INIT_RUNNING or (state["lease_expires_at"] or 0) < time.time():
+            # Failed, or abandoned by a worker that died; a reload lets this worker take over
+            yield {**((state["progress"]) or _waiting_progress()), "done": False, "failed": True,
+                   "error": state["error"] or "Initialization stopped"}
+            return
+        if state["progress"] != last:
+            last = state["progress"]
+            yield last
+        await asyncio.sleep(settings.INIT_POLL_SECONDS)
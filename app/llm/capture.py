@@ -0,0 +1,37 @@
+import hashlib
+import json
+import random
+import time
+
+from app.config.settings import settings
+from app.llm.prompt import SystemPrompt
+from app.utils.logger import capture_logger
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def capture_interaction(labels: dict, system: str | SystemPrompt | None, user: str, response: str, seconds: float,
+                        error: str | None = None) -> None:
+    """Write one LLM call to the capture log.
+
+    Every call gets a record with the sizes and SHA-256 hashes of its prompt
+    and response; a LLM_CAPTURE_SAMPLE_RATE fraction of them also carries
+    the full text.
+    """
+    if not settings.LLM_CAPTURE:
+        return
+    sampled = random.random() < settings.LLM_CAPTURE_SAMPLE_RATE
+    record = {"ts": round(time.time(), 3), **labels, "seconds": round(seconds, 3), "sampled": sampled}
+    if error:
+        record["error"] = error
+    if isinstance(system, SystemPrompt):
+        # Calls with the same prefix hash can share the provider's prompt cache
+        record["prefix_sha256"] = _sha256(system.prefix)
+    for field, text in (("system", str(system or "")), ("user", user), ("response", response)):
+        record[f"{field}_chars"] = len(text)
+        record[f"{field}_sha256"] = _sha256(text)
+        if sampled:
+            record[field] = text
+    capture_logger.info(json.dumps(record))
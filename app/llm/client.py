@@ -1,177 +1,243 @@
-from typing import Optional
-import requests
-import anthropic
-from google import genai
-from app import db
-from google.genai import types
+import asyncio
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import AsyncIterator, Optional
 from app.config.settings import settings
-from app.utils.logger import logger
 from app.db import settings_db_client
+from app.db.sql_client import row_count_text
+from app.llm.capture import capture_interaction
+from app.llm.json_repair import join_continuation, repair_json
+from app.llm.prompt import SystemPrompt
+from app.llm.prompt_builder import (
+    MAX_TABLE_SIZES, PromptSection, compact_text, dropped, estimate_tokens, first_entries, fit_sections,
+    minify_template, schema_columns, schema_tables, template_skeleton, truncate_tokens,
+)
+from app.llm.providers import LLMProvider, close_providers, get_provider
+from app.llm.response_cache import cache_key, response_cache
+from app.utils.logger import logger
+from app.utils.metrics import (
+    llm_continuations, llm_errors, llm_first_chunk_seconds, llm_json_responses, llm_seconds, request_kind,
+)
 
 
 class LLMClient:
     def __init__(self):
-        if settings.LLM_PROVIDER == "gemini":
-            if not settings.GEMINI_API_KEY:
-                raise ValueError("GEMINI_API_KEY environment variable not set")
-            self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+        self.provider = get_provider(settings.LLM_PROVIDER)
+        self.design_provider = get_provider(settings.LLM_DESIGN_PROVIDER)
         self.app_settings_db = settings_db_client.settings_db_client
-
-    async def get_response(self, user: str, system: Optional[str] = None, *, strong_model: bool = False) -> str | None:
-        """Get response from configured LLM provider"""
-        if settings.LLM_PROVIDER == "gemini":
-            config = types.GenerateContentConfig(
-                system_instruction=system if system else None,
-                response_mime_type="application/json",
-                response_schema={
-                    "properties": {
-                        "template": {"type": "STRING"},
-                        "CSS": {"type": "STRING"},
-                        "Javascript": {"type": "STRING"},
-                        "commands": {
-                            "type": "array",
-                            "items": {
-                                "type": "OBJECT",
-                                "properties": {
-                                    "name": {"type": "string"},
-                                    "query": {"type": "string"},
-                                }
-                            }
-                        }
-                    },
-                    "type": "OBJECT"
-                }
-            )
-            contents=[user]
-            if strong_model:
-                logger.info("Using strong model!")
-                contents = [system, user]
-                config = None
-            response = self.client.models.generate_content(
-                model=settings.GEMINI_DESIGN_MODEL if strong_model else settings.GEMINI_MODEL,
-                contents=contents,
-                config=config 
-            )
-            return response.text
-
-        elif settings.LLM_PROVIDER == "claude":
-            client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY)
-
-            response = client.messages.create(
-                model=settings.CLAUDE_MODEL,
-                max_tokens=3000,
-                system=[{"type": "text", "text": system}] if system else None,
-                messages=[{"role": "user", "content": "{" + user}],
-            )
-            return response.content[0].text
-
-        else:  # default to ollama
-            response = requests.post(
-                f"{settings.OLLAMA_URL}/api/generate",
-                json={
-                    "model": settings.OLLAMA_MODEL,
-                    "prompt": system + user,
-                    "stream": False,
-                    "format": {
-                        "type": "object",
-                        "properties": {
-                            "redis_commands": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "command": {"type": "string"},
-                                        "args": {
-                                            "type": "array",
-                                            "items": {"type": "string"},
-                                        },
-                                    },
-                                    "required": ["command", "args"],
-                                },
-                            },
-                            "template": {
-                                "type": "string",
-                            },
-                            "CSS": {
-                                "type": "string",
-                            },
-                            "Javascript": {
-                                "type": "string",
-                            },
-                        },
-                    },
-                },
-            )
-
-            if response.status_code == 200:
-                return response.json()["response"]
-            else:
-                raise Exception(
-                    f"Ollama API error: {response.status_code} - {response.text}"
-                )
+        self.foreground = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @contextmanager
+    def _foreground(self, background: bool):
+        """Count an interactive call so background work can wait for the LLM to go idle"""
+        if background:
+            yield
+            return
+        self.foreground += 1
+        self.idle.clear()
+        try:
+            yield
+        finally:
+            self.foreground -= 1
+            if self.foreground == 0:
+                self.idle.set()
+
+    @contextmanager
+    def _observe(self, provider: LLMProvider, model: str, user: str, system: str | SystemPrompt | None):
+        """Record an LLM call in the metrics and the capture log.
+
+        Yields the metric labels and a list the caller appends the response
+        text to.
+        """
+        labels = {"provider": provider.name, "model": model, "kind": request_kind.get()}
+        reply = []
+        error = None
+        start = time.perf_counter()
+        try:
+            yield labels, reply
+        except BaseException as e:
+            error = type(e).__name__
+            if isinstance(e, Exception):
+                llm_errors.inc(**labels)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            llm_seconds.observe(seconds, **labels)
+            capture_interaction(labels, system, user, "".join(reply), seconds, error)
+
+    async def wait_idle(self) -> None:
+        """Wait until no interactive LLM call is running"""
+        while self.foreground:
+            await self.idle.wait()
+
+    def _response_key(self, user: str, system: str | SystemPrompt | None, strong_model: bool = False) -> str:
+        provider = self.provider
+        return cache_key(provider.name, provider.model(strong_model=strong_model), "response",
+                         {"strong_model": strong_model}, system, user)
+
+    async def get_response(self, user: str, system: str | SystemPrompt | None = None, *, strong_model: bool = False,
+                           background: bool = False, cache: bool = True) -> str | None:
+        """Get response from configured LLM provider, or the response cache.
+
+        The response is not cached here; callers store it with `accept_response`
+        once they have parsed and acted on it.
+        """
+        provider = self.provider
+        model = provider.model(strong_model=strong_model)
+        if cache:
+            cached = await response_cache.lookup(self._response_key(user, system, strong_model))
+            if cached is not None:
+                return cached
+        with self._foreground(background), self._observe(provider, model, user, system) as (_, reply):
+            response = await provider.get_response(user, system, strong_model=strong_model)
+            reply.append(response or "")
+        return response
+
+    async def accept_response(self, user: str, system: str | SystemPrompt | None, text: str):
+        """Cache a reply, including any continuations, whose JSON parsed and whose commands ran"""
+        provider = self.provider
+        await response_cache.store(self._response_key(user, system), provider.name, provider.model(), "response", text)
+
+    async def reject_response(self, user: str, system: str | SystemPrompt | None):
+        """Drop an unusable reply from the cache, so retrying the same prompt asks the LLM again"""
+        await response_cache.discard(self._response_key(user, system))
+
+    async def continue_response(self, user: str, system: str | SystemPrompt | None, partial: str, *,
+                                background: bool = False) -> str:
+        """Ask the model to carry on from a cut-off reply; returns only the new text"""
+        llm_continuations.inc(kind=request_kind.get())
+        # Continuations are cached as part of the whole reply they complete
+        continuation = await self.get_response(settings.CONTINUE_PROMPT.format(user, partial), system,
+                                               background=background, cache=False)
+        return join_continuation(partial, continuation or "")
+
+    async def get_json_response(self, user: str, system: str | SystemPrompt | None = None, *,
+                                background: bool = False) -> tuple[dict | None, str]:
+        """Get a JSON object from the LLM, continuing a truncated reply and repairing small defects.
+
+        Returns the parsed object (None if nothing usable came back) and the
+        raw text it was parsed from. A reply that does not parse is dropped from
+        the response cache; one that does is only cached once the caller
+        passes it to `accept_response`.
+        """
+        text = await self.get_response(user, system, background=background) or ""
+        result = repair_json(text)
+        for _ in range(settings.LLM_MAX_CONTINUATIONS):
+            if not result.truncated:
+                break
+            logger.warning("LLM response was cut off after %d characters, asking it to continue", len(text))
+            text += await self.continue_response(user, system, result.text, background=background)
+            result = repair_json(text)
+        if result.repaired:
+            logger.warning("Repaired LLM response (truncated=%s, recovered=%s)", result.truncated, result.value is not None)
+        outcome = "failed" if result.value is None else "repaired" if result.repaired else "parsed"
+        llm_json_responses.inc(kind=request_kind.get(), outcome=outcome)
+        if result.value is None:
+            await self.reject_response(user, system)
+        return result.value, text
+
+    async def stream_response(self, user: str, system: str | SystemPrompt | None = None) -> AsyncIterator[str]:
+        """Stream the response from the configured LLM provider chunk by chunk; a cached response comes as one chunk.
+
+        Like get_response, the reply is cached only by `accept_response`.
+        """
+        provider = self.provider
+        model = provider.model()
+        # Keyed like get_response, so a page generated either way can be reused by the other
+        cached = await response_cache.lookup(self._response_key(user, system))
+        if cached is not None:
+            yield cached
+            return
+        with self._foreground(False), self._observe(provider, model, user, system) as (labels, reply):
+            start = time.perf_counter()
+            async for chunk in provider.stream_response(user, system):
+                if not reply:
+                    llm_first_chunk_seconds.observe(time.perf_counter() - start, **labels)
+                reply.append(chunk)
+                yield chunk
 
     async def get_design_response(self, user: str, system: Optional[str] = None) -> str | None:
         """Get response from LLM using a more capable model for design-phase thinking"""
-        if settings.LLM_DESIGN_PROVIDER == "gemini":
-            # Use a more capable model for design
-            design_model = settings.GEMINI_DESIGN_MODEL
-            response = self.client.models.generate_content(
-                model=design_model, contents=[user]
-            )
-            return response.text
-
-        elif settings.LLM_DESIGN_PROVIDER == "claude":
-            client = anthropic.Anthropic(api_key=settings.CLAUDE_API_KEY)
-            # Use Claude-3 Opus for design phase
-            design_model = settings.CLAUDE_MODEL_DESIGN
-            
-            response = client.messages.create(
-                model=design_model,
-                max_tokens=4000,
-                system=[{"type": "text", "text": system}] if system else None,
-                messages=[{"role": "user", "content": "{" + user}],
-            )
-            return response.content[0].text
-
-        else: 
-            raise NotImplementedError("Design mode not available for ollama :(")
-
-    def format_prompt(self, data_model: str, app_settings: dict) -> str:
-        """Format the prompt with system context and user message"""
-        per_page_settings = ""
-        if app_settings['page_instructions']:
-            per_page_settings = f"Page specific instructions:\n{app_settings['page_instructions']}"
-
-        previous_template = ""
-        if app_settings.get('generated_template'):
-            template_source = "for this page" if not app_settings.get('using_referring_page') else "for the referring page"
-            previous_template = f"""
-            Previously generated template (from {template_source}):
-            ```html
-            {app_settings['generated_template']}
-            ```
-            Please maintain asthetic consistency necessary for the current request but be sure to replace all static data with database calls. 
-            """
-
-        system_prompt = f"""
-        You are a modern world-class full featured web application server. 
-
-        Application Description: 
-        {app_settings['application_type']}
-
-        Your data model is:
-        {data_model}
-
-        {app_settings['prompt_template']}
-
-        {per_page_settings}
-
-        {previous_template}
-
-        The application is mounted at /{app_settings['guid']}.  All links should include the guid and be relative to this path.
+        provider = self.design_provider
+        model = provider.model(design=True)
+        key = cache_key(provider.name, model, "design", {}, system, user)
+        cached = await response_cache.lookup(key)
+        if cached is not None:
+            return cached
+        with self._foreground(False), self._observe(provider, model, user, system) as (_, reply):
+            response = await provider.get_design_response(user, system)
+            reply.append(response or "")
+        await response_cache.store(key, provider.name, model, "design", response)
+        return response
+
+    async def aclose(self) -> None:
+        """Close the pooled provider clients and the response cache"""
+        await close_providers()
+        await response_cache.close()
+
+    def format_prompt(self, data_model: str, app_settings: dict, row_counts: dict | None = None) -> SystemPrompt:
+        """Format the system prompt as a stable per-app prefix and a per-page suffix.
+
+        Nothing that changes between requests to the same app may go into the
+        prefix, or provider-side prompt caching stops matching. Over the token
+        budget, table sizes and the previous template are dropped and the schema
+        compacted before the page instructions are truncated; they are never
+        dropped, as they are the user's own words about this page.
         """
-
-        return system_prompt
+        budget = settings.PROMPT_TOKEN_BUDGET
+        template = app_settings.get('generated_template') or ""
+        if template and settings.PROMPT_MINIFY_TEMPLATE:
+            template = minify_template(template)
+        template_source = "for this page" if not app_settings.get('using_referring_page') else "for the referring page"
+        table_sizes = ", ".join(f"{table}: {row_count_text(count)} rows"
+                                for table, count in sorted((row_counts or {}).items(), key=lambda item: -item[1]))
+        truncated = partial(truncate_tokens, max_tokens=budget // 10)
+
+        # In the order the prompt is assembled from, lowest priority first
+        sections = [
+            PromptSection("table_sizes", table_sizes,
+                          [("largest", partial(first_entries, count=MAX_TABLE_SIZES)), ("dropped", dropped)],
+                          heading="Current table sizes: {}"),
+            PromptSection("previous_template", template, [("skeleton", template_skeleton), ("dropped", dropped)],
+                          heading=f"Previously generated template ({template_source}):\n```html\n{{}}\n```\n"
+                                  "Please maintain asthetic consistency necessary for the current request "
+                                  "but be sure to replace all static data with database calls."),
+            PromptSection("page_instructions", app_settings['page_instructions'] or "", [("truncated", truncated)],
+                          heading="Page specific instructions:\n{}"),
+            PromptSection("application", app_settings['application_type'] or "", [("truncated", truncated)],
+                          heading="Application Description:\n{}"),
+            PromptSection("data_model", data_model, [("columns", schema_columns), ("tables", schema_tables)],
+                          heading="Your data model is:\n{}"),
+            PromptSection("response_prompt", compact_text(app_settings['prompt_template'] or "")),
+        ]
+        table_sizes, previous_template, page_instructions, application, data_model, response_prompt = sections
+
+        intro = "You are a modern world-class full featured web application server."
+        mount = (f"The application is mounted at /{app_settings['guid']}.  "
+                 "All links should include the guid and be relative to this path.")
+        frame = estimate_tokens(intro + mount) + len(sections)
+        # Reductions in the order they are tried
+        order = [table_sizes, table_sizes, previous_template, previous_template, data_model, page_instructions,
+                 data_model, application]
+        if budget:
+            total = fit_sections(sections, budget - frame, order) + frame
+        else:
+            total = sum(section.tokens for section in sections) + frame
+
+        prefix = "\n\n".join(section for section in [
+            intro, application.rendered, data_model.rendered, response_prompt.rendered, mount,
+        ] if section)
+        suffix = "".join(f"\n\n{section.rendered}" for section in (table_sizes, page_instructions, previous_template)
+                         if section.rendered)
+
+        breakdown = ", ".join(f"{section.name} {section.tokens}" + (f" ({section.form})" if section.form != "full" else "")
+                              for section in sections)
+        log = logger.warning if budget and total > budget else logger.info
+        log(f"Prompt for {app_settings['guid']}: ~{total} tokens of {budget or 'unlimited'}: {breakdown}")
+        return SystemPrompt(prefix, suffix)
 
 
 # Create global LLM client instance
@@ -0,0 +1,206 @@
+import html
+import json
+import math
+import random
+import re
+import zlib
+from typing import Callable
+
+MOUNT_RE = re.compile(r"mounted at /([^\s.]+)\.")
+ITEM_PATH_RE = re.compile(r"/items/(\d+)")
+TOKEN_RE = re.compile(r"\s*\S{1,4}|\s+")
+CUT_OFF_MARKER = "Your previous reply to this request was cut off"
+TEMPLATE_MARKER = "Given the following design"
+# Phrases in the Redis initialization and page prompts
+REDIS_SEED_MARKER = "using Redis"
+REDIS_PAGE_MARKER = "You can query redis"
+SEED_ITEMS = 25
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Turn "fixed:S", "uniform:MIN,MAX" or "lognormal:MEDIAN,SIGMA" (seconds) into a sampler"""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",")] if params else []
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency distribution {spec!r}: use fixed:S, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA")
+
+
+def tokens(text: str) -> list[str]:
+    """Split text into pieces of about one model token each"""
+    return TOKEN_RE.findall(text)
+
+
+def _seed_response() -> dict:
+    commands = [
+        {"type": "sql", "name": "create_table_users",
+         "query": "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, username TEXT, email TEXT)"},
+        {"type": "sql", "name": "create_table_items",
+         "query": "CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, title TEXT, status TEXT, "
+                  "owner_id TEXT, created_at TEXT)"},
+        {"type": "sql", "name": "insert_user_1",
+         "query": "INSERT INTO users (user_id, username, email) VALUES ('user1', 'default_user', 'default@example.com')"},
+    ]
+    for i in range(1, SEED_ITEMS + 1):
+        status = ("new", "active", "done")[i % 3]
+        commands.append({"type": "sql", "name": f"insert_item_{i}",
+                         "query": f"INSERT INTO items (title, status, owner_id, created_at) "
+                                  f"VALUES ('Item {i}', '{status}', 'user1', '2025-01-{i:02d}')"})
+    return {"commands": commands}
+
+
+def _redis_seed_response() -> dict:
+    commands = [
+        {"type": "redis", "name": "data_model", "command": "SET",
+         "args": ["data_model", "Items are hashes item:<id> with title, status, owner_id and created_at. "
+                                "items:by_date orders them by creation and items:status:<status> indexes them."]},
+        {"type": "redis", "name": "user_1", "command": "HSET",
+         "args": ["user:user1", "username", "default_user", "email", "default@example.com"]},
+    ]
+    for i in range(1, SEED_ITEMS + 1):
+        status = ("new", "active", "done")[i % 3]
+        commands += [
+            {"type": "redis", "name": f"item_{i}", "command": "HSET",
+             "args": [f"item:{i}", "title", f"Item {i}", "status", status, "owner_id", "user1",
+                      "created_at", f"2025-01-{i:02d}"]},
+            {"type": "redis", "name": f"item_{i}_by_date", "command": "ZADD", "args": ["items:by_date", str(i), f"item:{i}"]},
+            {"type": "redis", "name": f"item_{i}_status", "command": "SADD", "args": [f"items:status:{status}", f"item:{i}"]},
+        ]
+    return {"commands": commands}
+
+
+SQL_ITEM_ROW = """
+      <a href="{base}/items/{{{{ row[0] }}}}">{{{{ row[1] }}}}</a>
+      <span class="status">{{{{ row[2] }}}}</span>
+      <button hx-get="{base}/items/{{{{ row[0] }}}}/details" hx-target="#details">Details</button>"""
+REDIS_ITEM_ROW = """
+      <a href="{base}/items/{{{{ row.split(':')[1] }}}}">{{{{ row }}}}</a>
+      <button hx-get="{base}/items/{{{{ row.split(':')[1] }}}}/details" hx-target="#details">Details</button>"""
+
+
+def _page_template(guid: str, heading: str, redis: bool = False) -> str:
+    base = f"/{guid}"
+    count = "results['count_items']" if redis else "results['count_items'][0][0]"
+    row = (REDIS_ITEM_ROW if redis else SQL_ITEM_ROW).format(base=base)
+    cards = "".join(
+        f"""
+    <section class="card">
+      <h3><i class="fa fa-star"></i> Highlight {n}</h3>
+      <p>A short description of what makes this part of the application useful.</p>
+      <a href="{base}/items?status={status}" class="link">See {status} items</a>
+    </section>"""
+        for n, status in enumerate(("new", "active", "done"), start=1)
+    )
+    return f"""
+<header class="app-header">
+  <nav>
+    <a href="{base}/">Home</a>
+    <a href="{base}/items">Items</a>
+    <a href="{base}/items/new">New item</a>
+    <a href="{base}/about">About</a>
+  </nav>
+</header>
+<main>
+  <h1>{heading}</h1>
+  <p class="summary">{{{{ {count} }}}} items in total</p>
+  <div class="cards">{cards}
+  </div>
+  <ul class="items">
+  {{% for row in results['list_items'] %}}
+    <li>{row}
+    </li>
+  {{% endfor %}}
+  </ul>
+  <div id="details"></div>
+  <form method="post" action="{base}/items">
+    <input name="title" placeholder="New item">
+    <button type="submit">Add</button>
+  </form>
+</main>
+<footer class="app-footer">Made with care</footer>
+"""
+
+
+def _redis_page_commands(method: str, body: str, item_id: int | None) -> list[dict]:
+    commands = []
+    if method == "POST":
+        new_id = SEED_ITEMS + 1 + zlib.crc32(body.encode()) % 1000000
+        commands += [
+            {"name": "insert_item", "command": "HSET",
+             "args": [f"item:{new_id}", "title", body[:80] or "Untitled", "status", "new", "owner_id", "user1"]},
+            {"name": "insert_item_by_date", "command": "ZADD", "args": ["items:by_date", str(new_id), f"item:{new_id}"]},
+        ]
+    elif method == "PUT" and item_id:
+        commands.append({"name": "update_item", "command": "HSET", "args": [f"item:{item_id}", "status", "done"]})
+    elif method == "DELETE" and item_id:
+        commands += [
+            {"name": "delete_item", "command": "DEL", "args": [f"item:{item_id}"]},
+            {"name": "delete_item_by_date", "command": "ZREM", "args": ["items:by_date", f"item:{item_id}"]},
+        ]
+    if method == "GET" and item_id:
+        commands.append({"name": "item", "command": "HGETALL", "args": [f"item:{item_id}"]})
+    commands += [
+        {"name": "list_items", "command": "ZREVRANGE", "args": ["items:by_date", "0", "19"]},
+        {"name": "count_items", "command": "ZCARD", "args": ["items:by_date"]},
+    ]
+    return commands
+
+
+def _page_response(method: str, path: str, body: str, guid: str, redis: bool = False) -> dict:
+    match = ITEM_PATH_RE.search(path)
+    item_id = int(match.group(1)) if match else None
+    commands = []
+    if redis:
+        commands = _redis_page_commands(method, body, item_id)
+    elif method == "POST":
+        title = body.replace("'", "''")[:80] or "Untitled"
+        commands.append({"name": "insert_item", "query": f"INSERT INTO items (title, status, owner_id, created_at) "
+                                                         f"VALUES ('{title}', 'new', 'user1', datetime('now'))"})
+    elif method == "PUT" and item_id:
+        commands.append({"name": "update_item", "query": f"UPDATE items SET status = 'done' WHERE id = {item_id}"})
+    elif method == "DELETE" and item_id:
+        commands.append({"name": "delete_item", "query": f"DELETE FROM items WHERE id = {item_id}"})
+    if not redis:
+        where = f" WHERE id = {item_id}" if method == "GET" and item_id else ""
+        commands += [
+            {"name": "list_items", "query": f"SELECT id, title, status FROM items{where} ORDER BY id DESC LIMIT 20"},
+            {"name": "count_items", "query": "SELECT COUNT(*) FROM items"},
+        ]
+    return {
+        "commands": commands,
+        "template": _page_template(guid, html.escape(f"{method} {path}").replace("{", "&#123;"), redis),
+        "CSS": ".cards { display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; } "
+               ".card { padding: 1rem; border-radius: 0.75rem; box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1); } "
+               ".items li { display: flex; justify-content: space-between; padding: 0.5rem 0; }",
+        "Javascript": "document.body.addEventListener('htmx:afterSwap', () => console.log('updated'));",
+    }
+
+
+def canned_response(user: str, system: str | None) -> str:
+    """A response in the shape the real models give for this prompt"""
+    if CUT_OFF_MARKER in user:
+        return ""  # Fake responses are never cut off, so there is nothing to continue
+    if not system:
+        return json.dumps(_redis_seed_response() if REDIS_SEED_MARKER in user else _seed_response(), indent=2)
+    request_line, _, body = user.partition("\n")
+    method, _, path = request_line.partition(" ")
+    match = MOUNT_RE.search(system)
+    guid = match.group(1) if match else "app"
+    redis = REDIS_PAGE_MARKER in str(system)
+    return json.dumps(_page_response(method, path or "/", body, guid, redis), indent=2)
+
+
+def canned_design_response(user: str) -> str:
+    if TEMPLATE_MARKER in user:
+        return _page_template("app", "Welcome") + "<style>body { font-family: system-ui; }</style>"
+    return ("A calm, spacious layout with a translucent header, soft shadows on rounded cards, a single accent "
+            "colour for actions and generous whitespace. Lists show status as small pills and every page keeps "
+            "the same navigation across the top.")
+
@@ -0,0 +1,149 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any
+
+LEADING_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\n?")
+TRAILING_FENCE_RE = re.compile(r"\s*```\s*$")
+STRING_END_FOLLOWERS = ",:}]"
+CLOSERS = {"{": "}", "[": "]"}
+MAX_CUT_ATTEMPTS = 32
+_decoder = json.JSONDecoder(strict=False)
+
+
+@dataclass
+class RepairResult:
+    """Outcome of parsing LLM output as a JSON object"""
+    value: dict | None  # None if nothing usable could be recovered
+    truncated: bool  # The output ended before the object was closed
+    repaired: bool  # Plain json.loads would have failed
+    text: str  # The output from the first brace on, without code fences
+
+
+def json_text(text: str) -> str:
+    """Drop anything before the first brace, such as a ```json fence; trailing text is ignored when parsing"""
+    start = text.find("{")
+    return text[start:] if start >= 0 else ""
+
+
+def _closers(stack: list[str] | tuple[str, ...]) -> str:
+    return "".join(CLOSERS[opener] for opener in reversed(stack))
+
+
+def _closable(stack: list[str] | tuple[str, ...]) -> bool:
+    """Only the root object and arrays may be closed where the text stopped"""
+    return all(opener == "[" for opener in stack[1:])
+
+
+def _candidates(text: str) -> tuple[list[str], bool]:
+    """Rewrite malformed JSON into candidate documents, most complete first.
+
+    Fixes trailing commas, unescaped quotes inside strings, single-quoted
+    strings, comments, mismatched closers, a trailing code fence and
+    trailing junk. If the text ends inside the object, the first candidate
+    closes it where it stopped and the rest cut back to earlier member
+    boundaries.
+    """
+    text = TRAILING_FENCE_RE.sub("", text)
+    out: list[str] = []
+    stack: list[str] = []
+    cuts: list[tuple[int, tuple[str, ...]]] = []
+    quote = None  # The quote character of the string being read
+    escaped = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        i += 1
+        if quote:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == quote:
+                rest = text[i:].lstrip()
+                if rest and rest[0] not in STRING_END_FOLLOWERS:
+                    out.append("\\" + c if c == '"' else c)  # A quote inside the value, e.g. class="x" in a template
+                    continue
+                quote = None
+                c = '"'
+            elif c == '"':
+                c = '\\"'  # A double quote inside a single-quoted string
+            out.append(c)
+        elif c in "\"'":
+            quote = c
+            out.append('"')
+        elif c == "/" and text[i:i + 1] in ("/", "*"):
+            end = text.find("\n" if text[i] == "/" else "*/", i)
+            i = len(text) if end < 0 else end + (0 if text[i] == "/" else 2)
+        elif c in CLOSERS:
+            stack.append(c)
+            out.append(c)
+            cuts.append((len(out), tuple(stack)))
+        elif c in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if stack:
+                out.append(CLOSERS[stack.pop()])
+            if not stack:
+                return ["".join(out)], False
+        elif c == ",":
+            cuts.append((len(out), tuple(stack)))
+            out.append(c)
+        else:
+            out.append(c)
+    in_string = quote is not None
+
+    # Never close a nested object early: a command missing its query is worse than no command
+    candidates = []
+    if _closable(stack):
+        if in_string:
+            candidates.append("".join(out[:-1] if escaped else out) + '"' + _closers(stack))
+        else:
+            candidates.append("".join(out).rstrip().rstrip(",") + _closers(stack))
+    for length, snapshot in reversed(cuts[-MAX_CUT_ATTEMPTS:]):
+        if _closable(snapshot):
+            candidates.append("".join(out[:length]).rstrip().rstrip(",") + _closers(snapshot))
+    return candidates, True
+
+
+def repair_json(text: str) -> RepairResult:
+    """Parse the JSON object in LLM output, recovering what it can from malformed or truncated text"""
+    body = json_text(text)
+    if not body:
+        return RepairResult(None, False, True, "")
+    try:
+        value, end = _decoder.raw_decode(body)
+        if isinstance(value, dict):
+            return RepairResult(value, False, bool(body[end:].strip()), body)
+    except json.JSONDecodeError:
+        pass
+
+    candidates, truncated = _candidates(body)
+    for candidate in candidates:
+        try:
+            value = _decoder.decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return RepairResult(value, truncated, True, body)
+    return RepairResult(None, truncated, True, body)
+
+
+def join_continuation(partial: str, continuation: str, max_overlap: int = 500) -> str:
+    """Return the part of `continuation` that follows `partial`, dropping any text the model repeated"""
+    continuation = LEADING_FENCE_RE.sub("", continuation)
+    if partial.endswith(continuation):
+        return ""
+    for size in range(min(len(partial), len(continuation), max_overlap), 0, -1):
+        if partial.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+def loads_member(member: str) -> list[tuple[str, Any]]:
+    """Parse one `"key": value` member, repairing it if needed; [] if it is unusable"""
+    try:
+        return list(_decoder.decode("{" + member + "}").items())
+    except json.JSONDecodeError:
+        value = repair_json("{" + member + "}").value
+        return list(value.items()) if value else []
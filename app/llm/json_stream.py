@@ -0,0 +1,73 @@
+from typing import Any, List, Tuple
+
+from app.llm.json_repair import loads_member, repair_json
+
+
+class IncrementalJSONParser:
+    """Parse the top-level members of a JSON object as its text arrives.
+
+    Feed chunks of LLM output with `feed`; each call returns the
+    `(key, value)` pairs whose values were completed by that chunk. Anything
+    before the opening brace (such as a ```json fence) is ignored, and
+    malformed members are repaired where possible. If the text stops before
+    the object closes, `finish` recovers what it can of the last member.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        members = []
+        text = self.text
+        while self.pos < len(text) and not self.done:
+            c = text[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if c == "{":
+                    self.depth = 1
+                    self.member_start = self.pos + 1
+            elif c == '"':
+                self.in_string = True
+            elif c in "{[":
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    members.extend(self._member(self.member_start, self.pos))
+                    self.done = True
+            elif c == "," and self.depth == 1:
+                members.extend(self._member(self.member_start, self.pos))
+                self.member_start = self.pos + 1
+            self.pos += 1
+        return members
+
+    @property
+    def started(self) -> bool:
+        return self.member_start is not None
+
+    def finish(self) -> List[Tuple[str, Any]]:
+        """Return what can be recovered of the member the text stopped in"""
+        if self.done or not self.started:
+            return []
+        self.done = True
+        value = repair_json("{" + self.text[self.member_start:]).value
+        return list(value.items()) if value else []
+
+    def _member(self, start: int, end: int) -> List[Tuple[str, Any]]:
+        member = self.text[start:end].strip()
+        if not member:
+            return []
+        return loads_member(member)
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SystemPrompt:
+    """A system prompt split into a byte-stable prefix and a per-request suffix.
+
+    The prefix depends only on the application (description, schema and
+    response instructions), so providers can cache it across requests.
+    """
+
+    prefix: str
+    suffix: str = ""
+
+    def __str__(self) -> str:
+        return self.prefix + self.suffix
+
+    def __bool__(self) -> bool:
+        return bool(self.prefix or self.suffix)
@@ -0,0 +1,218 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+
+CHARS_PER_TOKEN = 4
+# Static text longer than this is cut short in a minified template, and SVG path data longer than this elided
+MAX_STATIC_TEXT = 160
+MAX_PATH_DATA = 80
+# Identical sibling elements kept in a template skeleton, e.g. rows of a static list
+MAX_REPEATED_SIBLINGS = 2
+# Tables listed in the prompt's table sizes once it is over budget, largest first
+MAX_TABLE_SIZES = 10
+MINIFY_CACHE_SIZE = 256
+
+JINJA_RE = re.compile(r"\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}", re.DOTALL)
+# Jinja is swapped for numbered placeholders between these private-use characters while BeautifulSoup parses
+# the template; a placeholder standing in for an attribute gets a ="" from the parser, dropped again on render
+PLACEHOLDER_OPEN, PLACEHOLDER_CLOSE = "\ue000", "\ue001"
+PLACEHOLDER_RE = re.compile(f"{PLACEHOLDER_OPEN}(\\d+){PLACEHOLDER_CLOSE}(?:=\"\")?")
+WHITESPACE_RE = re.compile(r"\s+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+RAW_TEXT_TAGS = {"script", "style", "pre", "textarea"}
+# Entries in a CREATE TABLE column list that are constraints, not columns
+CONSTRAINT_WORDS = {"primary", "foreign", "unique", "check", "constraint"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text, at about four characters per token"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_text(text: str) -> str:
+    """Strip the indentation and trailing spaces of each line and squeeze runs of blank lines"""
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(line.strip() for line in text.strip().splitlines()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about `max_tokens`, at a word boundary"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _parse(template: str) -> tuple[BeautifulSoup, list[str]]:
+    """Parse a Jinja template as HTML with its Jinja tags swapped out, so the parser can't mangle them"""
+    blocks = []
+
+    def protect(match: re.Match) -> str:
+        blocks.append(match.group(0))
+        return f"{PLACEHOLDER_OPEN}{len(blocks) - 1}{PLACEHOLDER_CLOSE}"
+
+    return BeautifulSoup(JINJA_RE.sub(protect, template), "html.parser"), blocks
+
+
+def _render(soup: BeautifulSoup, blocks: list[str]) -> str:
+    # formatter=None leaves < and & in text alone, as Jinja expressions need them
+    html = soup.decode(formatter=None)
+    return PLACEHOLDER_RE.sub(lambda match: blocks[int(match.group(1))], html).strip()
+
+
+def _is_static(text: str) -> bool:
+    return PLACEHOLDER_OPEN not in text
+
+
+@lru_cache(maxsize=MINIFY_CACHE_SIZE)
+def minify_template(template: str) -> str:
+    """The template without comments, indentation, repeated inline SVG or long static text"""
+    soup, blocks = _parse(template)
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+    seen_svgs = set()
+    for svg in soup.find_all("svg"):
+        if svg.parent is None:
+            continue  # Inside an svg already replaced
+        for path in svg.find_all(attrs={"d": True}):
+            if len(path["d"]) > MAX_PATH_DATA:
+                path["d"] = path["d"][:MAX_PATH_DATA] + "…"
+        markup = str(svg)
+        if markup in seen_svgs:
+            svg.replace_with(Comment(" same svg as above "))
+        else:
+            seen_svgs.add(markup)
+
+    for text in soup.find_all(string=True):
+        if isinstance(text, Comment):
+            continue
+        if text.parent is not None and text.parent.name in RAW_TEXT_TAGS:
+            if text.parent.name in ("script", "style"):
+                text.replace_with(compact_text(text))
+            continue
+        squeezed = WHITESPACE_RE.sub(" ", text)
+        if not squeezed.strip():
+            text.extract()
+            continue
+        if _is_static(squeezed) and len(squeezed) > MAX_STATIC_TEXT:
+            squeezed = squeezed[:MAX_STATIC_TEXT].rsplit(" ", 1)[0] + " …"
+        if squeezed != text:
+            text.replace_with(NavigableString(squeezed))
+    return _render(soup, blocks)
+
+
+@lru_cache(maxsize=MINIFY_CACHE_SIZE)
+def template_skeleton(template: str) -> str:
+    """Only the structure of the template: tags, classes and Jinja, without static text, scripts, styles or SVG"""
+    soup, blocks = _parse(minify_template(template))
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup.find_all(["script", "style", "svg"]):
+        tag.clear()
+    for tag in soup.find_all(style=True):
+        del tag["style"]
+    for text in soup.find_all(string=True):
+        if _is_static(text) and text.parent is not None and text.parent.name not in ("script", "style"):
+            text.extract()
+    for tag in [soup] + soup.find_all(True):
+        previous, repeats = None, 0
+        for child in list(tag.children):
+            markup = str(child)
+            repeats = repeats + 1 if markup == previous else 0
+            previous = markup
+            if repeats >= MAX_REPEATED_SIBLINGS:
+                child.extract()
+    return _render(soup, blocks)
+
+
+def _split_columns(definition: str) -> list[str]:
+    """Split a column list on the commas outside parentheses"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(definition):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(definition[start:i])
+            start = i + 1
+    parts.append(definition[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def schema_columns(schema: str) -> str:
+    """The schema with each table's column definitions cut to the column names"""
+    lines = []
+    for line in schema.splitlines():
+        start, end = line.find("("), line.rfind(")")
+        if start == -1 or end < start:
+            lines.append(line)
+            continue
+        names = [part.split()[0] for part in _split_columns(line[start + 1:end])
+                 if part.split()[0].lower() not in CONSTRAINT_WORDS]
+        lines.append(f"{line[:start]}({', '.join(names)}){line[end + 1:]}")
+    return "\n".join(lines)
+
+
+def schema_tables(schema: str) -> str:
+    """Only the table names of the schema"""
+    return ", ".join(line.split("(")[0].strip() for line in schema.splitlines() if line.strip())
+
+
+@dataclass
+class PromptSection:
+    """One part of the system prompt, with ever shorter forms to fall back to when the prompt is over budget.
+
+    Each reduction is a (form, function) pair applied to the current text,
+    e.g. ("skeleton", template_skeleton) or ("dropped", dropped). A section
+    is rendered into its `heading` format string unless its text is empty.
+    """
+
+    name: str
+    text: str
+    reductions: list[tuple[str, Callable[[str], str]]] = field(default_factory=list)
+    heading: str = "{}"
+    form: str = "full"
+
+    @property
+    def rendered(self) -> str:
+        return self.heading.format(self.text) if self.text else ""
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.rendered)
+
+    def reduce(self):
+        self.form, reduction = self.reductions.pop(0)
+        self.text = reduction(self.text) if self.text else ""
+
+
+def fit_sections(sections: list[PromptSection], budget: int, order: list[PromptSection] | None = None) -> int:
+    """Shorten sections until their tokens fit the budget; returns their total tokens.
+
+    Each entry of `order` applies the next reduction of that section. Without
+    it, every reduction of each section is tried in list order.
+    """
+    total = sum(section.tokens for section in sections)
+    if order is None:
+        order = [section for section in sections for _ in section.reductions]
+    for section in order:
+        if total <= budget:
+            break
+        if section.reductions:
+            before = section.tokens
+            section.reduce()
+            total += section.tokens - before
+    return total
+
+
+def dropped(text: str) -> str:
+    return ""
+
+
+def first_entries(text: str, count: int) -> str:
+    """The first `count` entries of a comma-separated list"""
+    return ", ".join(text.split(", ")[:count])
@@ -0,0 +1,482 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+import anthropic
+import httpx
+from google import genai
+from google.genai import types
+
+from app.config.settings import settings
+from app.llm import fake
+from app.llm.prompt import SystemPrompt
+from app.utils.logger import logger
+from app.utils.metrics import llm_tokens, request_kind
+
+System = str | SystemPrompt | None
+
+
+@dataclass
+class TokenUsage:
+    """Token counts for one call, or running totals; input_tokens excludes cached tokens"""
+
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    cache_write_tokens: int = 0
+    output_tokens: int = 0
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.cached_input_tokens += other.cached_input_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+        self.output_tokens += other.output_tokens
+
+
+class LLMProvider:
+    """Base class for an LLM backend with a process-lifetime async client.
+
+    Each provider owns one pooled client and a semaphore that caps the number
+    of in-flight calls to that provider.
+    """
+
+    name = ""
+
+    def __init__(self, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.usage_totals: Dict[str, TokenUsage] = {}
+
+    def record_usage(self, model: str, usage: TokenUsage) -> None:
+        """Add one call's token counts to the per-model totals and log them"""
+        self.usage_totals.setdefault(model, TokenUsage()).add(usage)
+        labels = {"provider": self.name, "model": model, "kind": request_kind.get()}
+        llm_tokens.inc(usage.input_tokens, type="input", **labels)
+        llm_tokens.inc(usage.cached_input_tokens, type="cached_input", **labels)
+        llm_tokens.inc(usage.cache_write_tokens, type="cache_write", **labels)
+        llm_tokens.inc(usage.output_tokens, type="output", **labels)
+        logger.info(
+            f"LLM usage {self.name}/{model}: input={usage.input_tokens} cached={usage.cached_input_tokens} "
+            f"cache_write={usage.cache_write_tokens} output={usage.output_tokens}"
+        )
+
+    def model(self, *, strong_model: bool = False, design: bool = False) -> str:
+        """Name of the model a call with these options goes to, for metrics"""
+        return "default"
+
+    async def get_response(self, user: str, system: System = None, *, strong_model: bool = False) -> str | None:
+        async with self.semaphore:
+            return await self._get_response(user, system, strong_model=strong_model)
+
+    async def get_design_response(self, user: str, system: System = None) -> str | None:
+        async with self.semaphore:
+            return await self._get_design_response(user, system)
+
+    async def stream_response(self, user: str, system: System = None) -> AsyncIterator[str]:
+        """Yield the response text in chunks as the provider produces them"""
+        async with self.semaphore:
+            async for chunk in self._stream_response(user, system):
+                yield chunk
+
+    async def _get_response(self, user: str, system: System, *, strong_model: bool) -> str | None:
+        raise NotImplementedError
+
+    async def _stream_response(self, user: str, system: System) -> AsyncIterator[str]:
+        # Providers without a streaming API hand back the whole response as one chunk
+        yield await self._get_response(user, system, strong_model=False)
+
+    async def _get_design_response(self, user: str, system: System) -> str | None:
+        raise NotImplementedError(f"Design mode not available for {self.name} :(")
+
+    async def aclose(self) -> None:
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, max_concurrency: int = settings.GEMINI_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        if not settings.GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY environment variable not set")
+        self.client = genai.Client(
+            api_key=settings.GEMINI_API_KEY,
+            http_options=types.HttpOptions(
+                timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000),
+                async_client_args={"limits": httpx.Limits(max_connections=max_concurrency)},
+            ),
+        )
+        # (model, prefix hash) -> (cached content name or None after a failure, expires_at)
+        self.context_caches: Dict[tuple, tuple] = {}
+        self.context_cache_lock = asyncio.Lock()
+
+    def model(self, *, strong_model: bool = False, design: bool = False) -> str:
+        return settings.GEMINI_DESIGN_MODEL if strong_model or design else settings.GEMINI_MODEL
+
+    async def _cached_content(self, model: str, prefix: str) -> str | None:
+        """Return a Gemini cached-content name holding `prefix`, creating it if needed"""
+        if not settings.GEMINI_CONTEXT_CACHE or len(prefix) < settings.GEMINI_CACHE_MIN_CHARS:
+            return None
+        key = (model, hashlib.sha256(prefix.encode()).hexdigest())
+        entry = self.context_caches.get(key)
+        if entry and entry[1] > time.time():
+            return entry[0]
+
+        async with self.context_cache_lock:
+            now = time.time()
+            entry = self.context_caches.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+            self.context_caches = {k: v for k, v in self.context_caches.items() if v[1] > now}
+            ttl = settings.GEMINI_CACHE_TTL_SECONDS
+            try:
+                cache = await self.client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(system_instruction=prefix, ttl=f"{ttl}s"),
+                )
+                # Stop using the cache a minute before Gemini expires it
+                self.context_caches[key] = (cache.name, now + ttl - 60)
+                return cache.name
+            except Exception as e:
+                logger.warning(f"Could not create Gemini context cache, sending the full prompt: {e}")
+                self.context_caches[key] = (None, now + 600)
+                return None
+
+    async def _page_request(self, user: str, system: System) -> tuple[list, types.GenerateContentConfig]:
+        """Build contents and config for a page request, using cached content for the prompt prefix"""
+        cached_content = None
+        if isinstance(system, SystemPrompt):
+            cached_content = await self._cached_content(settings.GEMINI_MODEL, system.prefix)
+        contents = [user]
+        system_instruction = str(system) if system else None
+        if cached_content:
+            # The cached content carries the prefix; a request using it can't set a system instruction
+            system_instruction = None
+            if system.suffix.strip():
+                contents = [system.suffix, user]
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            cached_content=cached_content,
+            response_mime_type="application/json",
+            response_schema={
+                "properties": {
+                    "template": {"type": "STRING"},
+                    "CSS": {"type": "STRING"},
+                    "Javascript": {"type": "STRING"},
+                    "commands": {
+                        "type": "array",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "query": {"type": "string"},
+                            }
+                        }
+                    }
+                },
+                "type": "OBJECT"
+            }
+        )
+        return contents, config
+
+    def _record_response_usage(self, model: str, response) -> None:
+        metadata = getattr(response, "usage_metadata", None)
+        if not metadata:
+            return
+        cached = metadata.cached_content_token_count or 0
+        self.record_usage(model, TokenUsage(
+            input_tokens=(metadata.prompt_token_count or 0) - cached,
+            cached_input_tokens=cached,
+            output_tokens=metadata.candidates_token_count or 0,
+        ))
+
+    async def _get_response(self, user: str, system: System, *, strong_model: bool) -> str | None:
+        if strong_model:
+            logger.info("Using strong model!")
+            contents, config = [str(system), user], None
+        else:
+            contents, config = await self._page_request(user, system)
+        model = self.model(strong_model=strong_model)
+        response = await self.client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config
+        )
+        self._record_response_usage(model, response)
+        return response.text
+
+    async def _stream_response(self, user: str, system: System) -> AsyncIterator[str]:
+        contents, config = await self._page_request(user, system)
+        stream = await self.client.aio.models.generate_content_stream(
+            model=settings.GEMINI_MODEL,
+            contents=contents,
+            config=config,
+        )
+        last_chunk = None
+        async for chunk in stream:
+            last_chunk = chunk
+            if chunk.text:
+                yield chunk.text
+        if last_chunk is not None:
+            self._record_response_usage(settings.GEMINI_MODEL, last_chunk)
+
+    async def _get_design_response(self, user: str, system: System) -> str | None:
+        response = await self.client.aio.models.generate_content(
+            model=settings.GEMINI_DESIGN_MODEL, contents=[user]
+        )
+        self._record_response_usage(settings.GEMINI_DESIGN_MODEL, response)
+        return response.text
+
+
+class ClaudeProvider(LLMProvider):
+    name = "claude"
+
+    def __init__(self, max_concurrency: int = settings.CLAUDE_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.CLAUDE_API_KEY,
+            http_client=httpx.AsyncClient(
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=max_concurrency),
+            ),
+        )
+
+    def model(self, *, strong_model: bool = False, design: bool = False) -> str:
+        return settings.CLAUDE_MODEL_DESIGN if design else settings.CLAUDE_MODEL
+
+    @staticmethod
+    def _system_blocks(system: System):
+        """System blocks with a cache breakpoint after the stable prompt prefix"""
+        if not system:
+            return anthropic.NOT_GIVEN
+        if not isinstance(system, SystemPrompt):
+            return [{"type": "text", "text": system}]
+        blocks = [{"type": "text", "text": system.prefix, "cache_control": {"type": "ephemeral"}}]
+        if system.suffix.strip():
+            blocks.append({"type": "text", "text": system.suffix})
+        return blocks
+
+    def _record_message_usage(self, model: str, message) -> None:
+        usage = message.usage
+        self.record_usage(model, TokenUsage(
+            input_tokens=usage.input_tokens or 0,
+            cached_input_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+            output_tokens=usage.output_tokens or 0,
+        ))
+
+    async def _get_response(self, user: str, system: System, *, strong_model: bool) -> str | None:
+        response = await self.client.messages.create(
+            model=settings.CLAUDE_MODEL,
+            max_tokens=3000,
+            system=self._system_blocks(system),
+            messages=[{"role": "user", "content": "{" + user}],
+        )
+        self._record_message_usage(settings.CLAUDE_MODEL, response)
+        return response.content[0].text
+
+    async def _stream_response(self, user: str, system: System) -> AsyncIterator[str]:
+        async with self.client.messages.stream(
+            model=settings.CLAUDE_MODEL,
+            max_tokens=3000,
+            system=self._system_blocks(system),
+            messages=[{"role": "user", "content": "{" + user}],
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            self._record_message_usage(settings.CLAUDE_MODEL, await stream.get_final_message())
+
+    async def _get_design_response(self, user: str, system: System) -> str | None:
+        response = await self.client.messages.create(
+            model=settings.CLAUDE_MODEL_DESIGN,
+            max_tokens=4000,
+            system=self._system_blocks(system),
+            messages=[{"role": "user", "content": "{" + user}],
+        )
+        self._record_message_usage(settings.CLAUDE_MODEL_DESIGN, response)
+        return response.content[0].text
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+
+class OllamaProvider(LLMProvider):
+    name = "ollama"
+
+    def __init__(self, max_concurrency: int = settings.OLLAMA_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=settings.OLLAMA_URL,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=max_concurrency),
+        )
+
+    def model(self, *, strong_model: bool = False, design: bool = False) -> str:
+        return settings.OLLAMA_MODEL
+
+    @staticmethod
+    def _request_body(user: str, system: System, stream: bool) -> dict:
+        return {
+            "model": settings.OLLAMA_MODEL,
+            "prompt": str(system or "") + user,
+            "stream": stream,
+            "format": {
+                "type": "object",
+                "properties": {
+                    "redis_commands": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "command": {"type": "string"},
+                                "args": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                },
+                            },
+                            "required": ["command", "args"],
+                        },
+                    },
+                    "template": {
+                        "type": "string",
+                    },
+                    "CSS": {
+                        "type": "string",
+                    },
+                    "Javascript": {
+                        "type": "string",
+                    },
+                },
+            },
+        }
+
+    def _record_body_usage(self, body: dict) -> None:
+        # Ollama reuses its KV cache for a repeated prefix but doesn't report it
+        self.record_usage(settings.OLLAMA_MODEL, TokenUsage(
+            input_tokens=body.get("prompt_eval_count", 0),
+            output_tokens=body.get("eval_count", 0),
+        ))
+
+    async def _get_response(self, user: str, system: System, *, strong_model: bool) -> str | None:
+        response = await self.client.post("/api/generate", json=self._request_body(user, system, stream=False))
+
+        if response.status_code == 200:
+            body = response.json()
+            self._record_body_usage(body)
+            return body["response"]
+        else:
+            raise Exception(
+                f"Ollama API error: {response.status_code} - {response.text}"
+            )
+
+    async def _stream_response(self, user: str, system: System) -> AsyncIterator[str]:
+        async with self.client.stream("POST", "/api/generate", json=self._request_body(user, system, stream=True)) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise Exception(f"Ollama API error: {response.status_code} - {body.decode(errors='replace')}")
+            async for line in response.aiter_lines():
+                if line:
+                    body = json.loads(line)
+                    if body.get("response"):
+                        yield body["response"]
+                    if body.get("done"):
+                        self._record_body_usage(body)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class FakeProvider(LLMProvider):
+    """Canned responses with a configurable latency, for benchmarks and load tests.
+
+    Each call waits a time to first token drawn from FAKE_LLM_LATENCY, then
+    produces its response at FAKE_LLM_TOKENS_PER_SECOND, one token at a time
+    when streamed. Latencies are seeded with FAKE_LLM_SEED, so a run with the
+    same calls in the same order sees the same delays.
+    """
+
+    name = "fake"
+
+    def __init__(self, max_concurrency: int = settings.FAKE_LLM_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.latency = fake.parse_latency(settings.FAKE_LLM_LATENCY)
+        self.tokens_per_second = settings.FAKE_LLM_TOKENS_PER_SECOND
+        self.rng = random.Random(settings.FAKE_LLM_SEED)
+        self.seen_prefixes: set[str] = set()
+
+    def model(self, *, strong_model: bool = False, design: bool = False) -> str:
+        return "fake-design" if design or strong_model else "fake"
+
+    def _record_fake_usage(self, model: str, user: str, system: System, response: str) -> None:
+        # About four characters per token; a repeated prefix counts as cached, as with a real prompt cache
+        cached = 0
+        if isinstance(system, SystemPrompt):
+            if system.prefix in self.seen_prefixes:
+                cached = len(system.prefix) // 4
+            self.seen_prefixes.add(system.prefix)
+        self.record_usage(model, TokenUsage(
+            input_tokens=len(str(system or "") + user) // 4 - cached,
+            cached_input_tokens=cached,
+            output_tokens=len(fake.tokens(response)),
+        ))
+
+    async def _emit(self, text: str) -> AsyncIterator[str]:
+        """Yield `text` token by token at the configured pace, after the time to first token"""
+        start = time.monotonic() + max(self.latency(self.rng), 0.0)
+        for i, token in enumerate(fake.tokens(text)):
+            due = start + (i / self.tokens_per_second if self.tokens_per_second > 0 else 0)
+            delay = due - time.monotonic()
+            # Sleeping for every token would cost more than the tokens; catch up in steps of a few ms
+            if delay > 0.005 or i == 0:
+                await asyncio.sleep(max(delay, 0))
+            yield token
+
+    async def _complete(self, text: str) -> str:
+        return "".join([token async for token in self._emit(text)])
+
+    async def _get_response(self, user: str, system: System, *, strong_model: bool) -> str | None:
+        response = await self._complete(fake.canned_response(user, str(system) if system else None))
+        self._record_fake_usage(self.model(strong_model=strong_model), user, system, response)
+        return response
+
+    async def _stream_response(self, user: str, system: System) -> AsyncIterator[str]:
+        response = fake.canned_response(user, str(system) if system else None)
+        async for token in self._emit(response):
+            yield token
+        self._record_fake_usage(self.model(), user, system, response)
+
+    async def _get_design_response(self, user: str, system: System) -> str | None:
+        response = await self._complete(fake.canned_design_response(user))
+        self._record_fake_usage(self.model(design=True), user, system, response)
+        return response
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "claude": ClaudeProvider,
+    "ollama": OllamaProvider,
+    "fake": FakeProvider,
+}
+
+_provider_instances: Dict[str, LLMProvider] = {}
+
+
+def get_provider(name: str) -> LLMProvider:
+    """Return the shared provider instance for `name`, creating it on first use"""
+    if name not in PROVIDERS:
+        name = "ollama"  # default to ollama, as before
+    if name not in _provider_instances:
+        _provider_instances[name] = PROVIDERS[name]()
+    return _provider_instances[name]
+
+
+async def close_providers() -> None:
+    """Close every provider client opened by this process"""
+    for provider in list(_provider_instances.values()):
+        try:
+            await provider.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing LLM provider {provider.name}: {e}")
+    _provider_instances.clear()
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+
+from app.config.settings import settings
+from app.llm.prompt import SystemPrompt
+from app.utils.logger import logger
+from app.utils.metrics import StatsGauge, llm_cache_lookups, registry, request_kind
+
+LLM_CACHE_TABLE_NAME = "llm_responses"
+
+CACHE_OFF = "off"
+CACHE_READWRITE = "readwrite"  # Serve repeated prompts from the cache and store new responses
+CACHE_RECORD = "record"  # Always call the LLM and store the responses
+CACHE_REPLAY = "replay"  # Answer only from the cache, e.g. to replay recorded traffic offline
+CACHE_MODES = (CACHE_OFF, CACHE_READWRITE, CACHE_RECORD, CACHE_REPLAY)
+
+# Set for a request that must not be answered from the cache, such as a hard reload
+bypass_cache: ContextVar[bool] = ContextVar("bypass_cache", default=False)
+
+
+class CacheMiss(Exception):
+    """A prompt with no stored response while the cache is in replay mode"""
+
+
+def cache_key(provider: str, model: str, call: str, options: dict, system: str | SystemPrompt | None, user: str) -> str:
+    """Hash of everything that determines an LLM response"""
+    material = json.dumps([provider, model, call, options, str(system or ""), user], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed store of LLM responses in a SQLite file.
+
+    Entries are keyed by `cache_key` and evicted least recently used first
+    once their total size passes `max_bytes`. Like the settings DB, all
+    database work runs on one dedicated thread.
+    """
+
+    def __init__(self, db_path: str = settings.LLM_CACHE_PATH, mode: str = settings.LLM_CACHE_MODE,
+                 max_bytes: int = settings.LLM_CACHE_MAX_BYTES, ttl: int = settings.LLM_CACHE_TTL_SECONDS,
+                 bypass_kinds: str = settings.LLM_CACHE_BYPASS):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"LLM_CACHE_MODE must be one of {', '.join(CACHE_MODES)}, not {mode!r}")
+        self.db_path = db_path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bypass_kinds = {kind.strip() for kind in bypass_kinds.split(",") if kind.strip()}
+        self.conn = None
+        self.total_bytes = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {LLM_CACHE_TABLE_NAME} (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT,
+                    model TEXT,
+                    call TEXT,
+                    response TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    last_used_at REAL,
+                    expires_at REAL
+                )
+            """)
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{LLM_CACHE_TABLE_NAME}_last_used "
+                              f"ON {LLM_CACHE_TABLE_NAME} (last_used_at)")
+            self.conn.commit()
+            self._sync_total()
+        return self.conn
+
+    def _sync_total(self):
+        # Other processes may share the file, so recount rather than trust the running total
+        self.total_bytes = self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {LLM_CACHE_TABLE_NAME}").fetchone()[0]
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking database call on the cache thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def _close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    async def close(self):
+        await self._run(self._close)
+
+    def _use(self) -> bool:
+        """Whether the current call may use the cache at all"""
+        if self.mode == CACHE_OFF or (self.mode != CACHE_REPLAY and bypass_cache.get()):
+            return False
+        return request_kind.get() not in self.bypass_kinds
+
+    async def lookup(self, key: str) -> str | None:
+        """The stored response for `key`, or None if the LLM has to be called.
+
+        Raises CacheMiss in replay mode when nothing is stored.
+        """
+        kind = request_kind.get()
+        if not self._use() or self.mode == CACHE_RECORD:
+            llm_cache_lookups.inc(kind=kind, result="bypass")
+            return None
+        response = await self._run(self._get, key)
+        llm_cache_lookups.inc(kind=kind, result="miss" if response is None else "hit")
+        if response is None and self.mode == CACHE_REPLAY:
+            raise CacheMiss(f"No recorded LLM response for {key}")
+        return response
+
+    def _get(self, key: str) -> str | None:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(f"SELECT response, expires_at FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, expires_at = row
+        if expires_at and expires_at < now and self.mode != CACHE_REPLAY:
+            conn.execute(f"DELETE FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute(f"UPDATE {LLM_CACHE_TABLE_NAME} SET last_used_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return response
+
+    async def store(self, key: str, provider: str, model: str, call: str, response: str | None,
+                    ttl: int | None = None):
+        """Keep a response for later identical calls; empty responses are not stored"""
+        if not response or not self._use() or self.mode == CACHE_REPLAY:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            await self._run(self._put, key, provider, model, call, response, ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store LLM response in the cache: {e}")
+
+    async def discard(self, key: str):
+        """Drop the response for `key`, e.g. one that turned out unusable, so the next identical call asks the LLM"""
+        if not self._use() or self.mode == CACHE_REPLAY:
+            return
+        try:
+            await self._run(self._delete, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not drop LLM response from the cache: {e}")
+
+    def _delete(self, key: str):
+        conn = self._connect()
+        row = conn.execute(f"SELECT size FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute(f"DELETE FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", (key,))
+            conn.commit()
+            self.total_bytes -= row[0]
+
+    def _put(self, key: str, provider: str, model: str, call: str, response: str, ttl: int):
+        conn = self._connect()
+        now = time.time()
+        size = len(response.encode()) + len(key)
+        previous = conn.execute(f"SELECT size FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", (key,)).fetchone()
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {LLM_CACHE_TABLE_NAME}
+            (key, provider, model, call, response, size, created_at, last_used_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (key, provider, model, call, response, size, now, now, now + ttl if ttl > 0 else None))
+        conn.commit()
+        self.total_bytes += size - (previous[0] if previous else 0)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its budget"""
+        target = self.max_bytes * 0.9
+        conn = self.conn
+        self._sync_total()
+        freed = 0
+        keys = []
+        for key, size in conn.execute(f"SELECT key, size FROM {LLM_CACHE_TABLE_NAME} ORDER BY last_used_at"):
+            if self.total_bytes - freed <= target:
+                break
+            keys.append((key,))
+            freed += size
+        conn.executemany(f"DELETE FROM {LLM_CACHE_TABLE_NAME} WHERE key = ?", keys)
+        conn.commit()
+        self.total_bytes -= freed
+        logger.info(f"Evicted {len(keys)} LLM cache entries ({freed} bytes)")
+
+    def stats(self) -> dict:
+        return {"bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+
+response_cache = ResponseCache()
+registry.register(StatsGauge("autoapp_llm_cache", "LLM response cache size", response_cache.stats))
@@ -2,13 +2,17 @@ import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from app.config.settings import settings
+from app.db.index_advisor import index_advisor
+from app.db.redis_client import close_redis
 from app.db.settings_db_client import settings_db_client
-from app.api.routes import router
+from app.db.tenant_db import tenant_db_manager
+from app.api.routes import prefetcher, router
+from app.assets.bundle import STATIC_URL, HashedStaticFiles, assets
 from app.utils.logger import logger
 from app.llm.app_init import AppInitializer
+from app.llm.client import llm_client
 
 
 
@@ -19,8 +23,17 @@ async def lifespan(app: FastAPI):
     Initializes the database on startup and logs completion.
     """
     await settings_db_client.initialize_db()
+    await assets.start()
+    tenant_db_manager.start_archiving()
     yield
-    # any shutdown tasks would go here
+    await assets.stop()
+    await tenant_db_manager.stop_archiving()
+    await prefetcher.close()
+    await llm_client.aclose()
+    await close_redis()
+    await settings_db_client.close()
+    index_advisor.close()
+    tenant_db_manager.close_all()
 
 
 app = FastAPI(
@@ -31,6 +44,9 @@ app = FastAPI(
     debug=settings.DEV_MODE,
 )
 
+# Hashed assets from `python -m app.assets.build`, mounted ahead of the routes' catch-all
+app.mount(STATIC_URL, HashedStaticFiles(directory=settings.STATIC_DIR, check_dir=False), name="static")
+
 # Include API routes
 app.include_router(router)
 
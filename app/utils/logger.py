@@ -1,7 +1,54 @@
+import atexit
+import gzip
 import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from app.config.settings import settings
 
 
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Compress a log file as it is rotated out"""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def process_log_path(path: str) -> str:
+    """`path` with this process's pid before the extension when several workers run, e.g. app.1234.log
+
+    RotatingFileHandler assumes it is the only writer: with one file shared by
+    every worker, each rotates it on its own and the others keep writing to
+    the file that was just gzipped and removed.
+    """
+    if settings.WORKERS <= 1 or not os.path.isfile(path) and os.path.exists(path):
+        # One worker, or a device such as /dev/null
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def rotating_file_handler(path: str) -> RotatingFileHandler:
+    """A file handler for this process that rotates at LOG_MAX_BYTES and keeps LOG_BACKUP_COUNT gzipped old files"""
+    handler = RotatingFileHandler(
+        process_log_path(path), maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def queue_handler(*handlers: logging.Handler) -> QueueHandler:
+    """Hand records to a background thread that writes them to `handlers`, so logging never blocks the event loop"""
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flushes whatever is still queued at shutdown
+    atexit.register(listener.stop)
+    return QueueHandler(log_queue)
+
+
 def setup_logger(name: str = __name__) -> logging.Logger:
     """Configure and return a logger instance"""
     logger = logging.getLogger(name)
@@ -17,7 +64,7 @@ def setup_logger(name: str = __name__) -> logging.Logger:
 
     # Create handlers
     stream_handler = logging.StreamHandler()
-    file_handler = logging.FileHandler("llm_interactions.log")
+    file_handler = rotating_file_handler(settings.LOG_FILE)
 
     # Set formatters based on environment
     formatter = dev_formatter if settings.DEV_MODE else prod_formatter
@@ -25,11 +72,22 @@ def setup_logger(name: str = __name__) -> logging.Logger:
     file_handler.setFormatter(formatter)
 
     # Add handlers to logger
-    logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(queue_handler(stream_handler, file_handler))
 
     return logger
 
 
+def setup_capture_logger(name: str = "llm_capture") -> logging.Logger:
+    """Logger writing one JSON record per line to LLM_CAPTURE_FILE"""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    file_handler = rotating_file_handler(settings.LLM_CAPTURE_FILE)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(queue_handler(file_handler))
+    return logger
+
+
 # Create default logger instance
 logger = setup_logger()
+capture_logger = setup_capture_logger()
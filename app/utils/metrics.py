@@ -0,0 +1,260 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator
+
+from app.config.settings import settings
+
+# What the current work is for: page, htmx, init, design or prefetch
+request_kind: ContextVar[str] = ContextVar("request_kind", default="other")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+OTHER_TENANTS = "other"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[tuple[str, str]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+@contextmanager
+def kind(name: str):
+    """Label the metrics recorded inside the block with request kind `name`"""
+    token = request_kind.set(name)
+    try:
+        yield
+    finally:
+        request_kind.reset(token)
+
+
+class Metric:
+    """A named metric with a fixed set of label names, safe to update from worker threads"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if labels.keys() != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(zip(self.labels, key))} {_number(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self.series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self.series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self.series.items()]
+        for key, counts, total in series:
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels([*pairs, ('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(pairs)} {_number(total)}"
+            yield f"{self.name}_count{_labels(pairs)} {cumulative}"
+
+
+class StatsGauge(Metric):
+    """Expose a component's `stats()` dict as one gauge sample per key, labelled `stat`"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, stats: Callable[[], dict]):
+        super().__init__(name, help, ("stat",))
+        self.stats = stats
+
+    def samples(self) -> Iterator[str]:
+        for stat, value in self.stats().items():
+            yield f"{self.name}{_labels([('stat', stat)])} {_number(value)}"
+
+
+def timed(pieces: Iterable, histogram: Histogram, **labels) -> Iterator:
+    """Yield from `pieces`, observing the time spent producing them but not the time spent consuming them"""
+    iterator = iter(pieces)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                piece = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield piece
+    finally:
+        histogram.observe(elapsed, **labels)
+
+
+def tenant_hash(tenant: str) -> str:
+    """A stable label for a tenant that does not reveal its guid, which is all it takes to open the app"""
+    return hashlib.sha256(tenant.encode()).hexdigest()[:12]
+
+
+class TenantLabels:
+    """Tenant label values: hashed guids for the first `max_tenants` tenants seen, then OTHER_TENANTS"""
+
+    def __init__(self, max_tenants: int = settings.METRICS_MAX_TENANTS):
+        self.max_tenants = max_tenants
+        self.labels: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, tenant: str) -> str:
+        label = self.labels.get(tenant)
+        if label is None:
+            with self.lock:
+                if tenant not in self.labels and len(self.labels) >= self.max_tenants:
+                    return OTHER_TENANTS
+                label = self.labels.setdefault(tenant, tenant_hash(tenant))
+        return label
+
+
+tenant_label = TenantLabels()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+registry = Registry()
+
+llm_seconds = registry.register(Histogram(
+    "autoapp_llm_request_seconds", "LLM call duration including time queued for the provider",
+    ("provider", "model", "kind"), LLM_BUCKETS,
+))
+llm_first_chunk_seconds = registry.register(Histogram(
+    "autoapp_llm_first_chunk_seconds", "Time until a streamed LLM response produced its first chunk",
+    ("provider", "model", "kind"), LLM_BUCKETS,
+))
+llm_errors = registry.register(Counter(
+    "autoapp_llm_errors_total", "LLM calls that raised", ("provider", "model", "kind"),
+))
+llm_tokens = registry.register(Counter(
+    "autoapp_llm_tokens_total", "Tokens reported by the provider; type is input, cached_input, cache_write or output",
+    ("provider", "model", "kind", "type"),
+))
+llm_json_responses = registry.register(Counter(
+    "autoapp_llm_json_responses_total", "LLM JSON responses by outcome: parsed, repaired or failed",
+    ("kind", "outcome"),
+))
+llm_cache_lookups = registry.register(Counter(
+    "autoapp_llm_cache_lookups_total", "LLM response cache lookups by result: hit, miss or bypass", ("kind", "result"),
+))
+llm_continuations = registry.register(Counter(
+    "autoapp_llm_continuations_total", "Requests to continue a cut-off LLM response", ("kind",),
+))
+sql_seconds = registry.register(Histogram(
+    "autoapp_sql_execute_seconds", "Time to run an LLM-generated command list against a tenant database",
+    ("tenant", "kind"),
+))
+sql_aborted = registry.register(Counter(
+    "autoapp_sql_aborted_total", "Tenant statements stopped or cut short by a limit: timeout, rows or bytes",
+    ("tenant", "reason"),
+))
+sql_cache_lookups = registry.register(Counter(
+    "autoapp_sql_cache_lookups_total", "SELECT result cache lookups by result: hit, miss or skip", ("kind", "result"),
+))
+redis_seconds = registry.register(Histogram(
+    "autoapp_redis_execute_seconds", "Time to run an LLM-generated command list against a tenant's Redis keys",
+    ("tenant", "kind"),
+))
+render_seconds = registry.register(Histogram(
+    "autoapp_template_render_seconds", "Time spent rendering page templates", ("kind",),
+))
+init_seconds = registry.register(Histogram(
+    "autoapp_init_seconds", "App initialization duration by outcome", ("outcome",), LLM_BUCKETS,
+))
+init_stage_seconds = registry.register(Histogram(
+    "autoapp_init_stage_seconds", "Duration of each finished app initialization stage", ("stage",), LLM_BUCKETS,
+))
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+
+@dataclass
+class Stage:
+    """One step of a StagePipeline; `run` gets the results of the stages finished so far"""
+    name: str
+    label: str
+    run: Callable[[dict], Awaitable[Any]]
+    after: tuple[str, ...] = ()
+    status: str = "pending"  # pending, running, done, failed or cancelled
+    started_at: float | None = field(default=None, repr=False)
+    finished_at: float | None = field(default=None, repr=False)
+
+
+class StagePipeline:
+    """Run a small dependency graph of async stages.
+
+    Each stage starts as soon as the stages named in its `after` have
+    finished, so independent stages run at the same time. If a stage fails
+    the stages still pending or running are cancelled. Progress can be
+    followed with `progress` or by iterating `updates`.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            missing = [name for name in stage.after if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown or later stages: {missing}")
+            self.stages[stage.name] = stage
+        self.results: dict[str, Any] = {}
+        self.finished = False
+        self.failed = False
+        self.error: str | None = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, version: int, timeout: float | None = None) -> bool:
+        """Wait until the progress moves past `version`; False if `timeout` passed first"""
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run_stage(self, stage: Stage, tasks: dict[str, asyncio.Task]):
+        if stage.after:
+            await asyncio.gather(*(tasks[name] for name in stage.after))
+        stage.status = "running"
+        stage.started_at = time.monotonic()
+        self._notify()
+        try:
+            self.results[stage.name] = await stage.run(self.results)
+        except asyncio.CancelledError:
+            stage.status = "cancelled"
+            raise
+        except Exception:
+            stage.status = "failed"
+            raise
+        finally:
+            stage.finished_at = time.monotonic()
+        stage.status = "done"
+        self._notify()
+
+    async def run(self) -> dict[str, Any]:
+        """Run every stage and return their results by name"""
+        tasks: dict[str, asyncio.Task] = {}
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.create_task(self._run_stage(stage, tasks))
+        try:
+            await asyncio.gather(*tasks.values())
+            return self.results
+        except BaseException as e:
+            self.failed = True
+            self.error = str(e) or type(e).__name__
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            for stage in self.stages.values():
+                if stage.status in ("pending", "running"):
+                    stage.status = "cancelled"
+            raise
+        finally:
+            self.finished = True
+            self._notify()
+
+    def progress(self) -> dict:
+        now = time.monotonic()
+        return {
+            "done": self.finished and not self.failed,
+            "failed": self.failed,
+            "error": self.error,
+            "stages": [
+                {
+                    "name": stage.name,
+                    "label": stage.label,
+                    "status": stage.status,
+                    "seconds": round((stage.finished_at or now) - stage.started_at, 1) if stage.started_at else None,
+                }
+                for stage in self.stages.values()
+            ],
+        }
+
+    async def updates(self) -> AsyncIterator[dict]:
+        """Yield the progress now and again after every change until the pipeline finishes"""
+        while True:
+            version = self.version
+            yield self.progress()
+            if self.finished:
+                return
+            await self.wait_for_change(version)
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class FlightAbandoned(Exception):
+    """The leader of a flight stopped before producing a result"""
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one.
+
+    The first caller for a key leads and does the work; callers arriving
+    while it runs wait for the leader's result instead of repeating the work.
+    If the leader is cancelled, waiting callers are released and one of them
+    takes over.
+    """
+
+    def __init__(self):
+        self.flights: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def lead(self, key: Hashable) -> asyncio.Future:
+        """Register the caller as leader for `key`; resolve the flight with `finish` or `abandon`"""
+        flight = asyncio.get_running_loop().create_future()
+        self.flights[key] = flight
+        self.leaders += 1
+        return flight
+
+    def finish(self, key: Hashable, flight: asyncio.Future, result: Any = None, error: BaseException | None = None):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if flight.done():
+            return
+        if error is not None:
+            flight.set_exception(error)
+            flight.exception()  # Nobody may be waiting; don't warn about an unretrieved exception
+        else:
+            flight.set_result(result)
+
+    def abandon(self, key: Hashable, flight: asyncio.Future):
+        self.finish(key, flight, error=FlightAbandoned())
+
+    async def _join(self, key: Hashable) -> tuple[bool, Any]:
+        while key in self.flights:
+            try:
+                result = await asyncio.shield(self.flights[key])
+            except FlightAbandoned:
+                continue
+            self.coalesced += 1
+            return True, result
+        return False, None
+
+    async def join(self, key: Hashable) -> Any | None:
+        """Wait for the flight running for `key` and return its result, or None if there is none"""
+        _, result = await self._join(key)
+        return result
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of `fn()`, sharing it with concurrent calls for the same key"""
+        joined, result = await self._join(key)
+        if joined:
+            return result
+
+        flight = self.lead(key)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.abandon(key, flight)
+            raise
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
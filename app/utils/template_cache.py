@@ -0,0 +1,65 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+
+
+class TemplateCache:
+    """Bounded LRU of compiled LLM templates keyed by a hash of their source.
+
+    With `bytecode_cache_dir` set, compiled code is also written to disk so a
+    restarted process can skip Jinja's parse and compile steps.
+    """
+
+    def __init__(self, environment: Environment, max_size: int = 256, bytecode_cache_dir: str | None = None):
+        self.environment = environment
+        self.max_size = max_size
+        self.templates: OrderedDict[str, Template] = OrderedDict()
+        self.bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            self.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir, pattern="llm_%s.cache")
+        self.hits = 0
+        self.misses = 0
+        self.bytecode_hits = 0
+
+    def get(self, source: str) -> Template:
+        """Return the compiled template for `source`, compiling it on a miss"""
+        key = hashlib.sha256(source.encode()).hexdigest()
+        template = self.templates.get(key)
+        if template is not None:
+            self.templates.move_to_end(key)
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        template = self._compile(key, source)
+        self.templates[key] = template
+        if len(self.templates) > self.max_size:
+            self.templates.popitem(last=False)
+        return template
+
+    def _compile(self, key: str, source: str) -> Template:
+        env = self.environment
+        if self.bytecode_cache is None:
+            return env.from_string(source)
+
+        # Same steps as jinja2.loaders.BaseLoader.load, which from_string skips
+        bucket = self.bytecode_cache.get_bucket(env, key, None, source)
+        code = bucket.code
+        if code is None:
+            code = env.compile(source)
+            bucket.code = code
+            self.bytecode_cache.set_bucket(bucket)
+        else:
+            self.bytecode_hits += 1
+        return env.template_class.from_code(env, code, env.make_globals(None), None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.templates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytecode_hits": self.bytecode_hits,
+        }
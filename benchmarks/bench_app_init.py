@@ -0,0 +1,116 @@
+"""Time new-app initialization: the old sequential order against the stage pipeline.
+
+Every LLM call sleeps for a fixed latency. The old code ran design, template
+and sample data one after another; the pipeline seeds the database while the
+design is being written. The script also follows the progress events through
+the /_init/{guid}/events endpoint until the app serves pages.
+
+    python benchmarks/bench_app_init.py --latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-init-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ.setdefault("LLM_DESIGN_PROVIDER", "ollama")
+os.environ["STREAM_PAGES"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.db.tenant_db import tenant_db_manager  # noqa: E402
+from app.llm import app_init  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+SEED = json.dumps({"commands": [
+    {"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)"},
+    {"name": "seed", "query": "INSERT INTO items (title) VALUES ('first')"},
+]})
+PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "{% for row in results['items'] %}<p>{{ row[1] }}</p>{% endfor %}",
+})
+
+
+class SleepProvider(LLMProvider):
+    name = "sleep"
+
+    def __init__(self, latency: float):
+        super().__init__(max_concurrency=8)
+        self.latency = latency
+
+    async def _get_response(self, user, system, *, strong_model):
+        await asyncio.sleep(self.latency)
+        return SEED if system is None else PAGE
+
+    async def _get_design_response(self, user, system):
+        await asyncio.sleep(self.latency)
+        return "A punched up design"
+
+
+async def sequential(guid: str, app_type: str):
+    """The order initialize_background used before the pipeline"""
+    db_client = tenant_db_manager.get(guid)
+    design = await llm_client.get_design_response(settings.DESIGN_PROMPT.format(app_type))
+    template = await llm_client.get_design_response(settings.DESIGN_TEMPLATE_PROMPT.format(design))
+    await app_init.AppInitializer(db_client, app_type).initialize_database()
+    await settings_db_client.update(guid, design, settings.RESPONSE_PROMPT, "", "/", template)
+
+
+async def pipelined(guid: str, app_type: str):
+    await app_init.build_init_pipeline(guid, tenant_db_manager.get(guid), app_type).run()
+
+
+async def through_http(client: httpx.AsyncClient, guid: str) -> float:
+    start = time.perf_counter()
+    first = await client.get(f"/{guid}/")
+    assert "init-progress" in first.text, first.text[:200]
+    events = await client.get(f"/_init/{guid}/events")
+    updates = [json.loads(line[6:]) for line in events.text.splitlines() if line.startswith("data: ")]
+    page = await client.get(f"/{guid}/")
+    elapsed = time.perf_counter() - start
+    assert updates[-1]["done"] and "first" in page.text, (updates[-1], page.text[:200])
+    print(f"{'via http':>12}: {len(updates)} progress events, final {updates[-1]['stages']}")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    provider = SleepProvider(args.latency)
+    llm_client.provider = llm_client.design_provider = provider
+    await settings_db_client.initialize_db()
+
+    for label, init in (("sequential", sequential), ("pipeline", pipelined)):
+        guid = f"app-{label}"
+        await settings_db_client.update(guid, "a todo list", settings.RESPONSE_PROMPT, "", "/")
+        start = time.perf_counter()
+        await init(guid, "a todo list")
+        print(f"{label:>12}: {time.perf_counter() - start:.2f}s to usable ({args.latency:.2f}s per LLM call)")
+
+    await settings_db_client.update("app-http", "a todo list", settings.RESPONSE_PROMPT, "", "/")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        elapsed = await through_http(client, "app-http")
+    print(f"{'via http':>12}: {elapsed:.2f}s from first request to a rendered page")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
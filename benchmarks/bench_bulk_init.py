@@ -0,0 +1,57 @@
+"""Time loading LLM-style sample data: per-statement commits vs. one batched transaction.
+
+    python benchmarks/bench_bulk_init.py --rows 100 1000 10000 --synchronous FULL
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.sql_client import SqlClient  # noqa: E402
+
+
+def sample_commands(rows: int) -> list:
+    """CREATE statements followed by one literal INSERT per row, as the init prompt produces"""
+    commands = [
+        {"name": "create_users", "query": "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, username TEXT, email TEXT)"},
+        {"name": "create_tasks", "query": "CREATE TABLE IF NOT EXISTS tasks (task_id INTEGER PRIMARY KEY, user_id TEXT, title TEXT, done INTEGER, estimate REAL)"},
+        {"name": "insert_user_1", "query": "INSERT INTO users (user_id, username, email) VALUES ('user1', 'default_user', 'default@example.com')"},
+    ]
+    for i in range(rows):
+        commands.append({
+            "name": f"insert_task_{i}",
+            "query": f"INSERT INTO tasks (task_id, user_id, title, done, estimate) VALUES ({i}, 'user1', 'Task ''{i}''', {i % 2}, {i / 4})",
+        })
+    return commands
+
+
+def run(method: str, commands: list, synchronous: str) -> float:
+    with tempfile.TemporaryDirectory() as data_dir:
+        client = SqlClient(f"{data_dir}/tenant.db")
+        client._connect().execute(f"PRAGMA synchronous={synchronous}")
+        start = time.perf_counter()
+        getattr(client, method)(commands)
+        elapsed = time.perf_counter() - start
+        client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--synchronous", default="NORMAL", help="FULL fsyncs every commit, as the old rollback journal did")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'execute_commands':>18} {'execute_batch':>15} {'speedup':>8}")
+    for rows in args.rows:
+        commands = sample_commands(rows)
+        per_statement = run("execute_commands", commands, args.synchronous)
+        batched = run("execute_batch", commands, args.synchronous)
+        print(f"{rows:>8} {per_statement:>17.3f}s {batched:>14.3f}s {per_statement / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
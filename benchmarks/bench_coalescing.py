@@ -0,0 +1,110 @@
+"""Fire N concurrent identical page requests and count provider calls.
+
+With COALESCE_PAGES on, duplicates of an in-flight generation wait for it,
+so N requests should cost one provider call in both the streaming and the
+buffered page paths. Exits nonzero if more than one call was made.
+
+    python benchmarks/bench_coalescing.py --requests 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-coalesce-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ["REPLAY_PAGES"] = "false"  # measure generation, not stored-page replay
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.api import routes  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+GUID = "bench-app"
+PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "<ul>{% for row in results['items'] %}<li>{{ row[1] }}</li>{% endfor %}</ul>",
+    "CSS": "ul { margin: 0 }",
+    "Javascript": "",
+})
+
+
+class CountingProvider(LLMProvider):
+    name = "counting"
+
+    def __init__(self, latency: float):
+        super().__init__(max_concurrency=64)
+        self.latency = latency
+        self.calls = 0
+
+    async def _get_response(self, user, system, *, strong_model):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return PAGE
+
+
+def seed_tenant():
+    conn = sqlite3.connect(f"{settings.SQLITE_DB_PATH}{GUID}.db")
+    conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO items (title) VALUES (?)", [(f"item {i}",) for i in range(20)])
+    conn.commit()
+    conn.close()
+
+
+async def run(label: str, n: int, latency: float, stream: bool, coalesce: bool) -> bool:
+    settings.STREAM_PAGES = stream
+    settings.COALESCE_PAGES = coalesce
+    provider = CountingProvider(latency)
+    llm_client.provider = provider
+    before = routes.page_flights.stats()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.get(f"/{GUID}/dashboard", headers={"HX-Request": "true"} if i % 2 else {}) for i in range(n)
+        ))
+        elapsed = time.perf_counter() - start
+
+    after = routes.page_flights.stats()
+    ok = all(r.status_code == 200 and "item 19" in r.text for r in responses)
+    print(f"{label:>22}: {n} requests -> {provider.calls} provider calls, "
+          f"{after['coalesced'] - before['coalesced']} coalesced, {elapsed:.2f}s, all rendered: {ok}")
+    return ok and (provider.calls == 1 or not coalesce)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    await settings_db_client.initialize_db()
+    await settings_db_client.update(GUID, "bench app", settings.RESPONSE_PROMPT, "", "/")
+    seed_tenant()
+
+    results = [
+        await run("streamed, coalesced", args.requests, args.latency, stream=True, coalesce=True),
+        await run("buffered, coalesced", args.requests, args.latency, stream=False, coalesce=True),
+        await run("buffered, uncoalesced", args.requests, args.latency, stream=False, coalesce=False),
+    ]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,105 @@
+"""Fire N concurrent page requests at catch_all and time them.
+
+The provider is replaced by one that sleeps for a fixed latency, either with
+asyncio.sleep (an async client) or time.sleep (the old blocking SDK calls).
+With an async provider N requests should take about as long as one.
+
+    python benchmarks/bench_concurrent_requests.py --requests 10 --latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-bench-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ.setdefault("DEV_MODE", "false")
+os.environ["REPLAY_PAGES"] = "false"  # measure generation, not stored-page replay
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+GUID = "bench-app"
+PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "<ul>{% for row in results['items'] %}<li>{{ row[1] }}</li>{% endfor %}</ul>",
+    "CSS": "",
+    "Javascript": "",
+})
+
+
+class AsyncSleepProvider(LLMProvider):
+    name = "async-sleep"
+
+    def __init__(self, latency: float, max_concurrency: int):
+        super().__init__(max_concurrency)
+        self.latency = latency
+
+    async def _get_response(self, user, system, *, strong_model):
+        await asyncio.sleep(self.latency)
+        return PAGE
+
+
+class BlockingSleepProvider(AsyncSleepProvider):
+    name = "blocking-sleep"
+
+    async def _get_response(self, user, system, *, strong_model):
+        time.sleep(self.latency)
+        return PAGE
+
+
+def seed_tenant():
+    conn = sqlite3.connect(f"{settings.SQLITE_DB_PATH}{GUID}.db")
+    conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO items (title) VALUES (?)", [(f"item {i}",) for i in range(20)])
+    conn.commit()
+    conn.close()
+
+
+async def run(provider: LLMProvider, n: int) -> float:
+    llm_client.provider = provider
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(f"/{GUID}/page/{i}") for i in range(n)))
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="provider concurrency limit")
+    args = parser.parse_args()
+
+    await settings_db_client.initialize_db()
+    await settings_db_client.update(GUID, "bench app", settings.RESPONSE_PROMPT, "", "/")
+    seed_tenant()
+
+    for provider_cls in (BlockingSleepProvider, AsyncSleepProvider):
+        provider = provider_cls(args.latency, args.concurrency)
+        elapsed = await run(provider, args.requests)
+        print(f"{provider.name:>15}: {args.requests} concurrent requests, "
+              f"{args.latency:.2f}s provider latency -> {elapsed:.2f}s total")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""Compare first paint of a generated page with CDN assets and with the self-hosted build.
+
+Runs the app under uvicorn twice with the fake LLM provider: once with an
+empty STATIC_DIR, so app.html falls back to the CDNs and compiles Tailwind
+in the browser, and once with --static-dir from `python -m app.assets.build`.
+Each server generates and stores a page, which is then loaded in headless
+Chromium through Playwright over a throttled network, cold and warm,
+reading first-contentful-paint from the Performance API. Without Playwright
+only the render-blocking requests of each page's <head> are listed, with
+their origins and transferred bytes.
+
+    pip install playwright && playwright install chromium
+    python -m app.assets.build --static-dir /tmp/autoapp-static
+    python benchmarks/bench_first_paint.py --static-dir /tmp/autoapp-static --rtt 80 --down-kbps 10000
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+# Stylesheets and scripts without async/defer in <head> hold up the first paint
+BLOCKING_RE = re.compile(r'<link[^>]+rel="stylesheet"[^>]*>|<script(?![^>]*\b(?:async|defer)\b)[^>]+src="[^"]+"[^>]*>')
+URL_RE = re.compile(r'(?:href|src)="([^"]+)"')
+
+PAINT_SCRIPT = "performance.getEntriesByName('first-contentful-paint').map(entry => entry.startTime)[0] || null"
+
+
+async def start_server(port: int, static_dir: str) -> subprocess.Popen:
+    data_dir = tempfile.mkdtemp(prefix="autoapp-paint-")
+    env = {**os.environ, "STATIC_DIR": static_dir, "SQLITE_DB_PATH": data_dir + "/", "LLM_PROVIDER": "fake",
+           "FAKE_LLM_LATENCY": "fixed:0", "FAKE_LLM_TOKENS_PER_SECOND": "100000", "LOG_FILE": os.devnull,
+           "LLM_CAPTURE": "false", "DEV_MODE": "false"}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level",
+                               "warning"], cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+                return server
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    server.terminate()
+    sys.exit(f"The app did not start on port {port}")
+
+
+async def generated_page(base: str) -> str:
+    """Create an app and generate and store one of its pages; returns the page URL"""
+    async with httpx.AsyncClient(base_url=base, timeout=None) as client:
+        response = await client.post("/", data={"application_type": "a task tracker"})
+        guid = response.headers["location"].strip("/")
+        first = await client.get(f"/{guid}/")
+        if "init-progress" in first.text:
+            await client.get(f"/_init/{guid}/events")
+        (await client.get(f"/{guid}/reports")).raise_for_status()
+    return f"{base}/{guid}/reports"
+
+
+async def blocking_resources(url: str) -> list[tuple[str, int | None]]:
+    """The render-blocking URLs in the page's <head> and their compressed sizes, None where unreachable"""
+    async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+        head = (await client.get(url)).text.split("</head>")[0]
+        resources = []
+        for tag in BLOCKING_RE.findall(head):
+            resource = urljoin(url, URL_RE.search(tag).group(1))
+            try:
+                async with client.stream("GET", resource, headers={"accept-encoding": "br, gzip"}) as response:
+                    size = sum([len(chunk) async for chunk in response.aiter_raw()])
+                resources.append((resource, size if response.is_success else None))
+            except httpx.TransportError:
+                resources.append((resource, None))
+    return resources
+
+
+async def first_paints(url: str, args) -> tuple[list[float], list[float]]:
+    from playwright.async_api import async_playwright
+
+    cold, warm = [], []
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch()
+        for _ in range(args.runs):
+            context = await browser.new_context()
+            page = await context.new_page()
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+            await cdp.send("Network.emulateNetworkConditions", {
+                "offline": False, "latency": args.rtt,
+                "downloadThroughput": args.down_kbps * 1024 / 8, "uploadThroughput": args.down_kbps * 1024 / 8,
+            })
+            for paints in (cold, warm):
+                await page.goto(url, wait_until="load")
+                paints.append(await page.evaluate(PAINT_SCRIPT))
+            await context.close()
+        await browser.close()
+    return cold, warm
+
+
+async def measure(label: str, port: int, static_dir: str, args):
+    server = await start_server(port, static_dir)
+    try:
+        url = await generated_page(f"http://127.0.0.1:{port}")
+        resources = await blocking_resources(url)
+        origins = {urlparse(resource).netloc for resource, _ in resources}
+        known = [size for _, size in resources if size is not None]
+        print(f"{label}: {len(resources)} render-blocking requests to {len(origins)} origins, "
+              f"{sum(known) / 1024:.0f}KB compressed" + (" (some unreachable)" if len(known) < len(resources) else ""))
+        for resource, size in resources:
+            print(f"    {resource}  {'unreachable' if size is None else f'{size / 1024:.1f}KB'}")
+        try:
+            cold, warm = await first_paints(url, args)
+        except ImportError:
+            print("    Playwright is not installed, so first paint was not measured")
+            return
+        print(f"    first contentful paint: cold median {statistics.median(cold):.0f}ms, "
+              f"warm median {statistics.median(warm):.0f}ms ({args.runs} runs, {args.rtt}ms RTT, {args.down_kbps}kbps)")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--static-dir", required=True, help="output of python -m app.assets.build")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rtt", type=int, default=80, help="emulated round trip time in ms")
+    parser.add_argument("--down-kbps", type=int, default=10000, help="emulated bandwidth")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    await measure("CDN", args.port, tempfile.mkdtemp(prefix="autoapp-no-static-"), args)
+    await measure("self-hosted", args.port + 1, args.static_dir, args)
+    print(f"done in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Measure a page workload on a large tenant before and after the index advisor has reviewed it.
+
+The tenant is seeded with --rows items owned by a few thousand users and has
+no indexes beyond its primary keys, as LLM-written schemas usually are. The
+workload mixes the filters, joins and range queries generated pages run.
+After one pass the advisor reviews the recorded statements; the workload
+is then timed again. Finally the workload changes so one advisor index is
+no longer used, and a review with a zero drop delay removes it.
+
+    python benchmarks/bench_index_advisor.py --rows 200000 --runs 20
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-bench-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["QUERY_CACHE_MAX_BYTES"] = "0"  # time the queries, not cached results
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.index_advisor import ADVISOR_INDEX_PREFIX, index_advisor  # noqa: E402
+from app.db.sql_client import SqlClient  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+USERS = 2000
+
+
+def seed(client: SqlClient, rows: int):
+    rng = random.Random(0)
+    commands = [
+        {"name": "users", "query": "CREATE TABLE users (user_id TEXT PRIMARY KEY, username TEXT, team TEXT)"},
+        {"name": "items", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT, status TEXT, "
+                                   "owner_id TEXT, priority INTEGER, created_at TEXT)"},
+    ]
+    commands += [{"name": f"user_{u}", "query": f"INSERT INTO users VALUES ('u{u}', 'user {u}', 'team {u % 20}')"}
+                 for u in range(USERS)]
+    commands += [{"name": f"item_{i}", "query": f"INSERT INTO items (title, status, owner_id, priority, created_at) "
+                                               f"VALUES ('Item {i}', '{rng.choice(('new', 'active', 'done'))}', "
+                                               f"'u{rng.randrange(USERS)}', {rng.randrange(5)}, "
+                                               f"'2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}')"}
+                 for i in range(rows)]
+    client.execute_batch(commands)
+
+
+def workload(i: int) -> list[dict]:
+    user = f"u{i * 37 % USERS}"
+    return [
+        {"name": "mine", "query": f"SELECT id, title FROM items WHERE owner_id = '{user}' AND status = 'active' "
+                                  f"ORDER BY id DESC LIMIT 20"},
+        {"name": "team", "query": f"SELECT i.title, u.username FROM items i JOIN users u ON u.user_id = i.owner_id "
+                                  f"WHERE u.team = 'team {i % 20}' AND i.priority = {i % 5} LIMIT 50"},
+        {"name": "recent", "query": f"SELECT COUNT(*) FROM items WHERE created_at >= '2025-{i % 12 + 1:02d}-01'"},
+        {"name": "by_title", "query": f"SELECT * FROM items WHERE title = 'Item {i * 101}'"},
+    ]
+
+
+def run(client: SqlClient, runs: int) -> float:
+    start = time.perf_counter()
+    for i in range(runs):
+        client.execute_commands(workload(i))
+    return time.perf_counter() - start
+
+
+def advisor_indexes(client: SqlClient) -> list[str]:
+    return [row[0] for row in client.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE ? ORDER BY name", (f"{ADVISOR_INDEX_PREFIX}%",)
+    )]
+
+
+def wait_for_review():
+    index_advisor.executor.submit(lambda: None).result()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=20, help="workload passes per measurement")
+    args = parser.parse_args()
+    logger.setLevel(logging.INFO if os.getenv("VERBOSE") else logging.WARNING)
+
+    client = SqlClient(os.path.join(DATA_DIR, "large.db"))
+    seed(client, args.rows)
+    index_advisor.review_every = args.runs * len(workload(0))
+    index_advisor.min_runs = min(index_advisor.min_runs, args.runs)
+
+    before = run(client, args.runs)
+    wait_for_review()
+    print(f"before: {args.runs} passes -> {before * 1000:.0f}ms ({before / args.runs * 1000:.1f}ms per pass)")
+    print("advisor indexes:", ", ".join(advisor_indexes(client)) or "none")
+    after = run(client, args.runs)
+    wait_for_review()
+    print(f" after: {args.runs} passes -> {after * 1000:.0f}ms ({after / args.runs * 1000:.1f}ms per pass), "
+          f"{before / after:.0f}x faster")
+
+    # Stop filtering by title; with no drop delay the next review drops the index only that query used
+    index_advisor.drop_after = 0
+    title_indexes = [index for index in advisor_indexes(client) if index.endswith("_title")]
+    for i in range(index_advisor.review_every):
+        client.execute_commands([workload(i)[0]])
+    wait_for_review()
+    remaining = advisor_indexes(client)
+    dropped = bool(title_indexes) and not any(index in remaining for index in title_indexes)
+    print(f"{'PASS' if dropped else 'FAIL'}: unused {', '.join(title_indexes) or 'title index'} was dropped; "
+          f"kept {', '.join(remaining) or 'none'}")
+    print("stats:", index_advisor.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Report how many bad LLM responses each parsing strategy recovers.
+
+Each corpus line holds a captured or hand-made bad response (`text`), the
+page it should have been (`expected`, null if nothing should be recovered)
+and, for truncated responses, what the model sends when asked to continue
+(`rest`). A response counts as recovered when every top-level member of the
+expected page comes back intact.
+
+    python benchmarks/bench_json_repair.py [--corpus benchmarks/data/bad_llm_responses.jsonl] [-v]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.json_repair import repair_json  # noqa: E402
+from app.llm.json_stream import IncrementalJSONParser  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.ERROR)
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bad_llm_responses.jsonl")
+
+
+def legacy(text: str) -> dict | None:
+    """The string clean-up catch_all and AppInitializer used before"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    if not text.endswith("}"):
+        text += "}"
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def tolerant(text: str) -> dict | None:
+    return repair_json(text).value
+
+
+def streamed(text: str) -> dict | None:
+    parser = IncrementalJSONParser()
+    members = {}
+    for i in range(0, len(text), 37):
+        members.update(parser.feed(text[i:i + 37]))
+    members.update(parser.finish())
+    return members if parser.started else None
+
+
+class ReplayProvider(LLMProvider):
+    """Answers the first call with the bad response and any continuation request with its rest"""
+    name = "replay"
+
+    def __init__(self, case: dict):
+        super().__init__(max_concurrency=1)
+        self.case = case
+        self.calls = 0
+
+    async def _get_response(self, user, system, *, strong_model):
+        self.calls += 1
+        return self.case["text"] if self.calls == 1 else (self.case["rest"] or "")
+
+
+async def continued(case: dict) -> dict | None:
+    llm_client.provider = ReplayProvider(case)
+    value, _ = await llm_client.get_json_response("GET /tasks")
+    return value
+
+
+def recovered(value: dict | None, expected: dict | None) -> bool:
+    if expected is None:
+        return value is None
+    return value is not None and all(value.get(key) == expected[key] for key in expected)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    strategies = {
+        "legacy clean-up": lambda case: legacy(case["text"]),
+        "tolerant parse": lambda case: tolerant(case["text"]),
+        "streamed parse": lambda case: streamed(case["text"]),
+    }
+    scores = {name: 0 for name in list(strategies) + ["tolerant + continue"]}
+    for case in cases:
+        outcome = {name: recovered(fn(case), case["expected"]) for name, fn in strategies.items()}
+        outcome["tolerant + continue"] = recovered(await continued(case), case["expected"])
+        for name, ok in outcome.items():
+            scores[name] += ok
+        if args.verbose:
+            print(f"{case['name']:>34}: " + "  ".join(f"{name}={'ok' if ok else '--'}" for name, ok in outcome.items()))
+
+    print(f"{len(cases)} responses in {os.path.relpath(args.corpus)}")
+    for name, score in scores.items():
+        print(f"{name:>20}: {score:3d}/{len(cases)} recovered ({score / len(cases):.0%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Time spent inside logger calls on the event loop: synchronous handlers against the queue.
+
+Each call logs a message the size of a page prompt or response. The
+synchronous setup writes to the file and stream handlers from the calling
+thread, as the logger used to; the queued setup hands records to the
+background listener thread. --write-latency adds a delay to every file
+write to stand in for a slow or busy volume; with the page cache absorbing
+writes both setups cost about the same.
+
+    python benchmarks/bench_logging.py --messages 500 --size 30000 --write-latency 0.002
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.logger import queue_handler, rotating_file_handler  # noqa: E402
+
+
+class SlowFile:
+    """A file whose writes take at least `latency` seconds"""
+
+    def __init__(self, path: str, latency: float):
+        self.file = open(path, "a")
+        self.latency = latency
+
+    def write(self, text: str):
+        time.sleep(self.latency)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+def measure(logger: logging.Logger, messages: int, size: int) -> float:
+    message = "x" * size
+    start = time.perf_counter()
+    for i in range(messages):
+        logger.info("%d %s", i, message)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--size", type=int, default=30000, help="characters per message")
+    parser.add_argument("--write-latency", type=float, default=0.0, help="seconds added to each file write")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="autoapp-logging-")
+    devnull = open(os.devnull, "w")
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+    def file_handler(name: str) -> logging.Handler:
+        if args.write_latency:
+            return logging.StreamHandler(SlowFile(os.path.join(directory, name), args.write_latency))
+        return rotating_file_handler(os.path.join(directory, name))
+
+    sync = logging.getLogger("bench.sync")
+    for handler in (file_handler("sync.log"), logging.StreamHandler(devnull)):
+        handler.setFormatter(formatter)
+        sync.addHandler(handler)
+
+    queued = logging.getLogger("bench.queued")
+    queued_handlers = (file_handler("queued.log"), logging.StreamHandler(devnull))
+    for handler in queued_handlers:
+        handler.setFormatter(formatter)
+    queued.addHandler(queue_handler(*queued_handlers))
+
+    for logger in (sync, queued):
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        elapsed = measure(logger, args.messages, args.size)
+        print(f"{logger.name:>12}: {args.messages} x {args.size} chars -> {elapsed * 1000:.1f}ms in logger calls "
+              f"({elapsed / args.messages * 1e6:.0f}us each)")
+
+
+if __name__ == "__main__":
+    main()
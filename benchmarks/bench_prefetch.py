@@ -0,0 +1,109 @@
+"""Measure how link prefetching changes the latency of the next page.
+
+The provider answers every page with links to three other pages and sleeps
+for a fixed latency. With PREFETCH_PAGES on, the pages linked from the first
+page are generated in the background and the follow-up clicks are replayed.
+
+    python benchmarks/bench_prefetch.py --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-prefetch-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ["REPLAY_PAGES"] = "true"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.api import routes  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+GUID = "bench-app"
+LINKS = ["items", "items/1", "reports"]
+
+
+class LinkingProvider(LLMProvider):
+    name = "linking"
+
+    def __init__(self, latency: float):
+        super().__init__(max_concurrency=8)
+        self.latency = latency
+        self.calls = 0
+
+    async def _get_response(self, user, system, *, strong_model):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        nav = "".join(f"<a href='/{GUID}/{link}'>{link}</a>" for link in LINKS)
+        return json.dumps({
+            "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+            "template": f"<nav>{nav}<a href='https://example.com'>out</a></nav>"
+                        "<ul>{% for row in results['items'] %}<li>{{ row[1] }}</li>{% endfor %}</ul>",
+            "CSS": "",
+            "Javascript": "",
+        })
+
+
+def seed_tenant():
+    conn = sqlite3.connect(f"{settings.SQLITE_DB_PATH}{GUID}.db")
+    conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO items (title) VALUES (?)", [(f"item {i}",) for i in range(20)])
+    conn.commit()
+    conn.close()
+
+
+async def browse(client: httpx.AsyncClient) -> list[float]:
+    """Open the home page, pause like a reader would, then click each link"""
+    await client.get(f"/{GUID}/")
+    await asyncio.sleep(0.1)
+    while routes.prefetcher.tasks:
+        await asyncio.gather(*routes.prefetcher.tasks)
+    timings = []
+    for link in LINKS:
+        start = time.perf_counter()
+        response = await client.get(f"/{GUID}/{link}")
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200 and "item 19" in response.text, response.text[:200]
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    await settings_db_client.initialize_db()
+    await settings_db_client.update(GUID, "bench app", settings.RESPONSE_PROMPT, "", "/")
+    seed_tenant()
+
+    for prefetch in (False, True):
+        settings.PREFETCH_PAGES = prefetch
+        await settings_db_client.clear_templates(GUID)
+        provider = LinkingProvider(args.latency)
+        llm_client.provider = provider
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            timings = await browse(client)
+        print(f"prefetch {'on ' if prefetch else 'off'}: clicks took "
+              f"{', '.join(f'{t * 1000:.0f}ms' for t in timings)}; {provider.calls} provider calls")
+    print(f"prefetcher: {routes.prefetcher.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
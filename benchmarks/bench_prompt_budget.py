@@ -0,0 +1,104 @@
+"""Measure the system prompt's size under the token budget, section by section.
+
+Builds a page-sized previous template (inline SVG icons repeated per row,
+HTML comments, indentation and long static copy), a schema of --tables
+tables and their row counts, then formats the prompt with minification off,
+with it on, and at a few budgets. Prints the estimated tokens of each
+section and the form it ended up in, checks the prefix does not change with
+the per-page sections, and times format_prompt.
+
+    python benchmarks/bench_prompt_budget.py --tables 40 --rows 60
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LOG_FILE", os.devnull)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.settings import settings  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.prompt_builder import estimate_tokens, minify_template  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+ICON = ('<svg xmlns="http://www.w3.org/2000/svg" class="h-5 w-5 text-gray-400" viewBox="0 0 20 20" fill="currentColor">'
+        '<path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 '
+        '7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd"/></svg>')
+COPY = ("Keep track of every task your team is working on, see what is overdue at a glance and "
+        "share progress with stakeholders without leaving the page. ") * 4
+
+
+def page_template(rows: int) -> str:
+    lines = ['<!-- Task dashboard generated for the current request -->', '<div class="max-w-7xl mx-auto p-6">',
+             '    <h1 class="text-2xl font-bold">{{ title }}</h1>', f'    <p class="text-gray-600">{COPY}</p>',
+             '    <table class="min-w-full divide-y divide-gray-200">', '        <tbody>']
+    for i in range(rows):
+        lines += [f'            <!-- row {i} -->', '            <tr class="hover:bg-gray-50">',
+                  f'                <td class="px-4 py-2">{ICON}</td>',
+                  f'                <td class="px-4 py-2">Sample task {i}</td>',
+                  '                <td class="px-4 py-2"><span class="rounded bg-green-100 px-2">done</span></td>',
+                  '            </tr>']
+    lines += ['        </tbody>', '    </table>',
+              '    {% for task in results["tasks"] %}<a href="/{{ guid }}/tasks/{{ task[0] }}">{{ task[1] }}</a>{% endfor %}',
+              '</div>']
+    return "\n".join(lines)
+
+
+def schema(tables: int) -> str:
+    return "\n".join(f"table_{i}(id INTEGER PRIMARY KEY, title TEXT NOT NULL, status TEXT DEFAULT 'new', "
+                     f"owner_id INTEGER, amount DECIMAL(10, 2), created_at TIMESTAMP, "
+                     f"FOREIGN KEY (owner_id) REFERENCES users(id))" for i in range(tables))
+
+
+def breakdown(prompt) -> str:
+    return f"prefix {estimate_tokens(prompt.prefix)}, suffix {estimate_tokens(prompt.suffix)}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=60, help="static rows in the previous template")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    template = page_template(args.rows)
+    app_settings = {
+        "guid": "bench-app", "application_type": "A task tracker for small teams " * 5,
+        "prompt_template": settings.RESPONSE_PROMPT, "page_instructions": "Show overdue tasks first.",
+        "generated_template": template,
+    }
+    data_model = schema(args.tables)
+    row_counts = {f"table_{i}": i * 137 for i in range(args.tables)}
+
+    print(f"previous template: {estimate_tokens(template)} tokens, minified {estimate_tokens(minify_template(template))}")
+    settings.PROMPT_TOKEN_BUDGET, settings.PROMPT_MINIFY_TEMPLATE = 0, False
+    print(f"no budget, not minified: {breakdown(llm_client.format_prompt(data_model, app_settings, row_counts))}")
+    settings.PROMPT_MINIFY_TEMPLATE = True
+    print(f"no budget, minified:     {breakdown(llm_client.format_prompt(data_model, app_settings, row_counts))}")
+
+    logger.setLevel(logging.INFO)
+    for budget in (12000, 4000, 2500, 1500):
+        settings.PROMPT_TOKEN_BUDGET = budget
+        prompt = llm_client.format_prompt(data_model, app_settings, row_counts)
+        bare = llm_client.format_prompt(data_model, {**app_settings, "generated_template": "", "page_instructions": ""})
+        print(f"budget {budget}: {breakdown(prompt)}, prefix stable without page sections: {prompt.prefix == bare.prefix}")
+    logger.setLevel(logging.WARNING)
+
+    settings.PROMPT_TOKEN_BUDGET = 4000
+    minify_template.cache_clear()
+    start = time.perf_counter()
+    llm_client.format_prompt(data_model, app_settings, row_counts)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        llm_client.format_prompt(data_model, app_settings, row_counts)
+    warm = (time.perf_counter() - start) / args.runs
+    print(f"format_prompt: {cold * 1000:.1f}ms with an uncached template, {warm * 1000:.2f}ms cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measure SqlClient.execute_commands for a dashboard's SELECTs with and without the query cache.
+
+Each view runs a page's worth of list, count and aggregate queries against
+a tenant database. Every --write-every views a row is inserted, which
+invalidates that tenant's cached results. The script also checks that a
+write from another connection is seen and that one heavy tenant cannot
+evict the others.
+
+    python benchmarks/bench_query_cache.py --rows 20000 --views 2000 --write-every 20
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-bench-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["INDEX_ADVISOR"] = "false"  # keep the plans the same across both runs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.query_cache import QueryCache, query_cache  # noqa: E402
+from app.db.sql_client import SqlClient  # noqa: E402
+
+DASHBOARD = [
+    {"name": "recent", "query": "SELECT id, title, status FROM items ORDER BY id DESC LIMIT 20"},
+    {"name": "count", "query": "SELECT COUNT(*) FROM items"},
+    {"name": "by_status", "query": "SELECT status, COUNT(*) FROM items GROUP BY status"},
+    {"name": "open", "query": "SELECT id, title FROM items WHERE status = 'active' ORDER BY title LIMIT 50"},
+]
+
+
+def create_tenant(name: str, rows: int) -> SqlClient:
+    client = SqlClient(os.path.join(DATA_DIR, f"{name}.db"))
+    client.execute_batch(
+        [{"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT, status TEXT)"}]
+        + [{"name": f"row_{i}", "query": f"INSERT INTO items (title, status) VALUES ('Item {i}', "
+                                          f"'{('new', 'active', 'done')[i % 3]}')"} for i in range(rows)]
+    )
+    return client
+
+
+def run(client: SqlClient, views: int, write_every: int) -> float:
+    start = time.perf_counter()
+    for i in range(views):
+        if write_every and i % write_every == 0:
+            client.execute_commands([{"name": "add", "query": "INSERT INTO items (title, status) VALUES ('x', 'new')"}])
+        client.execute_commands(DASHBOARD)
+    return time.perf_counter() - start
+
+
+def check_external_write(client: SqlClient) -> bool:
+    before = client.execute_commands(DASHBOARD)["count"][0][0]
+    other = sqlite3.connect(client.db_path)
+    other.execute("INSERT INTO items (title, status) VALUES ('from another process', 'new')")
+    other.commit()
+    other.close()
+    return client.execute_commands(DASHBOARD)["count"][0][0] == before + 1
+
+
+def check_fairness() -> bool:
+    """Three heavy tenants fill their quotas, which together exceed the cache; a light tenant keeps its results"""
+    cache = QueryCache(max_bytes=100_000, tenant_max_bytes=40_000)
+    rows = [(i, "x" * 100) for i in range(10)]
+    for i in range(20):
+        cache.put("light", (1,), f"SELECT {i}", rows[:1])
+    for i in range(2000):
+        cache.put(f"heavy{i % 3}", (1,), f"SELECT {i}", rows)
+    light_kept = all(cache.get("light", (1,), f"SELECT {i}") for i in range(20))
+    within = all(cache.tenant_bytes[f"heavy{k}"] <= cache.tenant_max_bytes for k in range(3))
+    return light_kept and within and cache.total_bytes <= cache.max_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--views", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=20, help="views between writes; 0 for read-only")
+    args = parser.parse_args()
+
+    max_bytes = query_cache.max_bytes
+    for label, cache_bytes in (("uncached", 0), ("cached", max_bytes)):
+        query_cache.max_bytes = cache_bytes
+        client = create_tenant(label, args.rows)
+        elapsed = run(client, args.views, args.write_every)
+        print(f"{label:>9}: {args.views} views x {len(DASHBOARD)} SELECTs -> {elapsed * 1000:.0f}ms "
+              f"({elapsed / args.views * 1e6:.0f}us per view)")
+    print("stats:", query_cache.stats())
+
+    client = create_tenant("external", 100)
+    print(f"{'PASS' if check_external_write(client) else 'FAIL'}: a write from another connection invalidates the cache")
+    print(f"{'PASS' if check_fairness() else 'FAIL'}: a heavy tenant does not evict a light one")
+
+
+if __name__ == "__main__":
+    main()
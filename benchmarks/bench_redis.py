@@ -0,0 +1,156 @@
+"""Compare the pipelined, SCAN-based RedisClient with one round trip per command against a local redis-server.
+
+Seeds a tenant with --entities hashes plus sorted-set and set indexes, then
+times a page's command list, the key schema used in prompts, and many pages
+run concurrently. "per command" is what the client used to do: a blocking
+round trip for each command, KEYS * and a TYPE call per key. Keys are
+written under a throwaway prefix, which is deleted afterwards.
+
+    redis-server --port 6390 --save '' &
+    REDIS_PORT=6390 python benchmarks/bench_redis.py --entities 5000 --commands 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+
+os.environ.setdefault("REDIS_KEY_PREFIX", f"autoapp-bench-{uuid.uuid4().hex[:8]}:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.redis_client import RedisClient, close_redis  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+GUID = "bench-app"
+STATUSES = ("new", "active", "done")
+
+
+def seed_commands(entities: int) -> list[dict]:
+    commands = [{"name": "data_model", "command": "SET",
+                 "args": ["data_model", "Tasks are hashes task:<id>; tasks:by_date orders them, tasks:status:<s> indexes them"]}]
+    for i in range(entities):
+        commands += [
+            {"name": f"task_{i}", "command": "HSET", "args": [f"task:{i}", "title", f"Task {i}", "status", STATUSES[i % 3],
+                                                             "owner", f"user{i % 50}", "created_at", 1709347200 + i]},
+            {"name": f"task_{i}_date", "command": "ZADD", "args": ["tasks:by_date", 1709347200 + i, f"task:{i}"]},
+            {"name": f"task_{i}_status", "command": "SADD", "args": [f"tasks:status:{STATUSES[i % 3]}", f"task:{i}"]},
+        ]
+    return commands
+
+
+def page_commands(i: int, commands: int, entities: int) -> list[dict]:
+    """A typical page: a range of the newest tasks, counts by status and a hash per listed task"""
+    page = [
+        {"name": "latest", "command": "ZREVRANGE", "args": ["tasks:by_date", "0", str(commands - 5)]},
+        {"name": "new", "command": "SCARD", "args": ["tasks:status:new"]},
+        {"name": "active", "command": "SCARD", "args": ["tasks:status:active"]},
+        {"name": "done", "command": "SCARD", "args": ["tasks:status:done"]},
+    ]
+    page += [{"name": f"task_{n}", "command": "HGETALL", "args": [f"task:{(i * 7 + n) % entities}"]}
+             for n in range(commands - len(page))]
+    return page
+
+
+def per_command(sync: redis.Redis, namespace: str, commands: list[dict]) -> dict:
+    # The old client: one blocking round trip per command
+    return {cmd["name"]: sync.execute_command(cmd["command"], namespace + cmd["args"][0], *cmd["args"][1:])
+            for cmd in commands}
+
+
+def per_key_schema(sync: redis.Redis, namespace: str) -> str:
+    keys = sync.keys(f"{namespace}*")
+    return ",".join(f"{key} ({sync.type(key)})" for key in keys)
+
+
+def timed(fn, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+async def async_timed(fn, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        await fn()
+    return (time.perf_counter() - start) / runs
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--commands", type=int, default=20, help="commands per page")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    sync = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB, decode_responses=True)
+    client = RedisClient(GUID)
+    try:
+        sync.ping()
+    except redis.ConnectionError as e:
+        sys.exit(f"No redis-server at {settings.REDIS_HOST}:{settings.REDIS_PORT}: {e}")
+
+    try:
+        start = time.perf_counter()
+        await client.execute_batch(seed_commands(args.entities))
+        print(f"seeded {args.entities} tasks ({args.entities * 3 + 1} commands) in one MULTI/EXEC: "
+              f"{time.perf_counter() - start:.2f}s")
+
+        page = page_commands(0, args.commands, args.entities)
+        assert per_command(sync, client.namespace, page)["task_1"] == (await client.execute_commands(page))["task_1"]
+        old = timed(lambda: per_command(sync, client.namespace, page), args.runs)
+        new = await async_timed(lambda: client.execute_commands(page), args.runs)
+        print(f"page of {args.commands} commands: per command {old * 1000:.2f}ms, pipelined {new * 1000:.2f}ms "
+              f"({old / new:.1f}x)")
+
+        schema_runs = max(1, args.runs // 10)
+        old = timed(lambda: per_key_schema(sync, client.namespace), schema_runs)
+
+        async def cold_schema():
+            client.close()
+            return await client.get_schema()
+
+        cold = await async_timed(cold_schema, schema_runs)
+        warm = await async_timed(client.get_schema, args.runs)
+        print(f"schema of {args.entities + 4} keys: KEYS + TYPE per key {old * 1000:.0f}ms, "
+              f"SCAN + pipelined TYPE {cold * 1000:.0f}ms ({old / cold:.1f}x), cached {warm * 1000:.2f}ms")
+        print((await client.get_schema()).splitlines()[-4:])
+
+        pages = [page_commands(i, args.commands, args.entities) for i in range(args.runs * 4)]
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def threaded(commands):
+            async with semaphore:
+                await loop.run_in_executor(None, per_command, sync, client.namespace, commands)
+
+        await asyncio.gather(*(threaded(commands) for commands in pages))
+        old = time.perf_counter() - start
+
+        async def pooled(commands):
+            async with semaphore:
+                await client.execute_commands(commands)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(pooled(commands) for commands in pages))
+        new = time.perf_counter() - start
+        print(f"{len(pages)} pages, {args.concurrency} at a time: per command in threads {len(pages) / old:.0f} pages/s, "
+              f"pipelined on the async pool {len(pages) / new:.0f} pages/s ({old / new:.1f}x)")
+    finally:
+        keys = list(sync.scan_iter(match=f"{settings.REDIS_KEY_PREFIX}*", count=1000))
+        for start in range(0, len(keys), 1000):
+            sync.delete(*keys[start:start + 1000])
+        sync.close()
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Measure SettingsDBClient.get throughput against the original per-call implementation.
+
+The legacy path opens a connection, runs up to four queries and closes it
+again on every call, as SettingsDBClient.get did originally.
+
+    python benchmarks/bench_settings_db.py --apps 200 --calls 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-bench-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.settings_db_client import (  # noqa: E402
+    GENERATED_TEMPLATES_TABLE_NAME,
+    PAGE_INSTRUCTIONS_TABLE_NAME,
+    SETTINGS_TABLE_NAME,
+    SettingsDBClient,
+)
+
+PAGES = ["/", "/items", "/items/1", "/settings"]
+
+
+def legacy_get(db_path, guid, page_path, referring_page=None):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT application_type, prompt_template, guid FROM {SETTINGS_TABLE_NAME} WHERE guid = ? LIMIT 1", (guid,))
+    settings_row = cursor.fetchone()
+    cursor.execute(f"SELECT page_instructions FROM {PAGE_INSTRUCTIONS_TABLE_NAME} WHERE page_path = ? AND guid = ? LIMIT 1", (page_path, guid))
+    cursor.fetchone()
+    cursor.execute(f"SELECT template FROM {GENERATED_TEMPLATES_TABLE_NAME} WHERE guid = ? AND page_path = ? ORDER BY created_at DESC LIMIT 1", (guid, page_path))
+    template_row = cursor.fetchone()
+    if not template_row and referring_page:
+        cursor.execute(f"SELECT template FROM {GENERATED_TEMPLATES_TABLE_NAME} WHERE guid = ? AND page_path = ? ORDER BY created_at DESC LIMIT 1", (guid, referring_page))
+        cursor.fetchone()
+    conn.close()
+    return settings_row
+
+
+async def timed(label, calls, fn):
+    start = time.perf_counter()
+    for guid, page in calls:
+        await fn(guid, page)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28}: {len(calls) / elapsed:10.0f} gets/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    db_path = f"{DATA_DIR}/app.db"
+    client = SettingsDBClient(db_path)
+    await client.initialize_db()
+    template = "<div>" + "x" * 4000 + "</div>"
+    for i in range(args.apps):
+        for page in PAGES:
+            await client.update(f"app-{i}", "an app", "prompt", "instructions", page, template)
+
+    rng = random.Random(0)
+    calls = [(f"app-{rng.randrange(args.apps)}", rng.choice(PAGES + ["/new"])) for _ in range(args.calls)]
+
+    async def legacy(guid, page):
+        legacy_get(db_path, guid, page, "/")
+
+    async def uncached(guid, page):
+        client.cache.clear()
+        await client.get(guid, page, "/")
+
+    async def cached(guid, page):
+        await client.get(guid, page, "/")
+
+    await timed("legacy (connect per call)", calls, legacy)
+    await timed("persistent, no cache", calls, uncached)
+    await timed("persistent + cache", calls, cached)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
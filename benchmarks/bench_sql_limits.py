@@ -0,0 +1,96 @@
+"""Run runaway LLM-style queries against a large tenant with and without the statement limits.
+
+Compares the unbounded cursor.execute().fetchall() the client used to run
+with SqlClient.execute_commands under SQL_QUERY_TIMEOUT_SECONDS,
+SQL_MAX_ROWS and SQL_MAX_RESULT_BYTES: wall time, peak Python memory
+while fetching, and the rows returned.
+
+    python benchmarks/bench_sql_limits.py --rows 300000 --timeout 1
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-bench-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["QUERY_CACHE_MAX_BYTES"] = "0"
+os.environ["INDEX_ADVISOR"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.sql_client import QueryTimeout, SqlClient  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+from app.utils.metrics import sql_aborted  # noqa: E402
+
+QUERIES = {
+    "no LIMIT": "SELECT * FROM items",
+    "wide rows": "SELECT id, title || printf('%.500c', '-') FROM items",
+    "cartesian": "SELECT a.id, b.id FROM items a, items b WHERE a.title < b.title ORDER BY a.title LIMIT 10",
+}
+
+
+def seed(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT, status TEXT)")
+    conn.executemany("INSERT INTO items (title, status) VALUES (?, ?)",
+                     ((f"Item {i}", ("new", "active", "done")[i % 3]) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def measure(fn) -> tuple[float, int, str]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        outcome = f"{len(fn())} rows"
+    except QueryTimeout:
+        outcome = "timed out"
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, outcome
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--max-rows", type=int, default=5000)
+    parser.add_argument("--unbounded-timeout", type=float, default=10.0,
+                        help="give up on the unbounded cartesian query after this many seconds")
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    path = os.path.join(DATA_DIR, "large.db")
+    seed(path, args.rows)
+    raw = sqlite3.connect(path)
+    client = SqlClient(path, timeout=args.timeout, max_rows=args.max_rows)
+
+    print(f"{args.rows} rows, timeout {args.timeout}s, max {args.max_rows} rows")
+    for label, query in QUERIES.items():
+        def unbounded():
+            # The old path has no limit at all; interrupt it here so the benchmark finishes
+            deadline = time.monotonic() + args.unbounded_timeout
+            raw.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+            try:
+                return raw.execute(query).fetchall()
+            except sqlite3.OperationalError:
+                raise QueryTimeout()
+
+        def bounded():
+            return client.execute_commands([{"name": "q", "query": query}])["q"]
+
+        for mode, fn in (("fetchall", unbounded), ("limited", bounded)):
+            elapsed, peak, outcome = measure(fn)
+            print(f"{label:>10} {mode:>9}: {elapsed * 1000:>7.0f}ms, peak {peak / 1e6:>7.1f}MB, {outcome}")
+
+    aborted = {reason: sql_aborted.get(tenant=client.tenant, reason=reason) for reason in ("timeout", "rows", "bytes")}
+    print("aborted:", aborted)
+
+
+if __name__ == "__main__":
+    main()
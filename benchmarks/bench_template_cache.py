@@ -0,0 +1,71 @@
+"""Compare render latency of an LLM-style template with and without TemplateCache.
+
+    python benchmarks/bench_template_cache.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment  # noqa: E402
+
+from app.utils.template_cache import TemplateCache  # noqa: E402
+
+ROW = """
+    <tr class="hover:bg-gray-50">
+        <td class="px-4 py-2">{{ row[0] }}</td>
+        <td class="px-4 py-2"><a href="/app/items/{{ row[0] }}" hx-get="/app/items/{{ row[0] }}">{{ row[1] | e }}</a></td>
+        <td class="px-4 py-2">{% if row[2] > 10 %}<span class="badge">hot</span>{% else %}{{ row[2] }}{% endif %}</td>
+    </tr>"""
+
+TEMPLATE = (
+    "<header class='p-4'><h1>{{ path }}</h1><nav>"
+    + "".join(f"<a href='/app/section{i}'>Section {i}</a>" for i in range(20))
+    + "</nav></header>"
+    + "".join(
+        f"<section id='s{i}'><table>{{% for row in results['q{i}'] %}}{ROW}{{% endfor %}}</table></section>"
+        for i in range(8)
+    )
+    + "<footer>{% for i in range(5) %}<p>{{ i }}</p>{% endfor %}</footer>"
+)
+
+CONTEXT = {
+    "path": "/dashboard",
+    "results": {f"q{i}": [(n, f"item {n}", n % 20) for n in range(10)] for i in range(8)},
+}
+
+
+def bench(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:>32}: {per_call:8.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    env = Environment(autoescape=True)
+    cache = TemplateCache(env)
+
+    bench("from_string + render", lambda: env.from_string(TEMPLATE).render(**CONTEXT), args.iterations)
+    bench("TemplateCache.get + render", lambda: cache.get(TEMPLATE).render(**CONTEXT), args.iterations)
+    print(f"{'memory cache':>32}: {cache.stats()}")
+
+    # A fresh process with a warm bytecode directory skips parsing and compiling
+    with tempfile.TemporaryDirectory() as bytecode_dir:
+        TemplateCache(env, bytecode_cache_dir=bytecode_dir).get(TEMPLATE)
+        iterations = max(args.iterations // 10, 1)
+        bench("cold compile", lambda: TemplateCache(env).get(TEMPLATE), iterations)
+        bench("cold load from bytecode cache",
+              lambda: TemplateCache(env, bytecode_cache_dir=bytecode_dir).get(TEMPLATE), iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Check how the stylesheet bundle handles classes it lacks.
+
+Builds a small library of Tailwind-style rules and gives the bundle page
+templates using plain utilities, variants it generates, arbitrary values
+and variants it doesn't know. Only the pages with classes it can't
+generate may be sent to the CDN compiler; words in text or Jinja
+expressions must not be mistaken for classes.
+
+Then two servers, each with its own copy of the built static directory,
+serve a page using classes the built bundle lacks. Both must keep linking
+the built bundle and inline the rest, unless the directory is shared.
+
+    python benchmarks/check_asset_classes.py
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+os.environ.setdefault("LOG_FILE", os.devnull)
+os.environ.setdefault("SQLITE_DB_PATH", tempfile.mkdtemp(prefix="autoapp-assets-") + "/")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.assets.bundle import BUNDLE_NAME, LIBRARY_NAME, MANIFEST_FILE, AssetBundle, write_hashed  # noqa: E402
+from app.assets.css import StyleLibrary, serialize  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+LIBRARY = (".hidden{display:none}.block{display:block}.w-64{width:16rem}.p-4{padding:1rem}"
+           ".bg-white{background-color:#fff}.text-sm{font-size:.875rem}.btn{padding:.5rem 1rem}")
+PAGES = {
+    '<div class="p-4 bg-white md:hover:block !w-64">{{ results["items"][0] }} Note: row[1]</div>': False,
+    '<a class="btn dark:bg-white group-hover:text-sm" href="/{{ guid }}/x">http://example.com</a>': False,
+    '<div class="w-[300px] p-4"></div>': True,
+    '<div class="md:bg-[#1da1f2]"></div>': True,
+    '<div class="[mask-type:alpha]"></div>': True,
+    '<div class="max-md:hidden"></div>': True,
+    '<div class="print:hidden"></div>': True,
+    '<div class="aria-expanded:block data-[open]:block"></div>': True,
+    '<div class="motion-safe:block"></div>': True,
+}
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+def static_dir() -> str:
+    """A built static directory whose bundle has the classes of the first page"""
+    directory = tempfile.mkdtemp(prefix="autoapp-static-")
+    classes = ["p-4", "bg-white"]
+    files = {LIBRARY_NAME: write_hashed(directory, LIBRARY_NAME, LIBRARY.encode()),
+             BUNDLE_NAME: write_hashed(directory, BUNDLE_NAME,
+                                       serialize(StyleLibrary(LIBRARY).select(set(classes))).encode())}
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump({"files": files, "classes": classes}, f)
+    return directory
+
+
+async def servers(shared: bool):
+    """Two servers with their own copy of the static directory, or sharing one"""
+    await settings_db_client.initialize_db()
+    first = static_dir()
+    second = first if shared else shutil.copytree(first, first + "-copy")
+    bundles = [AssetBundle(static_dir=directory, rebuild=shared) for directory in (first, second)]
+    page = '<div class="p-4 block text-sm"></div>'
+    for bundle in bundles:
+        await bundle.start()
+        check(".block{" in bundle.missing_css(page), f"shared={shared}: the classes the bundle lacks are inlined")
+    if shared:
+        await bundles[0].rebuild()
+    for bundle in bundles:
+        await bundle.stop()
+    linked = bundles[0].files[BUNDLE_NAME]
+    check(os.path.exists(os.path.join(second, linked)),
+          f"shared={shared}: the bundle the first server links exists on the second ({linked})")
+    check((linked == bundles[0].built_bundle) != shared,
+          f"shared={shared}: the bundle is {'rebuilt' if shared else 'not rebuilt'}")
+
+
+def main():
+    bundle = AssetBundle(static_dir=tempfile.mkdtemp(prefix="autoapp-static-"))
+    bundle.library = StyleLibrary(LIBRARY)
+    for template, expected in PAGES.items():
+        check(bundle.needs_tailwind(template) == expected,
+              f"{'loads' if expected else 'does not load'} Tailwind's CDN: {template}")
+    check(bundle.stats()["tailwind_cdn_pages"] == sum(PAGES.values()), "the pages sent to the CDN are counted")
+    check(not AssetBundle().needs_tailwind(next(iter(PAGES))), "without a build the shell loads the CDNs anyway")
+
+    asyncio.run(servers(shared=False))
+    asyncio.run(servers(shared=True))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
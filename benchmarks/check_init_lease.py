@@ -0,0 +1,148 @@
+"""Check that only one worker process initializes a new app.
+
+Several processes share one settings DB and tenant directory, like uvicorn
+workers, and all keep requesting the same new app until it serves a page.
+Every LLM call is counted per process. The check passes if exactly one
+process ran the design and seeding calls. A second scenario kills the
+lease holder mid-initialization and checks that another worker takes over
+once the lease expires.
+
+    python benchmarks/check_init_lease.py --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUTOAPP_CHECK_DIR", tempfile.mkdtemp(prefix="autoapp-lease-"))
+DATA_DIR = os.environ["AUTOAPP_CHECK_DIR"]
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ.setdefault("LLM_DESIGN_PROVIDER", "ollama")
+os.environ["STREAM_PAGES"] = "false"
+os.environ["INIT_LEASE_SECONDS"] = "1"
+os.environ["INIT_POLL_SECONDS"] = "0.1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED = json.dumps({"commands": [
+    {"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)"},
+    {"name": "seed", "query": "INSERT INTO items (title) VALUES ('first')"},
+]})
+PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "{% for row in results['items'] %}<p>{{ row[1] }}</p>{% endfor %}",
+})
+
+
+def worker(guid: str, latency: float, start_at: float, results):
+    import httpx
+
+    from app.llm.client import llm_client
+    from app.llm.providers import LLMProvider
+    from app.main import app
+    from app.utils.logger import logger
+
+    logger.setLevel(logging.WARNING)
+    counts = {"design": 0, "seed": 0, "page": 0}
+
+    class CountingProvider(LLMProvider):
+        name = "counting"
+
+        async def _get_response(self, user, system, *, strong_model):
+            counts["seed" if system is None else "page"] += 1
+            await asyncio.sleep(latency)
+            return SEED if system is None else PAGE
+
+        async def _get_design_response(self, user, system):
+            counts["design"] += 1
+            await asyncio.sleep(latency)
+            return "A punched up design"
+
+    llm_client.provider = llm_client.design_provider = CountingProvider(max_concurrency=4)
+
+    async def browse():
+        time.sleep(max(start_at - time.time(), 0))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            while True:
+                response = await client.get(f"/{guid}/")
+                if "init-progress" not in response.text:
+                    return "first" in response.text
+                await asyncio.sleep(0.1)
+
+    served = asyncio.run(browse())
+    results.put((os.getpid(), served, counts))
+
+
+def create_app(guid: str):
+    from app.config.settings import settings
+    from app.db.settings_db_client import settings_db_client
+
+    async def create():
+        await settings_db_client.initialize_db()
+        await settings_db_client.update(guid, "a todo list", settings.RESPONSE_PROMPT, "", "/")
+        await settings_db_client.create_init_state(guid)
+        await settings_db_client.close()
+
+    asyncio.run(create())
+
+
+def collect(results, n: int) -> list:
+    return [results.get(timeout=60) for _ in range(n)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    ctx = multiprocessing.get_context("spawn")
+    checks = []
+
+    # All workers race for the same new app
+    create_app("race-app")
+    results = ctx.Queue()
+    start_at = time.time() + 3
+    processes = [ctx.Process(target=worker, args=("race-app", args.latency, start_at, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    outcomes = collect(results, args.workers)
+    for process in processes:
+        process.join()
+    initializers = [counts for _, _, counts in outcomes if counts["design"] or counts["seed"]]
+    for pid, served, counts in outcomes:
+        print(f"race: pid {pid} served={served} llm calls={counts}")
+    checks.append(("every worker served the app", all(served for _, served, _ in outcomes)))
+    checks.append(("exactly one worker initialized it", len(initializers) == 1))
+    checks.append(("it made 2 design calls and 1 seed call",
+                   initializers == [{"design": 2, "seed": 1, "page": initializers[0]["page"]}] if initializers else False))
+
+    # The lease holder dies; another worker takes over once the lease expires
+    create_app("takeover-app")
+    results = ctx.Queue()
+    doomed = ctx.Process(target=worker, args=("takeover-app", 30.0, time.time(), results))
+    doomed.start()
+    time.sleep(4)  # Let it import the app and claim the lease
+    doomed.kill()
+    doomed.join()
+    survivor = ctx.Process(target=worker, args=("takeover-app", args.latency, time.time(), results))
+    survivor.start()
+    (pid, served, counts), = collect(results, 1)
+    survivor.join()
+    print(f"takeover: pid {pid} served={served} llm calls={counts}")
+    checks.append(("a surviving worker took over an abandoned initialization", served and counts["seed"] == 1))
+
+    for label, ok in checks:
+        print(f"{'PASS' if ok else 'FAIL'}: {label}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
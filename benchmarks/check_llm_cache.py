@@ -0,0 +1,115 @@
+"""Check that the LLM response cache never replays a reply that failed.
+
+A scripted provider answers with a bad reply first and a good one after.
+Seeding three apps of the same type must call the LLM twice: the seed data
+whose SQL fails is not reused by the second app, and the good one is reused
+by the third. Page requests, buffered and streamed, must ask the LLM again
+after a reply that did not parse or whose SQL failed.
+
+    python benchmarks/check_llm_cache.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-llm-cache-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["LLM_CACHE_MODE"] = "readwrite"
+os.environ["LLM_CACHE_PATH"] = os.path.join(DATA_DIR, "llm_cache.db")
+os.environ["LOG_FILE"] = os.path.join(DATA_DIR, "app.log")
+os.environ["LLM_CAPTURE_FILE"] = os.path.join(DATA_DIR, "capture.jsonl")
+os.environ["REPLAY_PAGES"] = "false"  # every request goes to the LLM or its cache
+os.environ.setdefault("DEV_MODE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import INIT_READY, settings_db_client  # noqa: E402
+from app.db.tenant_db import tenant_db_manager  # noqa: E402
+from app.llm.app_init import AppInitializer  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.CRITICAL)
+
+BAD_SEED = json.dumps({"commands": [{"name": "seed", "query": "INSERT INTO missing (title) VALUES ('x')"}]})
+GOOD_SEED = json.dumps({"commands": [
+    {"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)"},
+    {"name": "seed", "query": "INSERT INTO items (title) VALUES ('first')"},
+]})
+UNPARSEABLE_PAGE = "Sorry, I can't help with that."
+BAD_SQL_PAGE = json.dumps({"commands": [{"name": "items", "query": "SELECT * FROM missing"}], "template": "<p>x</p>"})
+GOOD_PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "{% for row in results['items'] %}<p>{{ row[1] }}</p>{% endfor %}",
+})
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+class ScriptedProvider(LLMProvider):
+    """Answers seed prompts and page prompts from their own lists, repeating the last reply"""
+    name = "scripted"
+
+    def __init__(self):
+        super().__init__(max_concurrency=4)
+        self.seeds: list[str] = []
+        self.pages: list[str] = []
+        self.calls = {"seed": 0, "page": 0}
+
+    async def _get_response(self, user, system, *, strong_model):
+        kind, replies = ("seed", self.seeds) if system is None else ("page", self.pages)
+        self.calls[kind] += 1
+        return replies.pop(0) if len(replies) > 1 else replies[0]
+
+
+async def seed(provider: ScriptedProvider, guid: str) -> bool:
+    db_client = await tenant_db_manager.open(guid)
+    try:
+        await AppInitializer(db_client, "a todo list").initialize_database()
+    except Exception:
+        return False
+    return True
+
+
+async def main():
+    provider = llm_client.provider = ScriptedProvider()
+    await settings_db_client.initialize_db()
+
+    provider.seeds = [BAD_SEED, GOOD_SEED]
+    outcomes = [await seed(provider, guid) for guid in ("app-a", "app-b", "app-c")]
+    check(outcomes == [False, True, True], f"the first seed failed, the others succeeded ({outcomes})")
+    check(provider.calls["seed"] == 2,
+          f"the failed seed data was not reused and the good one was ({provider.calls['seed']} LLM calls for 3 apps)")
+
+    guid = "app-c"
+    await settings_db_client.update(guid, "a todo list", settings.RESPONSE_PROMPT, "", "/")
+    await settings_db_client.create_init_state(guid, INIT_READY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        for streaming, page in ((False, "/items"), (True, "/streamed")):
+            settings.STREAM_PAGES = streaming
+            provider.pages = [UNPARSEABLE_PAGE, BAD_SQL_PAGE, GOOD_PAGE]
+            calls = provider.calls["page"]
+            served = [("first" in (await client.get(f"/{guid}{page}")).text) for _ in range(3)]
+            made = provider.calls["page"] - calls
+            check(served == [False, False, True] and made == 3,
+                  f"STREAM_PAGES={streaming}: each failed page reply was asked for again ({made} LLM calls, served={served})")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
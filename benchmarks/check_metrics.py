@@ -0,0 +1,121 @@
+"""Drive a new app through initialization, pages, HTMX fragments and a POST, then check /metrics.
+
+The provider sleeps briefly and reports token usage like a real one. The
+script prints the metric families it finds and exits nonzero if an expected
+series is missing, the exposition is malformed, /metrics answers without the
+token, or an app guid appears in it.
+
+    python benchmarks/check_metrics.py
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-metrics-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ.setdefault("LLM_DESIGN_PROVIDER", "ollama")
+os.environ["REPLAY_PAGES"] = "false"  # every request generates, so every kind reaches the LLM
+os.environ["METRICS_TOKEN"] = "secret"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.providers import LLMProvider, TokenUsage  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.metrics import tenant_hash  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+GUID = "metrics-app"
+SEED = json.dumps({"commands": [
+    {"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)"},
+    {"name": "seed", "query": "INSERT INTO items (title) VALUES ('first')"},
+]})
+PAGE = json.dumps({
+    "commands": [{"name": "items", "query": "SELECT id, title FROM items"}],
+    "template": "{% for row in results['items'] %}<p>{{ row[1] }}</p>{% endfor %}",
+})
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+                       r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+EXPECTED = [
+    'autoapp_llm_request_seconds_count{provider="fake",model="fake-page",kind="page"}',
+    'autoapp_llm_request_seconds_count{provider="fake",model="fake-page",kind="htmx"}',
+    'autoapp_llm_request_seconds_count{provider="fake",model="fake-design",kind="design"}',
+    'autoapp_llm_request_seconds_count{provider="fake",model="fake-page",kind="init"}',
+    'autoapp_llm_first_chunk_seconds_count{provider="fake",model="fake-page",kind="page"}',
+    'autoapp_llm_tokens_total{provider="fake",model="fake-page",kind="page",type="cached_input"}',
+    'autoapp_llm_tokens_total{provider="fake",model="fake-design",kind="design",type="output"}',
+    'autoapp_llm_json_responses_total{kind="page",outcome="parsed"}',
+    'autoapp_llm_json_responses_total{kind="init",outcome="parsed"}',
+    f'autoapp_sql_execute_seconds_count{{tenant="{tenant_hash(GUID)}",kind="page"}}',
+    f'autoapp_sql_execute_seconds_count{{tenant="{tenant_hash(GUID)}",kind="htmx"}}',
+    'autoapp_template_render_seconds_count{kind="page"}',
+    'autoapp_template_render_seconds_count{kind="htmx"}',
+    'autoapp_init_seconds_count{outcome="ready"}',
+    'autoapp_init_stage_seconds_count{stage="seed"}',
+    'autoapp_template_cache{stat="hits"}',
+    'autoapp_page_flights{stat="leaders"}',
+]
+
+
+class FakeProvider(LLMProvider):
+    name = "fake"
+
+    def model(self, *, strong_model=False, design=False):
+        return "fake-design" if design else "fake-page"
+
+    async def _get_response(self, user, system, *, strong_model):
+        await asyncio.sleep(0.01)
+        self.record_usage(self.model(), TokenUsage(input_tokens=100, cached_input_tokens=900, output_tokens=50))
+        return SEED if system is None else PAGE
+
+    async def _get_design_response(self, user, system):
+        await asyncio.sleep(0.01)
+        self.record_usage(self.model(design=True), TokenUsage(input_tokens=200, output_tokens=400))
+        return "A punched up design"
+
+
+async def main():
+    llm_client.provider = llm_client.design_provider = FakeProvider(max_concurrency=8)
+    await settings_db_client.initialize_db()
+    await settings_db_client.update(GUID, "a todo list", settings.RESPONSE_PROMPT, "", "/")
+    await settings_db_client.create_init_state(GUID)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        assert "init-progress" in (await client.get(f"/{GUID}/")).text
+        await client.get(f"/_init/{GUID}/events")
+        for _ in range(3):
+            assert "first" in (await client.get(f"/{GUID}/")).text
+            assert "first" in (await client.get(f"/{GUID}/list", headers={"HX-Request": "true"})).text
+        assert (await client.post(f"/{GUID}/items", data={"title": "x"})).status_code == 200
+        anonymous = await client.get("/metrics")
+        response = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    malformed = [line for line in text.splitlines() if not line.startswith("#") and not SAMPLE_RE.match(line)]
+    missing = [series for series in EXPECTED if f"\n{series} " not in "\n" + text]
+    for line in text.splitlines():
+        if line.startswith("# HELP"):
+            print(line[7:])
+    print(f"{len(text.splitlines())} lines, {len(malformed)} malformed, {len(missing)} expected series missing")
+    for line in malformed + missing:
+        print("  " + line)
+    leaks = [line for line in text.splitlines() if GUID in line]
+    print(f"/metrics without the token: {anonymous.status_code}, {len(leaks)} lines with the app guid")
+    sys.exit(1 if malformed or missing or leaks or anonymous.status_code != 401 else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""Check that the page instructions survive a tight prompt token budget.
+
+Formats the prompt for a large schema, a long previous template and long
+page instructions at budgets from generous to far too small. The check
+passes if the page instructions are always in the prompt, truncated at
+most, and the schema was compacted before they were truncated.
+
+    python benchmarks/check_prompt_budget.py
+"""
+import logging
+import os
+import sys
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LOG_FILE", os.devnull)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_prompt_budget import page_template, schema  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+INSTRUCTIONS = "Show overdue tasks first and colour them red. " + "Group the rest by owner, newest first. " * 60
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+def main():
+    logger.setLevel(logging.CRITICAL)
+    app_settings = {
+        "guid": "check-app", "application_type": "A task tracker for small teams",
+        "prompt_template": settings.RESPONSE_PROMPT, "page_instructions": INSTRUCTIONS,
+        "generated_template": page_template(60),
+    }
+    data_model = schema(80)
+    row_counts = {f"table_{i}": i * 137 for i in range(80)}
+    full = llm_client.format_prompt(data_model, app_settings, row_counts)
+
+    for budget in (12000, 4000, 2500, 1500, 500):
+        settings.PROMPT_TOKEN_BUDGET = budget
+        prompt = llm_client.format_prompt(data_model, app_settings, row_counts)
+        check("Show overdue tasks first" in prompt.suffix, f"budget {budget}: the page instructions are in the prompt")
+        if INSTRUCTIONS.strip() not in prompt.suffix:
+            check("owner_id INTEGER" not in prompt.prefix,
+                  f"budget {budget}: the schema was compacted before the instructions were truncated")
+    check(INSTRUCTIONS.strip() in full.suffix and "owner_id INTEGER" in full.prefix,
+          "without a budget both are in full")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Check that the system prompt prefix is byte-identical across requests to the same app.
+
+A local provider records every system prompt instead of calling an LLM.
+The script drives a mix of page views, HTMX fragments, writes and
+page-instruction changes through catch_all, then compares the prefixes.
+
+    python benchmarks/check_prompt_prefix.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-prefix-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["REPLAY_PAGES"] = "false"
+os.environ.setdefault("LLM_PROVIDER", "ollama")
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.llm.client import llm_client  # noqa: E402
+from app.llm.prompt import SystemPrompt  # noqa: E402
+from app.llm.providers import LLMProvider  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+
+class RecordingProvider(LLMProvider):
+    name = "recording"
+
+    def __init__(self):
+        super().__init__(max_concurrency=8)
+        self.prompts = []
+
+    async def _get_response(self, user, system, *, strong_model):
+        self.prompts.append((user, system))
+        if user.startswith("POST"):
+            commands = [{"name": "add", "query": "INSERT INTO items (title) VALUES ('new')"}]
+        else:
+            commands = [{"name": "rows", "query": "SELECT id, title FROM items"}]
+        return json.dumps({
+            "commands": commands,
+            "template": f"<h1>{user.splitlines()[0]}</h1>{{% for row in results['rows'] or [] %}}<p>{{{{ row[1] }}}}</p>{{% endfor %}}",
+            "CSS": "",
+            "Javascript": "",
+        })
+
+
+async def create_app(guid: str, description: str):
+    await settings_db_client.update(guid, description, settings.RESPONSE_PROMPT, "", "/")
+    conn = sqlite3.connect(f"{DATA_DIR}/{guid}.db")
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO items (title) VALUES (?)", [("a",), ("b",)])
+    conn.commit()
+    conn.close()
+
+
+async def main() -> int:
+    provider = RecordingProvider()
+    llm_client.provider = provider
+    await settings_db_client.initialize_db()
+    await create_app("app-a", "A todo list")
+    await create_app("app-b", "A recipe book")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        await client.get("/app-a/")
+        await client.get("/app-a/items", headers={"referer": "http://check/app-a/"})
+        await client.get("/app-a/items", headers={"HX-Request": "true"})
+        await client.post("/app-a/items", data={"title": "new"})
+        await client.post("/update_settings", data={
+            "application_type": "A todo list", "page_instructions": "Show a calendar", "path": "/app-a/calendar",
+        })
+        await client.get("/app-a/calendar")
+        await client.get("/app-a/")
+        await client.get("/app-b/")
+
+    prefixes_a = {system.prefix for user, system in provider.prompts[:-1]}
+    suffixes_a = {system.suffix for user, system in provider.prompts[:-1]}
+    prefix_b = provider.prompts[-1][1].prefix
+
+    checks = [
+        ("every call received a SystemPrompt", all(isinstance(s, SystemPrompt) for _, s in provider.prompts)),
+        (f"app-a prefix identical across {len(provider.prompts) - 1} requests", len(prefixes_a) == 1),
+        ("app-a suffix varies with page state", len(suffixes_a) > 1),
+        ("app-b prefix differs from app-a", prefix_b not in prefixes_a),
+    ]
+    for label, ok in checks:
+        print(f"{'PASS' if ok else 'FAIL'}: {label}")
+    if prefixes_a:
+        print(f"prefix size: {len(next(iter(prefixes_a)))} chars")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
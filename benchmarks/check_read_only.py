@@ -0,0 +1,74 @@
+"""Check that reads written in any case, or with a WITH clause, return their rows.
+
+Runs lowercase, mixed-case and WITH ... SELECT queries through
+execute_commands and execute_batch, and checks that they return rows and
+are served from the query cache, while WITH clauses leading into writes
+still run as commands.
+
+    python benchmarks/check_read_only.py
+"""
+import logging
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-read-only-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LOG_FILE", os.devnull)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.sql_client import SqlClient, is_read_only  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+from app.utils.metrics import request_kind, sql_cache_lookups  # noqa: E402
+
+logger.setLevel(logging.CRITICAL)
+
+READS = [
+    "select id, title from items",
+    "  Select id, title From items",
+    "WITH recent AS (SELECT id, title FROM items ORDER BY id DESC) SELECT * FROM recent",
+    "with recent as (select id, title from items) select * from recent",
+]
+WRITES = [
+    "WITH old AS (SELECT id FROM items WHERE id = 1) DELETE FROM items WHERE id IN (SELECT id FROM old)",
+    "with x as (select 'new' as title) insert into items (title) select title from x",
+    "update items set title = 'select'",
+]
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+def hits() -> float:
+    return sql_cache_lookups.get(kind=request_kind.get(), result="hit")
+
+
+def main():
+    client = SqlClient(os.path.join(DATA_DIR, "tenant.db"))
+    client.execute_batch([
+        {"name": "create", "query": "CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)"},
+        {"name": "seed", "query": "INSERT INTO items (title) VALUES ('first'), ('second')"},
+    ])
+    for query in READS:
+        check(is_read_only(query), f"read only: {query}")
+        batch = client.execute_batch([{"name": "rows", "query": query}])["rows"]
+        first = client.execute_commands([{"name": "rows", "query": query}])["rows"]
+        before = hits()
+        again = client.execute_commands([{"name": "rows", "query": query}])["rows"]
+        check(len(batch) == len(first) == len(again) == 2 and hits() == before + 1,
+              "it returns its rows from both paths, then from the query cache")
+    for query in WRITES:
+        check(not is_read_only(query), f"a write: {query}")
+        result = client.execute_commands([{"name": "write", "query": query}])["write"]
+        check(result == "Command executed", "it runs as a command")
+    client.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
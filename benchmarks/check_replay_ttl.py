@@ -0,0 +1,95 @@
+"""Check that regenerating a page keeps its Page Cache Lifetime, through the ASGI app with the fake LLM provider.
+
+Sets a replay TTL on a page through /update_settings, which also drops the
+stored page, then regenerates it with streaming on and off. The check passes
+if the TTL survives both regenerations and another app's settings for the
+same path, and clearing the field resets it.
+
+    python benchmarks/check_replay_ttl.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-ttl-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_LATENCY"] = "fixed:0"
+os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = "100000"
+os.environ["LLM_CACHE_MODE"] = "off"
+os.environ["LOG_FILE"] = os.path.join(DATA_DIR, "app.log")
+os.environ["LLM_CAPTURE_FILE"] = os.path.join(DATA_DIR, "capture.jsonl")
+os.environ["REPLAY_PAGES"] = "true"
+os.environ.setdefault("DEV_MODE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+async def create_app(client: httpx.AsyncClient) -> str:
+    response = await client.post("/", data={"application_type": "a task tracker"})
+    guid = response.headers["location"].strip("/")
+    first = await client.get(f"/{guid}/")
+    if "init-progress" in first.text:
+        await client.get(f"/_init/{guid}/events")
+    return guid
+
+
+async def set_ttl(client: httpx.AsyncClient, guid: str, page: str, replay_ttl: str):
+    settings_data = await settings_db_client.get(guid, page)
+    response = await client.post("/update_settings", data={
+        "application_type": settings_data["application_type"], "page_instructions": "show overdue items first",
+        "path": f"/{guid}{page}", "replay_ttl": replay_ttl,
+    })
+    check(response.status_code == 303, f"/update_settings accepted replay_ttl={replay_ttl!r}")
+
+
+async def replay_ttl(guid: str, page: str) -> int | None:
+    return (await settings_db_client.get(guid, page))["replay_ttl"]
+
+
+async def main():
+    await settings_db_client.initialize_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        guid, other = await create_app(client), await create_app(client)
+        await set_ttl(client, guid, "/reports", "5")
+        check(await replay_ttl(guid, "/reports") == 5, "the TTL is stored")
+
+        for streaming in (True, False):
+            settings.STREAM_PAGES = streaming
+            await settings_db_client.clear_page(guid, "/reports")
+            (await client.get(f"/{guid}/reports")).raise_for_status()
+            ttl = await replay_ttl(guid, "/reports")
+            check(ttl == 5, f"regenerating with STREAM_PAGES={streaming} kept it ({ttl})")
+
+        await set_ttl(client, other, "/reports", "60")
+        (await client.get(f"/{other}/reports")).raise_for_status()
+        ttl = await replay_ttl(guid, "/reports")
+        check(ttl == 5, f"another app's settings for the same path left it alone ({ttl})")
+
+        await set_ttl(client, guid, "/reports", "")
+        ttl = await replay_ttl(guid, "/reports")
+        check(ttl is None, f"clearing the field resets it to the default ({ttl})")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
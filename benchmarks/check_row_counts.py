@@ -0,0 +1,63 @@
+"""Check that the tenant row counts for the prompt are capped and time limited.
+
+Fills a table well past SQL_ROW_COUNT_LIMIT, then checks that its count
+stops at the limit and reads as "N+ rows" in the schema, that a small table
+keeps its exact count, and that a count running past the query time limit
+is stopped instead of holding the tenant's connection.
+
+    python benchmarks/check_row_counts.py
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-counts-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["SQL_ROW_COUNT_LIMIT"] = "1000"
+os.environ.setdefault("LOG_FILE", os.devnull)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.settings import settings  # noqa: E402
+from app.db.sql_client import SqlClient  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.CRITICAL)
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+def main():
+    client = SqlClient(os.path.join(DATA_DIR, "tenant.db"))
+    client.execute_batch([
+        {"name": "big", "query": "CREATE TABLE big (id INTEGER PRIMARY KEY, title TEXT)"},
+        {"name": "small", "query": "CREATE TABLE small (id INTEGER PRIMARY KEY)"},
+        {"name": "fill", "query": "INSERT INTO big (title) SELECT hex(randomblob(32)) FROM (WITH RECURSIVE n(i) AS "
+                                  "(SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 500000) SELECT i FROM n)"},
+        {"name": "few", "query": "INSERT INTO small (id) VALUES (1), (2), (3)"},
+    ])
+    counts = client.get_row_counts()
+    check(counts == {"big": 1000, "small": 3}, f"the large table's count stops at the limit ({counts})")
+    schema = client.get_schema()
+    check("-- 1000+ rows" in schema and "-- 3 rows" in schema, "the schema marks the capped count")
+
+    # Counting every row of the large table takes far more than a microsecond
+    settings.SQL_ROW_COUNT_LIMIT, client.timeout = 10 ** 9, 0.000001
+    client.execute_commands([{"name": "more", "query": "INSERT INTO small (id) VALUES (4)"}])
+    start = time.perf_counter()
+    counts = client.get_row_counts()
+    seconds = time.perf_counter() - start
+    check(counts == {} and seconds < 0.5, f"counting past the time limit is stopped ({counts}, {seconds * 1000:.1f}ms)")
+    client.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Check that a worker's settings cache sees writes made by another worker.
+
+Two SettingsDBClient instances share one app.db, like two uvicorn workers.
+The reader caches an app's settings, then the writer finishes its
+initialization (design, template) and later changes its page instructions.
+The check passes if the reader returns the new values each time without
+being told about the writes.
+
+    python benchmarks/check_settings_cache.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-settings-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ.setdefault("LOG_FILE", os.devnull)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.settings_db_client import SettingsDBClient  # noqa: E402
+
+DB_PATH = os.path.join(DATA_DIR, "app.db")
+GUID = "shared-app"
+
+
+async def run() -> list[tuple[str, bool]]:
+    writer, reader = SettingsDBClient(DB_PATH), SettingsDBClient(DB_PATH)
+    await writer.initialize_db()
+    await writer.update(GUID, "a todo list", "prompt", "", "/")
+
+    before = await reader.get(GUID, "/")
+    cached = await reader.get(GUID, "/")
+    checks = [("the reader caches the pre-init settings", before == cached and GUID in reader.cache)]
+
+    # The init pipeline in the other worker stores the design and the first template
+    await writer.update(GUID, "a todo list, punched up", "prompt", "", "/", "<p>{{ title }}</p>")
+    after_init = await reader.get(GUID, "/")
+    checks.append(("the reader sees the other worker's init",
+                   after_init["application_type"] == "a todo list, punched up"
+                   and after_init["generated_template"] == "<p>{{ title }}</p>"))
+
+    await writer.update(GUID, "a todo list, punched up", "prompt", "show overdue items first", "/")
+    after_update = await reader.get(GUID, "/")
+    checks.append(("the reader sees the other worker's page instructions",
+                   after_update["page_instructions"] == "show overdue items first"))
+
+    again = await reader.get(GUID, "/")
+    checks.append(("unchanged settings are served from the cache again", again == after_update and GUID in reader.cache))
+
+    await writer.close()
+    await reader.close()
+    return checks
+
+
+def main() -> int:
+    checks = asyncio.run(run())
+    for label, ok in checks:
+        print(f"{'PASS' if ok else 'FAIL'}: {label}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Archive idle tenants and restore them on their next request, through the ASGI app with the fake LLM provider.
+
+Creates a few apps, grows one tenant's data, generates and stores a page for
+each, then marks them idle and runs the archive sweep. Checks that the
+databases left the volume with their stored pages, that concurrent requests
+restore a tenant once and replay its stored page without the LLM, that its
+data survived, and that /_admin/storage reports both tiers. Finally a tenant
+is archived under a request that already holds its client and under another
+worker's open connection; both must fail rather than write to an empty or
+deleted database.
+
+    python benchmarks/check_tenant_archive.py --rows 50000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from functools import partial
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--apps", type=int, default=3)
+parser.add_argument("--rows", type=int, default=50000, help="extra rows added to the first tenant")
+args = parser.parse_args()
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-archive-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_LATENCY"] = "fixed:0"
+os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = "100000"
+os.environ["LLM_CACHE_MODE"] = "off"  # every LLM call reaches the provider
+os.environ["LOG_FILE"] = os.path.join(DATA_DIR, "app.log")
+os.environ["LLM_CAPTURE_FILE"] = os.path.join(DATA_DIR, "capture.jsonl")
+os.environ["ADMIN_TOKEN"] = "secret"
+os.environ["REPLAY_PAGES"] = "true"
+os.environ.setdefault("DEV_MODE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.db.sql_client import SqlClient  # noqa: E402
+from app.db.tenant_db import tenant_db_manager  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+from app.utils.metrics import llm_seconds  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+failures = 0
+
+
+def check(ok: bool, message: str):
+    global failures
+    failures += not ok
+    print(f"{'PASS' if ok else 'FAIL'}: {message}")
+
+
+async def create_app(client: httpx.AsyncClient) -> str:
+    response = await client.post("/", data={"application_type": "a task tracker"})
+    guid = response.headers["location"].strip("/")
+    first = await client.get(f"/{guid}/")
+    if "init-progress" in first.text:
+        await client.get(f"/_init/{guid}/events")
+    return guid
+
+
+def count_items(guid: str) -> int:
+    return tenant_db_manager.get(guid).execute_commands([{"name": "n", "query": "SELECT COUNT(*) FROM items"}])["n"][0][0]
+
+
+async def main():
+    await settings_db_client.initialize_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        guids = [await create_app(client) for _ in range(args.apps)]
+        big = guids[0]
+        await tenant_db_manager.run(tenant_db_manager.get(big).execute_batch, [
+            {"name": f"row_{i}", "query": f"INSERT INTO items (title, status, owner_id, created_at) "
+                                          f"VALUES ('Bulk item {i} with a longer title', 'new', 'user1', '2025-02-01')"}
+            for i in range(args.rows)
+        ])
+        for guid in guids:
+            (await client.get(f"/{guid}/reports")).raise_for_status()
+        items_before = await tenant_db_manager.run(count_items, big)
+
+        denied = await client.get("/_admin/storage")
+        check(denied.status_code == 401, f"/_admin/storage without the token is refused ({denied.status_code})")
+        headers = {"Authorization": "Bearer secret"}
+        before = (await client.get("/_admin/storage", headers=headers)).json()
+
+        # Mark every tenant as last used two days ago
+        tenant_db_manager.archive_after = 24 * 3600
+        old = time.time() - 2 * 24 * 3600
+        for guid in guids:
+            for suffix in ("", "-wal"):
+                if os.path.exists(tenant_db_manager.db_path(guid) + suffix):
+                    os.utime(tenant_db_manager.db_path(guid) + suffix, (old, old))
+        tenant_db_manager.touched.clear()
+        start = time.perf_counter()
+        archived = await tenant_db_manager.archive_idle()
+        print(f"archived {archived} tenants in {time.perf_counter() - start:.2f}s")
+        check(archived == len(guids), f"all {len(guids)} idle tenants were archived")
+        check(not any(os.path.exists(tenant_db_manager.db_path(guid)) for guid in guids),
+              "their databases left the hot tier")
+        after = (await client.get("/_admin/storage", headers=headers)).json()
+        check(after["hot_tenants"] == 0 and after["archived_tenants"] == len(guids), "the report lists them as archived")
+        stored = sum(tenant["stored_pages"] for tenant in after["tenants"])
+        check(stored == 0, "their stored pages moved out of the settings DB")
+        print(f"hot tier {before['hot_bytes']} bytes -> archive {after['archive_bytes']} bytes "
+              f"({before['hot_bytes'] / max(after['archive_bytes'], 1):.1f}x smaller)")
+
+        page_calls = partial(llm_seconds.count, provider="fake", model="fake", kind="page")
+        calls = page_calls()
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(f"/{big}/reports") for _ in range(8)))
+        elapsed = time.perf_counter() - start
+        check(all(response.status_code == 200 for response in responses),
+              f"8 concurrent requests to an archived app succeeded in {elapsed * 1000:.0f}ms")
+        check(tenant_db_manager.restored == 1, f"it was restored once ({tenant_db_manager.restored})")
+        check(page_calls() == calls, "its stored page was replayed without the LLM")
+        items_after = await tenant_db_manager.run(count_items, big)
+        check(items_after == items_before, f"its data survived ({items_after} items)")
+        report = (await client.get("/_admin/storage", headers=headers)).json()
+        check(report["hot_tenants"] == 1 and report["archived_tenants"] == len(guids) - 1,
+              "the report shows one hot and the rest archived")
+
+        # A request holds the client while the tenant is archived; another worker has its own connection open
+        held = await tenant_db_manager.open(big)
+        other_worker = SqlClient(tenant_db_manager.db_path(big))
+        await tenant_db_manager.run(count_items, big)
+        other_worker.execute_commands([{"name": "n", "query": "SELECT COUNT(*) FROM items"}])
+        check(await tenant_db_manager.archive_tenant(big), "a tenant in use can still be archived")
+        insert = [{"name": "late", "query": "INSERT INTO items (title, status) VALUES ('late write', 'new')"}]
+        for label, client in (("the request's client", held), ("another worker's connection", other_worker)):
+            try:
+                await tenant_db_manager.run(client.execute_commands, insert)
+                failed = False
+            except sqlite3.OperationalError:
+                failed = True
+            check(failed and not os.path.exists(tenant_db_manager.db_path(big)),
+                  f"a write through {label} after archiving fails without creating an empty database")
+        await tenant_db_manager.open(big)
+        items_restored = await tenant_db_manager.run(count_items, big)
+        check(items_restored == items_before, f"the next request restores the archived data ({items_restored} items)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
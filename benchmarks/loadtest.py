@@ -0,0 +1,179 @@
+"""Load-test catch_all through the ASGI app with the fake LLM provider.
+
+Scenarios:
+    cold  - create a new app, follow its initialization and render its first page
+    page  - GET pages that have to be generated
+    warm  - GET pages already stored for replay
+    htmx  - GET HTMX fragments that have to be generated
+    post  - POST a form that inserts a row and renders a page
+
+Each scenario sends --requests requests with --concurrency of them in flight
+and reports throughput and p50/p95/p99 latency. Requests go through
+httpx.ASGITransport, which buffers responses, so latency is to the last byte.
+The fake provider's time to first token and tokens per second come from
+--latency and --tokens-per-second (see FAKE_LLM_* in settings). The LLM
+response cache is off unless --llm-cache is given; with it every cold app
+after the first reuses the cached initialization responses. With
+--db-backend redis the apps keep their data in the redis-server at
+REDIS_HOST:REDIS_PORT instead of SQLite.
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 16 --requests 400 --latency lognormal:0.5,0.5
+    python benchmarks/loadtest.py --scenarios warm,post --latency fixed:0 --json results.json
+    REDIS_PORT=6390 python benchmarks/loadtest.py --db-backend redis --latency fixed:0
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("cold", "page", "warm", "htmx", "post")
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+parser.add_argument("--requests", type=int, default=200, help="requests per scenario (cold: apps created)")
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--apps", type=int, default=4, help="initialized apps the other scenarios spread over")
+parser.add_argument("--latency", default="lognormal:0.2,0.5", help="fake time to first token distribution")
+parser.add_argument("--tokens-per-second", type=float, default=1000)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--llm-cache", action="store_true", help="serve repeated prompts from the LLM response cache")
+parser.add_argument("--db-backend", default="sqlite", choices=("sqlite", "redis"))
+parser.add_argument("--json", help="also write the results to this file")
+args = parser.parse_args()
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoapp-load-")
+os.environ["SQLITE_DB_PATH"] = DATA_DIR + "/"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_LATENCY"] = args.latency
+os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+os.environ["FAKE_LLM_SEED"] = str(args.seed)
+os.environ["LLM_CACHE_MODE"] = "readwrite" if args.llm_cache else "off"
+os.environ["LOG_FILE"] = os.path.join(DATA_DIR, "app.log")
+os.environ["LLM_CAPTURE_FILE"] = os.path.join(DATA_DIR, "capture.jsonl")
+os.environ.setdefault("DEV_MODE", "false")
+if args.db_backend == "redis":
+    os.environ["REDIS_ENABLED"] = "true"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app.db.settings_db_client import settings_db_client  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.logger import logger  # noqa: E402
+
+logger.setLevel(logging.WARNING)
+
+
+async def create_app(client: httpx.AsyncClient) -> str:
+    """Create an app and wait until it serves its home page; returns its guid"""
+    response = await client.post("/", data={"application_type": "a task tracker", "db_backend": args.db_backend})
+    guid = response.headers["location"].strip("/")
+    first = await client.get(f"/{guid}/")
+    if "init-progress" in first.text:
+        events = await client.get(f"/_init/{guid}/events")
+        if '"done": true' not in events.text:
+            raise RuntimeError(f"Initialization of {guid} failed: {events.text[-300:]}")
+        first = await client.get(f"/{guid}/")
+    first.raise_for_status()
+    return guid
+
+
+def scenario_requests(name: str, guids: list[str]):
+    """Return a function sending the i-th request of a scenario"""
+    async def cold(client, i):
+        await create_app(client)
+
+    async def page(client, i):
+        (await client.get(f"/{guids[i % len(guids)]}/reports/{i}")).raise_for_status()
+
+    async def warm(client, i):
+        (await client.get(f"/{guids[i % len(guids)]}/warm/{i % 10}")).raise_for_status()
+
+    async def htmx(client, i):
+        response = await client.get(f"/{guids[i % len(guids)]}/items/{i}/details", headers={"HX-Request": "true"})
+        response.raise_for_status()
+
+    async def post(client, i):
+        (await client.post(f"/{guids[i % len(guids)]}/items", data={"title": f"Load test {i}"})).raise_for_status()
+
+    return {"cold": cold, "page": page, "warm": warm, "htmx": htmx, "post": post}[name]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted `values`"""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def run(client: httpx.AsyncClient, name: str, send, requests: int, concurrency: int) -> dict:
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                await send(client, i)
+            except Exception as e:
+                errors += 1
+                logger.error(f"{name} request {i} failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2),
+        **{f"p{p}": round(percentile(latencies, p), 4) if latencies else None for p in (50, 95, 99)},
+        "max": round(latencies[-1], 4) if latencies else None,
+    }
+
+
+async def main():
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    await settings_db_client.initialize_db()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+        guids = []
+        if set(scenarios) - {"cold"}:
+            guids = await asyncio.gather(*(create_app(client) for _ in range(args.apps)))
+        if "warm" in scenarios:
+            # Generate and store the pages the warm scenario replays
+            await asyncio.gather(*(client.get(f"/{guid}/warm/{k}") for guid in guids for k in range(10)))
+
+        print(f"fake LLM: {args.latency} to first token, {args.tokens_per_second:g} tokens/s; "
+              f"concurrency {args.concurrency}, {args.apps} apps, LLM cache {'on' if args.llm_cache else 'off'}")
+        print(f"{'scenario':>8} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name in scenarios:
+            result = await run(client, name, scenario_requests(name, guids), args.requests, args.concurrency)
+            results[name] = result
+            print(f"{name:>8} {result['requests']:>8} {result['errors']:>6} {result['throughput']:>8.2f} "
+                  + " ".join(f"{result[key] * 1000:>6.0f}ms" if result[key] is not None else f"{'-':>8}"
+                             for key in ("p50", "p95", "p99", "max")))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    sys.exit(1 if any(result["errors"] for result in results.values()) else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())